@@ -0,0 +1,124 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Time 1,000 rows' worth of AppSystem metadata lookups against the
+    system AppStream data.
+
+    Each row asks for the name, summary and the app itself (as the icon
+    lookup does), for a mix of packages with and without AppStream data.
+
+    Before: probing the AsStore by pkgname, id and id.desktop on every
+    call, as AppSystem used to.
+
+    After: the per-store AppStoreIndex with memoised names and summaries.
+
+        python2 benchmarks/bench_appsystem.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from gi.repository import AppStreamGlib as As  # noqa: E402
+from gi.repository import GLib  # noqa: E402
+from xng.appsystem import AppSystem  # noqa: E402
+
+ROWS = 1000
+ROUNDS = 5
+
+
+def probe(store, id):
+    """ The old get_store_variant """
+    ret = store.get_app_by_pkgname(id)
+    if ret:
+        return ret
+    ret = store.get_app_by_id(id)
+    if ret:
+        return ret
+    return store.get_app_by_id(id + ".desktop")
+
+
+def old_row(store, id, fallback):
+    """ The old get_name, get_summary and icon lookup for a single row """
+    app = probe(store, id)
+    if not app:
+        name = GLib.markup_escape_text(fallback)
+    else:
+        name = GLib.markup_escape_text(app.get_name("C") or fallback)
+
+    app = probe(store, id)
+    summary = app.get_comment("C") if app else None
+    summary = summary or fallback
+
+    probe(store, id)
+    return name, summary
+
+
+def new_row(apps, store, id, fallback):
+    apps.get_name(id, fallback, store)
+    apps.get_summary(id, fallback, store)
+    apps.get_store_variant(store, id)
+
+
+def best_of(func):
+    """ Best wall time of ROUNDS runs, in milliseconds """
+    times = []
+    for i in range(ROUNDS):
+        start = time.time()
+        func()
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def main():
+    store = As.Store()
+    store.load(As.StoreLoadFlags.APP_INFO_SYSTEM)
+
+    # Roughly a search page: mostly apps, with some plain packages
+    ids = []
+    for app in store.get_apps():
+        name = app.get_pkgname_default()
+        if name:
+            ids.append(name)
+    ids.sort()
+    rows = []
+    for i in range(ROWS):
+        if i % 3 == 2:
+            rows.append("no-such-package-{}".format(i))
+        else:
+            rows.append(ids[i % len(ids)])
+    print("{} apps in the system store, {} rows".format(
+        len(store.get_apps()), len(rows)))
+
+    apps = AppSystem()
+    start = time.time()
+    apps.get_index(store)
+    print("index built in {:.2f}ms".format((time.time() - start) * 1000))
+
+    def before():
+        for id in rows:
+            old_row(store, id, id)
+
+    def after():
+        for id in rows:
+            new_row(apps, store, id, id)
+
+    print("before: {:.2f}ms".format(best_of(before)))
+    print("after:  {:.2f}ms".format(best_of(after)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Time the worst case install, removal and autoremoval closures of
+    EopkgDepGraph.
+
+    The largest closures are found by asking the graph for every candidate,
+    then each is timed with pisi's own planner (before), a cold graph query
+    and a memoised one (after).
+
+    Against the live pisi databases:
+
+        python2 benchmarks/bench_depgraph.py [package...]
+
+    Against a synthetic 10,000 package repository, without pisi's planner
+    to compare with:
+
+        python2 benchmarks/bench_depgraph.py --synthetic
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.depgraph import EopkgDepGraph, \
+    EopkgGraphFallback  # noqa: E402
+
+ROUNDS = 3
+WORST = 5
+SYNTHETIC_PACKAGES = 10000
+
+
+class SyntheticIndex:
+    """ Enough of an EopkgIndex for the graph, over a random DAG where the
+        early packages are the widely used libraries """
+
+    key = "synthetic"
+    packages = None
+    deps = None
+    conflicts = None
+    auto = None
+
+    def __init__(self, count):
+        rng = random.Random(0)
+        self.packages = dict()
+        self.deps = dict()
+        self.conflicts = []
+        self.auto = []
+        for i in range(count):
+            name = "pkg{:05d}".format(i)
+            record = ("", "", "1.0", "1", "", 0, 0)
+            installed = record if rng.random() < 0.2 else None
+            deps = []
+            for j in range(min(i, rng.randint(0, 10))):
+                # Skew towards the early, widely used packages
+                deps.append("pkg{:05d}".format(int(i * rng.random() ** 3)))
+            self.packages[name] = (record, installed)
+            self.deps[name] = (deps, deps if installed else None)
+            if installed and rng.random() < 0.5:
+                self.auto.append(name)
+
+
+def live_index():
+    import pisi.db
+    from xng.plugins.eopkg.index import EopkgIndex
+
+    index = EopkgIndex()
+    if not index.load():
+        index.rebuild(pisi.db.packagedb.PackageDB(),
+                      pisi.db.installdb.InstallDB(),
+                      pisi.db.groupdb.GroupDB(),
+                      pisi.db.componentdb.ComponentDB())
+    return index
+
+
+def best_of(func, *args):
+    """ Best wall time of ROUNDS runs, in milliseconds """
+    times = []
+    for i in range(ROUNDS):
+        start = time.time()
+        func(*args)
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def worst_cases(graph, plan, candidates):
+    """ The candidates with the largest closures """
+    sizes = []
+    for name in candidates:
+        try:
+            sizes.append((len(plan([name])), name))
+        except EopkgGraphFallback:
+            continue
+    sizes.sort(reverse=True)
+    return [x[1] for x in sizes[:WORST]]
+
+
+def run(graph, kind, names, plan, pisi_plan):
+    print("{:<32} {:>7} {:>12} {:>10} {:>10}".format(
+        kind, "size", "pisi (ms)", "cold (ms)", "memo (ms)"))
+    for name in names:
+        try:
+            size = len(plan([name]))
+        except EopkgGraphFallback:
+            print("{:<32} falls back to pisi".format(name))
+            continue
+
+        def cold():
+            graph.memo.clear()
+            plan([name])
+
+        before = "-"
+        if pisi_plan is not None:
+            before = "{:.2f}".format(best_of(pisi_plan, [name]))
+        print("{:<32} {:>7} {:>12} {:>10.2f} {:>10.2f}".format(
+            name, size, before, best_of(cold), best_of(plan, [name])))
+
+
+def main():
+    args = sys.argv[1:]
+    pisi_install = None
+    pisi_remove = None
+    pisi_autoremove = None
+    if "--synthetic" in args:
+        args.remove("--synthetic")
+        index = SyntheticIndex(SYNTHETIC_PACKAGES)
+    else:
+        from pisi.operations.install import plan_install_pkg_names
+        from pisi.operations.remove import plan_remove, plan_autoremove
+        index = live_index()
+        pisi_install = plan_install_pkg_names
+        pisi_remove = plan_remove
+        pisi_autoremove = plan_autoremove
+
+    graph = EopkgDepGraph(index)
+    print("{} packages".format(len(graph.names)))
+
+    installable = [x for x in graph.names if graph.available[graph.ids[x]]
+                   and not graph.installed[graph.ids[x]]]
+    removable = [x for x in graph.names if graph.installed[graph.ids[x]]]
+
+    install = args or worst_cases(graph, graph.plan_install, installable)
+    run(graph, "install", install, graph.install_closure, pisi_install)
+
+    remove = args or worst_cases(graph, graph.plan_remove, removable)
+    run(graph, "remove", remove, graph.remove_closure, pisi_remove)
+
+    autoremove = args or worst_cases(graph, graph.plan_autoremove,
+                                     removable)
+    run(graph, "autoremove", autoremove, graph.autoremove_closure,
+        pisi_autoremove)
+
+
+if __name__ == "__main__":
+    main()
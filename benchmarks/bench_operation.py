@@ -0,0 +1,115 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Jobs per minute for a queue of tiny operations against a fake COMAR
+    link, which reports each call finished after a fixed latency.
+
+    Before: the 500ms spinlock the plugin used to poll.
+
+    After: EopkgPlugin.run_operation waiting on its EopkgOperation.
+
+    The post-transaction DB refresh is the same either way, so it is
+    skipped here.
+
+        python2 benchmarks/bench_operation.py [jobs] [latency ms]
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.base import ProviderPlugin  # noqa: E402
+from xng.plugins.eopkg.plugin import EopkgPlugin  # noqa: E402
+
+JOBS = 20
+LATENCY = 20
+
+
+class FakeManager:
+    """ Stands in for link.System.Manager['pisi'] """
+
+    plugin = None
+    latency = 0
+
+    def __init__(self, plugin, latency):
+        self.plugin = plugin
+        self.latency = latency
+
+    def installPackage(self, packages, timeout=0):
+        thr = threading.Thread(target=self.finish)
+        thr.daemon = True
+        thr.start()
+
+    def finish(self):
+        time.sleep(self.latency)
+        self.plugin.dbus_callback(
+            "pisi", "finished", ["System.Manager.installPackage"])
+
+
+class BenchPlugin(EopkgPlugin):
+    """ EopkgPlugin without the pisi DBs or a real COMAR link """
+
+    __gtype_name__ = "BenchEopkgPlugin"
+
+    operation_blocked = False
+
+    def __init__(self, latency):
+        ProviderPlugin.__init__(self)
+        self.pmanager = FakeManager(self, latency)
+
+    def handle_dbus_finished(self, args):
+        self.operation_blocked = False
+        operation = self.operation
+        if operation is not None:
+            operation.finish()
+
+    def run_spinlock(self, method, *args):
+        """ The old way, i.e. spinlock_busy_wait + spinlock_busy_end """
+        self.operation_blocked = True
+        getattr(self.pmanager, method)(*args, timeout=100000)
+        while self.operation_blocked:
+            time.sleep(.500)
+        return True
+
+
+def jobs_per_minute(run, jobs):
+    start = time.time()
+    for i in range(jobs):
+        run("installPackage", "nano")
+    return jobs * 60.0 / (time.time() - start)
+
+
+def main():
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else JOBS
+    latency = int(sys.argv[2]) if len(sys.argv) > 2 else LATENCY
+    plugin = BenchPlugin(latency / 1000.0)
+    print("{} jobs, {}ms each".format(jobs, latency))
+
+    # Quieten run_operation's per-call logging
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        before = jobs_per_minute(plugin.run_spinlock, jobs)
+        after = jobs_per_minute(plugin.run_operation, jobs)
+    finally:
+        sys.stdout = stdout
+    print("before: {:.0f} jobs/min".format(before))
+    print("after:  {:.0f} jobs/min".format(after))
+
+
+if __name__ == "__main__":
+    main()
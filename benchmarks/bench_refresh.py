@@ -0,0 +1,69 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Time the refresh after a 1-package transaction on the live system.
+
+    Before: what handle_dbus_finished used to do, i.e. throw every pisi DB
+    away, plus the first walk of the installed packages afterwards.
+
+    After: refresh_installed for the one package, which also diffs the
+    installed DB against the index.
+
+    Must be run on a Solus system, with COMAR available:
+
+        python2 benchmarks/bench_refresh.py [package]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.plugin import EopkgPlugin  # noqa: E402
+
+ROUNDS = 5
+
+
+def best_of(func):
+    """ Best wall time of ROUNDS runs, in milliseconds """
+    times = []
+    for i in range(ROUNDS):
+        start = time.time()
+        func()
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def main():
+    plugin = EopkgPlugin()
+    installed = sorted(plugin.index.list_installed())
+    name = sys.argv[1] if len(sys.argv) > 1 else installed[0]
+    print("{} packages installed, refreshing {}".format(
+        len(installed), name))
+
+    def before():
+        plugin.rebuild_db()
+        for pkg in plugin.installDB.list_installed():
+            plugin.installDB.get_package(pkg)
+
+    def after():
+        plugin.refresh_installed([name])
+
+    print("before: {:.2f}ms".format(best_of(before)))
+    print("after:  {:.2f}ms".format(best_of(after)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Time to fill a details page with 5 screenshots from a local HTTP
+    server, which adds a simulated round trip time to every request and
+    three more to every new connection (TCP plus a TLS handshake).
+
+    Before: a fresh connection per screenshot, written to a temporary
+    file and then copied into the cache, as the GIO copy used to.
+
+    After: ScMediaFetcher.fetch_pixbuf over a pool that starts out empty
+    for each page. With stale copies in the cache, the page is refilled
+    by revalidating each one for a 304.
+
+        python2 benchmarks/bench_screenshots.py [rtt ms]
+"""
+
+import BaseHTTPServer
+import hashlib
+import httplib
+import os
+import random
+import shutil
+import socket
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from gi.repository import GObject  # noqa: E402
+from xng.util.fetcher import ScMediaFetcher  # noqa: E402
+from xng.util.http import ScHttpPool  # noqa: E402
+from xng.util.mediacache import ScMediaCache, ENTRY_FETCHED  # noqa: E402
+
+SCREENSHOTS = 5
+SCREENSHOT_SIZE = 300 * 1024
+ROUNDS = 5
+RTT = 20
+
+# Round trips to set up a connection, i.e. TCP then TLS 1.2
+HANDSHAKE_TRIPS = 3
+
+
+class ScreenshotServer(SocketServer.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    """ Serves fixed bodies with an ETag, and the simulated latency """
+
+    daemon_threads = True
+
+    files = None
+    rtt = 0
+
+    def __init__(self, files, rtt):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ("127.0.0.1", 0), ScreenshotHandler)
+        self.files = files
+        self.rtt = rtt
+
+    def url(self, name):
+        return "http://127.0.0.1:{}/{}".format(self.server_port, name)
+
+
+class ScreenshotHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    # Write each response out in one go, without Nagle's algorithm
+    # holding back the tail of it, as a real server would
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(self.server.rtt * HANDSHAKE_TRIPS)
+
+    def do_GET(self):
+        time.sleep(self.server.rtt)
+        body = self.server.files[self.path.lstrip("/")]
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if self.headers.getheader("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchFetcher(ScMediaFetcher):
+    """ ScMediaFetcher without its worker threads """
+
+    __gtype_name__ = "BenchMediaFetcher"
+
+    def __init__(self):
+        GObject.Object.__init__(self)
+        self.can_fetch_media = True
+        self.media_cache = ScMediaCache()
+
+
+def fetch_fresh(uri, local_file):
+    """ The old path, one connection per screenshot and a second copy """
+    parts = urlparse.urlsplit(uri)
+    conn = httplib.HTTPConnection(parts.netloc)
+    try:
+        conn.request("GET", parts.path)
+        resp = conn.getresponse()
+        tmp = local_file + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(resp.read())
+    finally:
+        conn.close()
+    shutil.copy(tmp, local_file)
+    os.unlink(tmp)
+
+
+def best_of(setup, func):
+    """ Best wall time of ROUNDS runs, in milliseconds """
+    times = []
+    for i in range(ROUNDS):
+        setup()
+        start = time.time()
+        func()
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def main():
+    rtt = int(sys.argv[1]) if len(sys.argv) > 1 else RTT
+
+    # Never touch the real media cache, which lives under HOME
+    home = tempfile.mkdtemp()
+    os.environ["HOME"] = home
+
+    rng = random.Random(0)
+    files = dict()
+    for i in range(SCREENSHOTS):
+        files["screenshot-{}.png".format(i)] = "".join(
+            chr(rng.randint(0, 255)) for x in range(SCREENSHOT_SIZE))
+    server = ScreenshotServer(files, rtt / 1000.0)
+    thr = threading.Thread(target=server.serve_forever)
+    thr.daemon = True
+    thr.start()
+
+    fetcher = BenchFetcher()
+    uris = [server.url(x) for x in sorted(files.keys())]
+    local_files = [fetcher.get_cache_filename_full(x) for x in uris]
+
+    def empty():
+        fetcher.pool = ScHttpPool()
+        fetcher.media_cache.entries.clear()
+        for local_file in local_files:
+            if os.path.exists(local_file):
+                os.unlink(local_file)
+
+    def stale():
+        fetcher.pool = ScHttpPool()
+        for local_file in local_files:
+            name = os.path.basename(local_file)
+            fetcher.media_cache.entries[name][ENTRY_FETCHED] = 0
+
+    def before():
+        for uri, local_file in zip(uris, local_files):
+            fetch_fresh(uri, local_file)
+
+    def after():
+        for uri, local_file in zip(uris, local_files):
+            fetcher.fetch_pixbuf(uri, local_file)
+
+    print("{} screenshots of {}KiB, {}ms round trips".format(
+        SCREENSHOTS, SCREENSHOT_SIZE // 1024, rtt))
+    print("before:         {:.2f}ms".format(best_of(empty, before)))
+    print("after:          {:.2f}ms".format(best_of(empty, after)))
+    print("after (stale):  {:.2f}ms".format(best_of(stale, after)))
+
+    for conns in fetcher.pool.idle.itervalues():
+        for conn in conns:
+            conn.close()
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(home)
+
+
+if __name__ == "__main__":
+    main()
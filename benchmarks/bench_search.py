@@ -0,0 +1,159 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Micro-benchmark of EopkgSearchIndex queries over a synthetic repo.
+
+    Before: the regex scan pisi's search_package does over the name,
+    summary and description of every package, followed by difflib ranking,
+    as populate_search used to do.
+
+    After: a query against the inverted index.
+
+        python2 benchmarks/bench_search.py [packages]
+"""
+
+import bisect
+import difflib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.search_index import EopkgSearchIndex, \
+    package_fields  # noqa: E402
+
+PACKAGES = 10000
+ROUNDS = 5
+
+QUERIES = ["lib", "python", "gnome shell", "firefxo", "qt5 devel", "zzz"]
+
+# Common stems, so queries like "lib" and "python" have realistic hits
+STEMS = ["lib", "python", "gnome", "shell", "qt5", "firefox", "kde", "gtk",
+         "font", "media", "player", "network", "manager", "system", "util"]
+
+CONSONANTS = "bcdfghklmnprstvwz"
+VOWELS = "aeiou"
+
+
+class FakePackage:
+    """ Just enough of a pisi package for package_fields """
+
+    summary = None
+    description = None
+
+    def __init__(self, summary, description):
+        self.summary = summary
+        self.description = description
+
+
+def make_vocab(rng, count):
+    """ Distinct made up words, with the stems mixed in among the common
+        ones """
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(CONSONANTS) + rng.choice(VOWELS)
+                          for x in range(rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    for i, stem in enumerate(STEMS):
+        words.insert(100 + i * 50, stem)
+    return words
+
+
+def make_repo(count):
+    """ Deterministic name -> FakePackage, with Zipf distributed words """
+    rng = random.Random(0)
+    vocab = make_vocab(rng, 20000)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    total = sum(weights)
+    cumulative = []
+    running = 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+
+    def word():
+        return vocab[min(bisect.bisect_left(cumulative, rng.random()),
+                         len(vocab) - 1)]
+
+    repo = dict()
+    while len(repo) < count:
+        name = "-".join(word() for x in range(rng.randint(1, 2)))
+        if rng.random() < 0.1:
+            name = "lib" + name
+        if rng.random() < 0.2:
+            name += "-devel"
+        summary = " ".join(word() for x in range(6))
+        description = " ".join(word() for x in range(40))
+        repo[name] = FakePackage(summary, description)
+    return repo
+
+
+def scan(repo, term):
+    """ The old populate_search """
+    term = term.replace(" ", "[-_ ]").replace(".", "\\.")
+    regex = re.compile(term, re.IGNORECASE)
+    found = set()
+    for name, pkg in repo.iteritems():
+        for text in (name, pkg.summary, pkg.description):
+            if regex.search(text):
+                found.add(name)
+                break
+    leaders = difflib.get_close_matches(term.lower(), found, cutoff=0.5)
+    leaders.extend(sorted([x for x in found if x not in leaders]))
+    return leaders
+
+
+def best_of(func, *args):
+    """ Best wall time of ROUNDS runs, in milliseconds """
+    times = []
+    for i in range(ROUNDS):
+        start = time.time()
+        func(*args)
+        times.append((time.time() - start) * 1000)
+    return min(times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PACKAGES
+    repo = make_repo(count)
+
+    # Never clobber the real index in the user's cache
+    index = EopkgSearchIndex()
+    index.path = os.path.join(tempfile.mkdtemp(), "search")
+
+    start = time.time()
+    index.build("bench", dict((name, package_fields(name, pkg))
+                              for name, pkg in repo.iteritems()))
+    print("{} packages, index built in {:.2f}s".format(
+        count, time.time() - start))
+
+    print("{:<14} {:>12} {:>12} {:>8}".format(
+        "query", "before (ms)", "after (ms)", "hits"))
+    for term in QUERIES:
+        before = best_of(scan, repo, term)
+        after = best_of(index.query, term)
+        print("{:<14} {:>12.2f} {:>12.2f} {:>8}".format(
+            term, before, after, len(index.query(term))))
+
+    os.unlink(index.path)
+    os.rmdir(os.path.dirname(index.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+""" Drive ScSearchWorker headlessly over a synthetic repo, and report its
+    queries per second and time to first result.
+
+    Typed: each query is typed a key at a time, faster than the debounce
+    window, so most requests are superseded before they run.
+
+    Submitted: each query is pushed whole, and waited for.
+
+    The fake context searches an EopkgSearchIndex and streams the hits to
+    the collector as the eopkg plugin does.
+
+        python2 benchmarks/bench_search_worker.py [packages] [key ms]
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from bench_search import make_repo, QUERIES  # noqa: E402
+from xng.plugins.base import PopulationFilter, SearchRequest  # noqa: E402
+from xng.plugins.eopkg.search_index import EopkgSearchIndex, \
+    package_fields  # noqa: E402
+from xng.search_worker import ScSearchWorker  # noqa: E402
+
+PACKAGES = 10000
+KEY_INTERVAL = 80
+
+
+class IndexContext:
+    """ Stands in for ScContext, with a single eopkg-like plugin """
+
+    index = None
+
+    def __init__(self, index):
+        self.index = index
+
+    def populate_storage(self, storage, popfilter, request, exclude=None,
+                         cancellable=None):
+        term = request.get_term()
+        want_devel = "devel" in term
+        for name in self.index.query(term):
+            if request.is_cancelled():
+                return
+            if name.endswith("-devel") and not want_devel:
+                continue
+            storage.add_item(name, name, PopulationFilter.SEARCH)
+
+
+class CountingSink:
+    """ Counts results, and lets us wait for a given request to end """
+
+    lock = None
+    results = 0
+    stale = 0
+    current = None
+    ended = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ended = threading.Event()
+
+    def expect(self, request):
+        with self.lock:
+            self.current = request
+            self.ended.clear()
+
+    def search_batch(self, request, items):
+        with self.lock:
+            self.results += len(items)
+            if request is not self.current:
+                self.stale += 1
+
+    def search_end(self, request):
+        with self.lock:
+            if request is self.current:
+                self.ended.set()
+
+
+def run(index, sessions):
+    """ Push each session's requests, waiting for the last to end """
+    sink = CountingSink()
+    worker = ScSearchWorker(IndexContext(index), sink)
+    for requests, interval in sessions:
+        for term in requests:
+            request = SearchRequest(term)
+            sink.expect(request)
+            worker.push_request(request)
+            if term is not requests[-1]:
+                sink.ended.wait(interval)
+        sink.ended.wait()
+    return worker.stats, sink
+
+
+def report(label, stats, sink):
+    print("{}: {} requested, {} cancelled, {} completed, {} stale "
+          "batches".format(label, stats.requested, stats.cancelled,
+                           stats.completed, sink.stale))
+    print("    {:.1f} queries/s, {:.2f}ms to first result".format(
+        stats.get_queries_per_second(),
+        stats.get_time_to_first_result() * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PACKAGES
+    interval = int(sys.argv[2]) if len(sys.argv) > 2 else KEY_INTERVAL
+    repo = make_repo(count)
+
+    # Never clobber the real index in the user's cache
+    index = EopkgSearchIndex()
+    index.path = os.path.join(tempfile.mkdtemp(), "search")
+    index.build("bench", dict((name, package_fields(name, pkg))
+                              for name, pkg in repo.iteritems()))
+    print("{} packages, {}ms between keys".format(count, interval))
+
+    typed = [([x[:i + 1] for i in range(len(x))], interval / 1000.0)
+             for x in QUERIES]
+    report("typed", *run(index, typed))
+
+    submitted = [([x], 0) for x in QUERIES]
+    report("submitted", *run(index, submitted))
+
+    os.unlink(index.path)
+    os.rmdir(os.path.dirname(index.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+""" EopkgDepGraph removal planning over a hand built index.
+
+        python2 -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.depgraph import EopkgDepGraph, \
+    EopkgGraphFallback  # noqa: E402
+
+# name -> installed dependencies
+INSTALLED = {
+    "editor": ["gtk", "spell"],
+    "spell": ["dict"],
+    "dict": [],
+    "gtk": ["glib"],
+    "viewer": ["gtk"],
+    "glib": [],
+    "plugin": ["editor"],
+}
+
+AUTO = ["dict", "glib", "gtk", "spell"]
+
+
+class FakeIndex:
+    """ Just enough of EopkgIndex to build a graph from """
+
+    key = "key"
+    packages = None
+    deps = None
+    conflicts = None
+    auto = None
+
+    def __init__(self, installed, auto):
+        record = ("", "", "1", "1", "", 0, 0)
+        self.packages = dict((x, (None, record)) for x in installed)
+        self.deps = dict((x, (None, y)) for x, y in installed.iteritems())
+        self.conflicts = []
+        self.auto = auto
+
+
+class TestDepGraph(unittest.TestCase):
+
+    def make_graph(self, installed=INSTALLED, auto=AUTO):
+        return EopkgDepGraph(FakeIndex(installed, auto))
+
+    def assertBefore(self, order, first, then):
+        self.assertLess(order.index(first), order.index(then))
+
+    def test_remove(self):
+        """ Dependents go with the package, dependencies stay """
+        order = self.make_graph().remove_closure(["editor"])
+        self.assertEqual(sorted(order), ["editor", "plugin"])
+        self.assertBefore(order, "plugin", "editor")
+
+    def test_autoremove_orphans(self):
+        """ Automatic dependencies nothing else needs go too, after
+            everything depending on them """
+        order = self.make_graph().autoremove_closure(["editor"])
+        self.assertEqual(sorted(order), ["dict", "editor", "plugin",
+                                         "spell"])
+        self.assertBefore(order, "plugin", "editor")
+        self.assertBefore(order, "editor", "spell")
+        self.assertBefore(order, "spell", "dict")
+
+    def test_autoremove_shared(self):
+        """ Orphans are only found once their last dependent goes """
+        graph = self.make_graph()
+        self.assertNotIn("gtk", graph.autoremove_closure(["viewer"]))
+        order = graph.autoremove_closure(["editor", "viewer"])
+        self.assertIn("gtk", order)
+        self.assertBefore(order, "gtk", "glib")
+
+    def test_autoremove_manual(self):
+        """ Anything the user asked for themselves is left alone """
+        order = self.make_graph(auto=["glib"]).autoremove_closure(
+            ["viewer"])
+        self.assertEqual(order, ["viewer"])
+
+    def test_autoremove_unknown(self):
+        """ Without the automatic flags, pisi has to plan it """
+        graph = self.make_graph(auto=None)
+        self.assertRaises(EopkgGraphFallback, graph.autoremove_closure,
+                          ["editor"])
+
+
+if __name__ == "__main__":
+    unittest.main()
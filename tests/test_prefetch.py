@@ -0,0 +1,216 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+""" EopkgPrefetcher against a local HTTP server.
+
+        python2 -m unittest discover tests
+"""
+
+import BaseHTTPServer
+import hashlib
+import os
+import shutil
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.prefetch import EopkgPrefetcher  # noqa: E402
+
+# How long the server sits on each request, so the workers overlap
+SERVE_DELAY = 0.05
+
+
+class PackageServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Serves fixed package bodies by path, honouring Range requests """
+
+    daemon_threads = True
+
+    files = None
+    ranges = None
+    lock = None
+    active = 0
+    max_active = 0
+    honour_range = True
+
+    def __init__(self, files):
+        BaseHTTPServer.HTTPServer.__init__(
+            self, ("127.0.0.1", 0), PackageHandler)
+        self.files = files
+        self.ranges = dict()
+        self.lock = threading.Lock()
+
+    def url(self, filename):
+        return "http://127.0.0.1:{}/{}".format(self.server_port, filename)
+
+    def enter(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+    def leave(self):
+        with self.lock:
+            self.active -= 1
+
+
+class PackageHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.enter()
+        try:
+            time.sleep(SERVE_DELAY)
+            self.serve()
+        finally:
+            self.server.leave()
+
+    def serve(self):
+        name = self.path.lstrip("/")
+        body = self.server.files.get(name)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        status = 200
+        offset = 0
+        requested = self.headers.getheader("Range")
+        if requested:
+            self.server.ranges[name] = requested
+        if requested and self.server.honour_range:
+            offset = int(requested.split("=")[1].rstrip("-"))
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body) - offset))
+        if status == 206:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(
+                offset, len(body) - 1, len(body)))
+        self.end_headers()
+        self.wfile.write(body[offset:])
+
+    def log_message(self, *args):
+        pass
+
+
+def make_package(index):
+    return "".join(chr((index * 7 + x) % 256) for x in range(100000))
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.files = dict()
+        for i in range(8):
+            self.files["pkg-{}.eopkg".format(i)] = make_package(i)
+        self.server = PackageServer(self.files)
+        thr = threading.Thread(target=self.server.serve_forever)
+        thr.daemon = True
+        thr.start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.prefetcher = EopkgPrefetcher(workers=4)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def download(self, filename, sha1sum=None):
+        body = self.files.get(filename, "")
+        if sha1sum is None:
+            sha1sum = hashlib.sha1(body).hexdigest()
+        return (self.server.url(filename), filename, len(body), sha1sum)
+
+    def cached(self, filename):
+        path = os.path.join(self.cache_dir, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_concurrent(self):
+        """ Everything is fetched, with the workers overlapping """
+        names = sorted(self.files.keys())
+        seen = []
+
+        fetched = self.prefetcher.fetch(
+            self.cache_dir, [self.download(x) for x in names], seen.append)
+
+        self.assertEqual(fetched, len(names))
+        self.assertGreater(self.server.max_active, 1)
+        self.assertLessEqual(self.server.max_active, 4)
+        for name in names:
+            self.assertEqual(self.cached(name), self.files[name])
+        self.assertEqual(seen[-1], sum(len(x) for x in self.files.values()))
+        self.assertFalse([x for x in os.listdir(self.cache_dir)
+                          if x.endswith(".part")])
+
+    def test_resume(self):
+        """ A partial file is completed with a Range request """
+        name = "pkg-3.eopkg"
+        body = self.files[name]
+        with open(os.path.join(self.cache_dir, name + ".part"), "wb") as f:
+            f.write(body[:40000])
+        seen = []
+
+        fetched = self.prefetcher.fetch(
+            self.cache_dir, [self.download(name)], seen.append)
+
+        self.assertEqual(fetched, 1)
+        self.assertEqual(self.server.ranges.get(name), "bytes=40000-")
+        self.assertEqual(self.cached(name), body)
+        self.assertEqual(seen[0], 40000)
+        self.assertEqual(seen[-1], len(body))
+
+    def test_resume_refused(self):
+        """ A server ignoring the Range gets the file written from scratch """
+        self.server.honour_range = False
+        name = "pkg-5.eopkg"
+        with open(os.path.join(self.cache_dir, name + ".part"), "wb") as f:
+            f.write("stale" * 1000)
+
+        fetched = self.prefetcher.fetch(self.cache_dir, [self.download(name)])
+
+        self.assertEqual(fetched, 1)
+        self.assertEqual(self.cached(name), self.files[name])
+
+    def test_hash_mismatch(self):
+        """ A bad download never lands in the cache """
+        name = "pkg-1.eopkg"
+
+        fetched = self.prefetcher.fetch(
+            self.cache_dir, [self.download(name, sha1sum="0" * 40)])
+
+        self.assertEqual(fetched, 0)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_missing(self):
+        """ Failures are skipped, leaving the rest to finish """
+        downloads = [self.download("pkg-0.eopkg"),
+                     self.download("missing.eopkg", sha1sum="")]
+
+        fetched = self.prefetcher.fetch(self.cache_dir, downloads)
+
+        self.assertEqual(fetched, 1)
+        self.assertEqual(os.listdir(self.cache_dir), ["pkg-0.eopkg"])
+
+
+if __name__ == "__main__":
+    unittest.main()
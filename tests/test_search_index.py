@@ -0,0 +1,86 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+""" EopkgSearchIndex, incremental additions against a full build.
+
+        python2 -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng.plugins.eopkg.search_index import EopkgSearchIndex, \
+    WEIGHT_NAME, WEIGHT_APP_NAME, WEIGHT_KEYWORD, \
+    WEIGHT_DESCRIPTION  # noqa: E402
+
+DOCUMENTS = {
+    "gnumeric": [(WEIGHT_NAME, "gnumeric"),
+                 (WEIGHT_DESCRIPTION, "a tool for spreadsheets")],
+    "abiword": [(WEIGHT_NAME, "abiword"),
+                (WEIGHT_DESCRIPTION, "no spreadsheets here")],
+}
+
+APPSTREAM = [(WEIGHT_APP_NAME, "Gnumeric Office"),
+             (WEIGHT_KEYWORD, "spreadsheets"),
+             (WEIGHT_KEYWORD, "office")]
+
+
+class TestSearchIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def make_index(self, documents):
+        index = EopkgSearchIndex()
+        index.path = os.path.join(self.dir, "search")
+        index.build("key", documents)
+        return index
+
+    def grams(self, index):
+        return dict((x, sorted(y)) for x, y in index.grams.iteritems())
+
+    def test_enrich_matches_build(self):
+        """ Enriching a document gives the same index as building with it,
+            including tokens that only now qualify for fuzzy matching """
+        enriched = self.make_index(DOCUMENTS)
+        enriched.add_document("gnumeric", APPSTREAM)
+
+        documents = dict(DOCUMENTS)
+        documents["gnumeric"] = DOCUMENTS["gnumeric"] + APPSTREAM
+        built = self.make_index(documents)
+
+        self.assertEqual(enriched.vocab, built.vocab)
+        self.assertEqual(self.grams(enriched), self.grams(built))
+        self.assertEqual(enriched.query("spredsheets"), ["gnumeric",
+                                                         "abiword"])
+
+    def test_enrich_twice(self):
+        """ Adding the same fields again never duplicates grams """
+        index = self.make_index(DOCUMENTS)
+        index.add_document("gnumeric", APPSTREAM)
+        before = self.grams(index)
+        index.add_document("gnumeric", APPSTREAM)
+        self.assertEqual(self.grams(index), before)
+
+
+if __name__ == "__main__":
+    unittest.main()
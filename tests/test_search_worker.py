@@ -0,0 +1,153 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2014-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+""" ScSearchWorker without any UI, against a fake plugin context.
+
+        python2 -m unittest discover tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from xng import search_worker  # noqa: E402
+from xng.plugins.base import SearchRequest  # noqa: E402
+from xng.search_worker import ScSearchWorker  # noqa: E402
+
+# Long enough to wait for anything the worker does here
+WAIT = 5.0
+
+
+class FakeContext:
+    """ A single plugin yielding results slowly, until cancelled """
+
+    results = 0
+    delay = 0
+    searched = None
+
+    def __init__(self, results, delay):
+        self.results = results
+        self.delay = delay
+        self.searched = []
+
+    def populate_storage(self, storage, popfilter, request, exclude=None,
+                         cancellable=None):
+        self.searched.append(request.term)
+        for i in range(self.results):
+            if request.is_cancelled():
+                return
+            time.sleep(self.delay)
+            storage.add_item(i, (request.term, i), popfilter)
+
+
+class RecordingSink:
+    """ Records everything the worker hands over, in order """
+
+    lock = None
+    calls = None
+    first_batch = None
+    ended = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.first_batch = threading.Event()
+        self.ended = threading.Event()
+
+    def search_batch(self, request, items):
+        with self.lock:
+            self.calls.append(("batch", request, len(items)))
+        self.first_batch.set()
+
+    def search_end(self, request):
+        with self.lock:
+            self.calls.append(("end", request, 0))
+        self.ended.set()
+
+    def mark(self):
+        with self.lock:
+            return len(self.calls)
+
+    def since(self, mark):
+        with self.lock:
+            return self.calls[mark:]
+
+
+class TestSearchWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.debounce = search_worker.SEARCH_DEBOUNCE
+        search_worker.SEARCH_DEBOUNCE = 0.02
+        self.sink = RecordingSink()
+
+    def tearDown(self):
+        search_worker.SEARCH_DEBOUNCE = self.debounce
+
+    def make_worker(self, results, delay):
+        self.context = FakeContext(results, delay)
+        return ScSearchWorker(self.context, self.sink)
+
+    def test_stale_batches(self):
+        """ Nothing from a superseded request reaches the sink """
+        worker = self.make_worker(200, 0.002)
+        stale = SearchRequest("stale")
+        worker.push_request(stale)
+        self.assertTrue(self.sink.first_batch.wait(WAIT))
+
+        fresh = SearchRequest("fresh")
+        worker.push_request(fresh)
+        mark = self.sink.mark()
+        self.assertTrue(self.sink.ended.wait(WAIT))
+
+        calls = self.sink.since(mark)
+        self.assertFalse([x for x in calls if x[1] is stale])
+        self.assertEqual(calls[-1], ("end", fresh, 0))
+        self.assertEqual(sum(x[2] for x in calls), 200)
+        self.assertEqual(worker.stats.cancelled, 1)
+        self.assertEqual(worker.stats.completed, 1)
+
+    def test_debounce(self):
+        """ Only the last of a burst of keystrokes is searched """
+        search_worker.SEARCH_DEBOUNCE = 0.2
+        worker = self.make_worker(20, 0)
+        for term in ["f", "fi", "fir", "fire", "firef"]:
+            worker.push_request(SearchRequest(term))
+        self.assertTrue(self.sink.ended.wait(WAIT))
+
+        self.assertEqual(self.context.searched, ["firef"])
+        self.assertEqual(worker.stats.requested, 5)
+        self.assertEqual(worker.stats.cancelled, 4)
+        self.assertFalse([x for x in self.sink.since(0)
+                          if x[1].term != "firef"])
+
+    def test_stats(self):
+        """ Throughput and latency are measurable without a UI """
+        worker = self.make_worker(60, 0.001)
+        worker.push_request(SearchRequest("firefox"))
+        self.assertTrue(self.sink.ended.wait(WAIT))
+
+        stats = worker.stats
+        self.assertEqual(stats.completed, 1)
+        self.assertGreater(stats.get_queries_per_second(), 0)
+        self.assertGreater(stats.get_time_to_first_result(), 0)
+        self.assertLess(stats.get_time_to_first_result(),
+                        1.0 / stats.get_queries_per_second())
+
+
+if __name__ == "__main__":
+    unittest.main()
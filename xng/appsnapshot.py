@@ -0,0 +1,305 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from gi.repository import AppStreamGlib as As
+from gi.repository import GObject
+from .util import sc_cache_dir
+
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+# Bump whenever the layout of the snapshot changes
+SNAPSHOT_VERSION = 1
+
+# Everywhere APP_INFO_SYSTEM will look for metadata
+SNAPSHOT_SOURCES = [
+    "/usr/share/app-info",
+    "/var/cache/app-info",
+    "/var/lib/app-info",
+]
+
+# The URL kinds the UI actually displays
+SNAPSHOT_URL_KINDS = [
+    As.UrlKind.HOMEPAGE,
+    As.UrlKind.BUGTRACKER,
+    As.UrlKind.DONATION,
+]
+
+
+class AppSnapshotApp:
+    """ AppSnapshotApp implements the subset of the AsApp API that the
+        AppSystem relies on, backed by a flat record in the snapshot.
+
+        Icons, screenshots and launchables are only turned back into real
+        AppStream objects when they are asked for.
+    """
+
+    snapshot = None
+    record = None
+
+    def __init__(self, snapshot, record):
+        self.snapshot = snapshot
+        self.record = record
+
+    def get_id(self):
+        return self.record["id"]
+
+    def get_kind(self):
+        return self.record["kind"]
+
+    def get_pkgnames(self):
+        return self.record["pkgnames"]
+
+    def get_pkgname_default(self):
+        pkgnames = self.record["pkgnames"]
+        if not pkgnames:
+            return None
+        return pkgnames[0]
+
+    def get_name(self, locale):
+        return self.record["name"]
+
+    def get_comment(self, locale):
+        return self.record["comment"]
+
+    def get_developer_name(self, locale):
+        return self.record["developer"]
+
+    def get_keywords(self, locale):
+        return self.record["keywords"]
+
+    def get_description(self, locale):
+        """ Not in the snapshot, so defer to the full store """
+        app = self.snapshot.get_full_app(self.get_id())
+        if not app:
+            return None
+        return app.get_description(locale)
+
+    def get_url_item(self, kind):
+        return self.record["urls"].get(int(kind))
+
+    def get_launchable_by_kind(self, kind):
+        if kind != As.LaunchableKind.DESKTOP_ID:
+            return None
+        value = self.record["launchable"]
+        if not value:
+            return None
+        launch = As.Launchable.new()
+        launch.set_kind(kind)
+        launch.set_value(value)
+        return launch
+
+    def get_icons(self):
+        ret = []
+        for (kind, name, prefix, filename, w, h, scale) in \
+                self.record["icons"]:
+            icon = As.Icon.new()
+            icon.set_kind(kind)
+            if name:
+                icon.set_name(name)
+            if prefix:
+                icon.set_prefix(prefix)
+            if filename:
+                icon.set_filename(filename)
+            icon.set_width(w)
+            icon.set_height(h)
+            icon.set_scale(scale)
+            ret.append(icon)
+        return ret
+
+    def get_icon_for_size(self, width, height):
+        for icon in self.get_icons():
+            if icon.get_width() == width and icon.get_height() == height:
+                return icon
+        return None
+
+    def get_screenshots(self):
+        ret = []
+        for (kind, images) in self.record["screenshots"]:
+            screen = As.Screenshot.new()
+            screen.set_kind(kind)
+            for (w, h, url) in images:
+                img = As.Image.new()
+                img.set_width(w)
+                img.set_height(h)
+                img.set_url(url)
+                screen.add_image(img)
+            ret.append(screen)
+        return ret
+
+
+class AppSnapshot(GObject.Object):
+    """ AppSnapshot is a compact, persisted copy of the system AppStream
+        store, holding only the fields shown in listings and on the details
+        page, and stands in for the AsStore.
+
+        It is validated against the metadata sources, so that a warm start
+        never has to parse the AppStream XML. The real store is only loaded
+        when something (i.e. a long description) is not in the snapshot.
+    """
+
+    __gtype_name__ = "AppSnapshot"
+
+    __gsignals__ = {
+        'changed': (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, ()),
+    }
+
+    path = None
+    key = None
+    apps = None
+    pkgnames = None
+    full_store = None
+    lock = None
+
+    def __init__(self):
+        GObject.Object.__init__(self)
+        self.path = os.path.join(sc_cache_dir("appstream"), "snapshot")
+        self.lock = threading.Lock()
+        self.set_records([])
+
+    def compute_key(self):
+        """ Fingerprint the AppStream metadata files """
+        h = hashlib.sha1()
+        h.update(str(SNAPSHOT_VERSION))
+        for source in SNAPSHOT_SOURCES:
+            for subdir in ["xmls", "yaml"]:
+                root = os.path.join(source, subdir)
+                if not os.path.isdir(root):
+                    continue
+                for f in sorted(os.listdir(root)):
+                    path = os.path.join(root, f)
+                    try:
+                        st = os.stat(path)
+                    except Exception:
+                        continue
+                    h.update("{}:{}:{}".format(path, st.st_mtime, st.st_size))
+        return h.hexdigest()
+
+    def load(self):
+        """ Load the snapshot from disk. Returns False if it was unusable """
+        start = time.time()
+        self.key = self.compute_key()
+        try:
+            with open(self.path, "rb") as f:
+                blob = marshal.load(f)
+        except Exception as e:
+            print("AppStream snapshot unavailable: {}".format(e))
+            return False
+
+        if blob.get("version") != SNAPSHOT_VERSION or \
+                blob.get("key") != self.key:
+            print("AppStream snapshot is stale")
+            return False
+
+        self.set_records(blob["apps"])
+        print("AppStream snapshot loaded in {:.2f}ms".format(
+            (time.time() - start) * 1000))
+        return True
+
+    def save_from_store(self, store):
+        """ Snapshot the given (fully loaded) store and write it out """
+        self.key = self.compute_key()
+        records = [pack_app(x) for x in store.get_apps()]
+        blob = {
+            "version": SNAPSHOT_VERSION,
+            "key": self.key,
+            "apps": records,
+        }
+        tmp = "{}.{}".format(self.path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(marshal.dumps(blob))
+            os.rename(tmp, self.path)
+        except Exception as e:
+            print("Unable to write AppStream snapshot: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+        self.set_records(records)
+
+    def set_records(self, records):
+        self.apps = [AppSnapshotApp(self, x) for x in records]
+        self.pkgnames = dict()
+        for app in self.apps:
+            for pkgname in app.get_pkgnames():
+                self.pkgnames.setdefault(pkgname, app)
+
+    def get_apps(self):
+        return self.apps
+
+    def get_app_by_pkgname(self, pkgname):
+        return self.pkgnames.get(pkgname)
+
+    def get_full_store(self):
+        """ Load the real AppStream store on demand """
+        with self.lock:
+            if self.full_store is None:
+                start = time.time()
+                store = As.Store()
+                store.load(As.StoreLoadFlags.APP_INFO_SYSTEM)
+                self.full_store = store
+                print("AppStream store loaded in {:.2f}s".format(
+                    time.time() - start))
+            return self.full_store
+
+    def get_full_app(self, id):
+        return self.get_full_store().get_app_by_id(id)
+
+
+def pack_app(app):
+    """ Flatten an AsApp into a marshal-friendly record """
+    icons = []
+    for icon in app.get_icons():
+        icons.append((int(icon.get_kind()),
+                      icon.get_name(),
+                      icon.get_prefix(),
+                      icon.get_filename(),
+                      icon.get_width(),
+                      icon.get_height(),
+                      icon.get_scale()))
+
+    screenshots = []
+    for screen in app.get_screenshots() or []:
+        images = []
+        for img in screen.get_images():
+            images.append((img.get_width(), img.get_height(), img.get_url()))
+        screenshots.append((int(screen.get_kind()), images))
+
+    urls = dict()
+    for kind in SNAPSHOT_URL_KINDS:
+        url = app.get_url_item(kind)
+        if url:
+            urls[int(kind)] = url
+
+    launchable = None
+    launch = app.get_launchable_by_kind(As.LaunchableKind.DESKTOP_ID)
+    if launch is not None:
+        launchable = launch.get_value()
+
+    return {
+        "id": app.get_id(),
+        "kind": int(app.get_kind()),
+        "pkgnames": list(app.get_pkgnames() or []),
+        "name": app.get_name("C"),
+        "comment": app.get_comment("C"),
+        "developer": app.get_developer_name("C"),
+        "keywords": list(app.get_keywords("C") or []),
+        "urls": urls,
+        "launchable": launchable,
+        "icons": icons,
+        "screenshots": screenshots,
+    }
@@ -13,6 +13,13 @@
 
 from gi.repository import AppStreamGlib as As
 from gi.repository import GLib, GdkPixbuf, Gtk, Gdk
+from .appsnapshot import AppSnapshot
+from .util import sc_cache_dir
+from .util.lru import ScLruCache
+import os
+import Queue
+import shutil
+import threading
 
 
 class Screenshot:
@@ -65,6 +72,53 @@ class Screenshot:
         self.thumb_uri = thumbnail.get_url()
 
 
+# Decoded icons kept in memory
+ICON_CACHE_SIZE = 512
+
+# Kinds of cached icon
+ICON_NAME = 0
+ICON_PIXBUF = 1
+ICON_SURFACE = 2
+
+ICON_FALLBACK = (ICON_NAME, "package-x-generic")
+
+
+class AppStoreIndex:
+    """ Precomputed lookup table for a single AsStore, replacing the
+        pkgname -> id -> id.desktop probing for every query.
+
+        Escaped names and summaries are memoised alongside, and the whole
+        thing is thrown away whenever the store changes.
+    """
+
+    apps = None
+    names = None
+    summaries = None
+    screenshots = None
+
+    def __init__(self, store):
+        self.names = dict()
+        self.summaries = dict()
+        self.screenshots = dict()
+
+        by_desktop = dict()
+        by_id = dict()
+        by_pkgname = dict()
+        for app in store.get_apps():
+            app_id = app.get_id()
+            if app_id:
+                by_id.setdefault(app_id, app)
+                if app_id.endswith(".desktop"):
+                    by_desktop.setdefault(app_id[:-8], app)
+            for pkgname in app.get_pkgnames():
+                by_pkgname.setdefault(pkgname, app)
+
+        # Later updates take priority, matching the old probing order
+        self.apps = by_desktop
+        self.apps.update(by_id)
+        self.apps.update(by_pkgname)
+
+
 class AppSystem:
     """ Mux calls into AppStream where appropriate.
 
@@ -72,47 +126,113 @@ class AppSystem:
         by hooking into AppSystem, and falling back to the native fields
         in the .eopkg's
 
+        The system store is usually an AppSnapshot rather than a real
+        AsStore, which only implements the parts of the API used here.
+
         TODO: Locale integration
     """
 
     store = None
-
-    store = None
+    store_key = None  # Fingerprint of the system AppStream data
     fetcher = None
 
     scale_factor = 1
     window = None
 
+    # store -> AppStoreIndex
+    indexes = None
+    index_lock = None
+
+    # (id, size, scale) -> (kind, icon)
+    icon_cache = None
+    icon_waiters = None
+    icon_lock = None
+    icon_queue = None
+    thumb_dir = None
+
     def __init__(self):
-        self.store = As.Store()
-        self.store.load(As.StoreLoadFlags.APP_INFO_SYSTEM)
+        self.indexes = dict()
+        self.index_lock = threading.Lock()
+        self.icon_cache = ScLruCache(ICON_CACHE_SIZE)
+        self.icon_waiters = dict()
+        self.icon_lock = threading.Lock()
+        self.icon_queue = Queue.Queue(0)
+
+        # Prefer the compact snapshot, only parsing AppStream when stale
+        snapshot = AppSnapshot()
+        if snapshot.load():
+            self.store = snapshot
+        else:
+            self.store = As.Store()
+            self.store.load(As.StoreLoadFlags.APP_INFO_SYSTEM)
+            snapshot.save_from_store(self.store)
+        self.store_key = snapshot.key
+        self.get_index(self.store)
+
+        self.init_thumbnails(snapshot.key)
+        thr = threading.Thread(target=self.icon_thread)
+        thr.daemon = True
+        thr.start()
+
+    def init_thumbnails(self, key):
+        """ Icon thumbnails are only valid for this AppStream data, so
+            throw away any from older metadata """
+        self.thumb_dir = sc_cache_dir("icons", key[:16])
+        root = os.path.dirname(self.thumb_dir)
+        for entry in os.listdir(root):
+            path = os.path.join(root, entry)
+            if path == self.thumb_dir:
+                continue
+            try:
+                shutil.rmtree(path)
+            except Exception as e:
+                print("Unable to remove stale icons {}: {}".format(path, e))
 
     def sanitize(self, text):
         return text.replace("&quot;", "\"")
 
+    def get_index(self, store):
+        """ Return the lookup index for the store, building it if needed """
+        with self.index_lock:
+            index = self.indexes.get(store)
+            if index is not None:
+                return index
+            if store not in self.indexes:
+                store.connect('changed', self.on_store_changed)
+            index = AppStoreIndex(store)
+            self.indexes[store] = index
+            return index
+
+    def on_store_changed(self, store, udata=None):
+        """ Rebuild lazily on the next lookup """
+        with self.index_lock:
+            self.indexes[store] = None
+
     def get_store_variant(self, store, id):
         """ Helper to find the package """
         if not store:
             store = self.store
-        ret = store.get_app_by_pkgname(id)
-        if ret:
-            return ret
-        ret = store.get_app_by_id(id)
-        if ret:
-            return ret
-        return store.get_app_by_id(id + ".desktop")
+        return self.get_index(store).apps.get(id)
 
     def get_summary(self, id, fallback, store=None):
         """ Return a usable summary for a package """
-        app = self.get_store_variant(store, id)
-        ret = None
+        index = self.get_index(store or self.store)
+        key = (id, str(fallback))
+        ret = index.summaries.get(key)
+        if ret is not None:
+            return ret
+
+        app = index.apps.get(id)
         if not app:
             ret = GLib.markup_escape_text(str(fallback))
         else:
             ret = app.get_comment("C")
         if not ret:
-            return self.sanitize(fallback)
-        return self.sanitize(ret)
+            ret = self.sanitize(fallback)
+        else:
+            ret = self.sanitize(ret)
+        index.summaries[key] = ret
+        return ret
 
     def get_description(self, id, fallback, store=None):
         """ Return a usable description for a package """
@@ -127,13 +247,23 @@ class AppSystem:
         return c
 
     def get_name(self, id, fallback, store=None):
-        app = self.get_store_variant(store, id)
+        index = self.get_index(store or self.store)
+        key = (id, str(fallback))
+        ret = index.names.get(key)
+        if ret is not None:
+            return ret
+
+        app = index.apps.get(id)
         if not app:
-            return GLib.markup_escape_text(str(fallback))
-        ret = app.get_name("C")
-        if not ret:
-            return self.sanitize(fallback)
-        return GLib.markup_escape_text(self.sanitize(ret))
+            ret = GLib.markup_escape_text(str(fallback))
+        else:
+            ret = app.get_name("C")
+            if not ret:
+                ret = self.sanitize(fallback)
+            else:
+                ret = GLib.markup_escape_text(self.sanitize(ret))
+        index.names[key] = ret
+        return ret
 
     def _get_appstream_url(self, id, ptype, store):
         """ Get an appstream link for the given package """
@@ -172,7 +302,12 @@ class AppSystem:
         image.set_from_icon_name("package-x-generic", Gtk.IconSize.INVALID)
 
     def set_image_from_item(self, image, item, store=None, size=64):
-        """ Set the GtkImage if possible """
+        """ Set the GtkImage if possible
+
+            Decoded icons are cached per (id, size, scale). On a miss the
+            fallback is shown right away, and the image is updated once the
+            icon thread has decoded it.
+        """
         icon_name = item.get_icon_name()
         if icon_name:
             image.set_from_icon_name(icon_name, Gtk.IconSize.INVALID)
@@ -187,39 +322,118 @@ class AppSystem:
             self.set_fallback_icon(image)
             return
 
-        size = size * self.scale_factor
+        key = (id, size, self.scale_factor)
+        image.sc_icon_key = key
+        icon = self.icon_cache.get(key)
+        if icon is not None:
+            self.apply_icon(image, icon)
+            return
+
+        self.set_fallback_icon(image)
+        self.queue_icon(key, app, image)
+
+    def queue_icon(self, key, app, image=None):
+        """ Have the icon thread decode the icon, unless it already is """
+        with self.icon_lock:
+            waiters = self.icon_waiters.get(key)
+            if waiters is not None:
+                if image is not None:
+                    waiters.append(image)
+                return
+            self.icon_waiters[key] = [image] if image is not None else []
+        self.icon_queue.put((key, app))
+
+    def apply_icon(self, image, icon):
+        """ Set a cached (kind, value) icon on the image """
+        kind, value = icon
+        if kind == ICON_NAME:
+            image.set_from_icon_name(value, Gtk.IconSize.INVALID)
+        elif kind == ICON_PIXBUF:
+            image.set_from_pixbuf(value)
+        else:
+            image.set_from_surface(value)
+
+    def icon_thread(self):
+        """ Decode icons off the main thread, forever """
+        while True:
+            key, app = self.icon_queue.get()
+            try:
+                icon = self.decode_icon(key, app)
+            except Exception as e:
+                print("Should not happen: {}".format(e))
+                icon = ICON_FALLBACK
+            GLib.idle_add(self.icon_ready, key, icon)
+
+    def icon_ready(self, key, icon):
+        """ Cache the decoded icon and update everyone waiting on it """
+        cacheable = True
+        if icon[0] == ICON_PIXBUF and key[2] != 1:
+            icon = self.make_surface(icon[1], key[2])
+            cacheable = icon[0] == ICON_SURFACE
+
+        if cacheable:
+            self.icon_cache.put(key, icon)
+        with self.icon_lock:
+            waiters = self.icon_waiters.pop(key, [])
+        for image in waiters:
+            if getattr(image, "sc_icon_key", None) == key:
+                self.apply_icon(image, icon)
+        return False
+
+    def make_surface(self, pbuf, scale):
+        """ HiDPI needs a scaled surface rather than the pixbuf """
+        window = self.window.get_window()
+        if not window:
+            return ICON_FALLBACK
+        try:
+            surface = Gdk.cairo_surface_create_from_pixbuf(pbuf, scale, window)
+            return (ICON_SURFACE, surface)
+        except Exception as e:
+            print(e)
+            return ICON_FALLBACK
+
+    def get_thumbnail_path(self, key):
+        """ Where the pre-scaled icon lives on disk """
+        id, size, scale = key
+        name = "{}-{}x{}.png".format(id.replace(os.sep, "_"), size, scale)
+        return os.path.join(self.thumb_dir, name)
+
+    def decode_icon(self, key, app):
+        """ Produce the (kind, value) icon for the key. Runs on the icon
+            thread, and never touches the widgets """
+        thumb = self.get_thumbnail_path(key)
+        if os.path.exists(thumb):
+            try:
+                pbuf = GdkPixbuf.Pixbuf.new_from_file(thumb)
+                return (ICON_PIXBUF, pbuf)
+            except Exception as e:
+                print("Invalid icon thumbnail {}: {}".format(thumb, e))
+
+        id, size, scale = key
+        size = size * scale
         original_size = size
 
         # No icon?
         icon = self.find_icon(app, size, size)
         if not icon:
-            size /= self.scale_factor
+            size /= scale
             icon = self.find_icon(app, size, size)
         if not icon:
-            self.set_fallback_icon(image)
-            return
+            return ICON_FALLBACK
 
         # Find out what kind of icon this is
         kind = icon.get_kind()
         if kind == As.IconKind.STOCK:
-            image.set_from_icon_name(icon.get_name(), Gtk.IconSize.INVALID)
-            return
+            return (ICON_NAME, icon.get_name())
 
         # We're dealing with an unknown
         if kind == As.IconKind.UNKNOWN or kind == As.IconKind.REMOTE:
-            self.set_fallback_icon(image)
-            return
+            return ICON_FALLBACK
 
-        icon.set_scale(self.scale_factor)
+        icon.set_scale(scale)
         # Try to load the cached/available icon
-        try:
-            if not icon.load(As.IconLoadFlags.SEARCH_SIZE):
-                self.set_fallback_icon(image)
-                return
-        except Exception as e:
-            print("Should not happen: {}".format(e))
-            self.set_fallback_icon(image)
-            return
+        if not icon.load(As.IconLoadFlags.SEARCH_SIZE):
+            return ICON_FALLBACK
 
         # At this point we're dealing with pixbufs
         pbuf = icon.get_pixbuf()
@@ -231,24 +445,12 @@ class AppSystem:
                 original_size,
                 GdkPixbuf.InterpType.BILINEAR)
 
-        if self.scale_factor == 1:
-            image.set_from_pixbuf(pbuf)
-            return
-
-        window = self.window.get_window()
-        if not window:
-            self.set_fallback_icon(image)
-            return
-
         try:
-            surface = Gdk.cairo_surface_create_from_pixbuf(
-                pbuf,
-                self.scale_factor,
-                window)
-            image.set_from_surface(surface)
+            pbuf.savev(thumb, "png", [], [])
         except Exception as e:
-            print(e)
-            self.set_fallback_icon(image)
+            print("Unable to cache icon {}: {}".format(thumb, e))
+
+        return (ICON_PIXBUF, pbuf)
 
     def get_donation_site(self, id, store=None):
         """ Get a donation link for the given package """
@@ -267,21 +469,40 @@ class AppSystem:
 
     def get_screenshots(self, id, store=None):
         """ Return wrapped Screenshot objects for the package """
-        app = self.get_store_variant(store, id)
-        if not app:
-            return None
-        screens = app.get_screenshots()
-        if not screens:
-            return None
-        ret = []
-        for screen in screens:
-            try:
-                img = Screenshot(screen, self.scale_factor)
-                ret.append(img)
-            except Exception as e:
-                print("Unable to load screen: {}".format(e))
+        index = self.get_index(store or self.store)
+        key = (id, self.scale_factor)
+        if key in index.screenshots:
+            return index.screenshots[key]
+
+        ret = None
+        app = index.apps.get(id)
+        screens = app.get_screenshots() if app else None
+        if screens:
+            ret = []
+            for screen in screens:
+                try:
+                    img = Screenshot(screen, self.scale_factor)
+                    ret.append(img)
+                except Exception as e:
+                    print("Unable to load screen: {}".format(e))
+        index.screenshots[key] = ret
         return ret
 
+    def prefetch_item(self, item, size=64):
+        """ Prime everything the details view looks up for the item,
+            returning its screenshots """
+        id = item.get_id()
+        store = item.get_store()
+        self.get_name(id, item.get_name(), store)
+        self.get_summary(id, item.get_summary(), store)
+
+        app = self.get_store_variant(store, id)
+        if app and not item.get_icon_name():
+            key = (id, size, self.scale_factor)
+            if self.icon_cache.get(key) is None:
+                self.queue_icon(key, app)
+        return self.get_screenshots(id, store)
+
     def get_launchable_id(self, id, store=None):
         """ Return the desktop file id for the given package """
         app = self.get_store_variant(store, id)
@@ -11,28 +11,58 @@
 #  (at your option) any later version.
 #
 
-from gi.repository import GObject, Gtk, Pango, Gdk
+from gi.repository import GObject, Gtk, Pango
 from xng.plugins.base import PopulationFilter, ItemStatus, ProviderItem
+from xng.plugins.base import CategoryRequest
+from .lazylist import ScLazyChild, ScLazyList
 from .loadpage import ScLoadingPage
+from .util import sc_debug
 import threading
 
+# Items are built a page at a time, so the first screenful appears without
+# waiting for the whole component
+CATEGORY_PAGE_SIZE = 48
 
-class ScItemButton(Gtk.FlowBoxChild):
+# Fetch the next page once we're this many screens from the end
+CATEGORY_PAGE_AHEAD = 1.0
+
+
+class ScCategoryPage:
+    """ Storage for a single page, which is only handed over to the view
+        once complete, and only if it is still wanted """
+
+    items = None
+
+    def __init__(self):
+        self.items = []
+
+    def add_item(self, id, item, popfilter):
+        self.items.append(item)
+
+
+class ScItemButton(Gtk.FlowBoxChild, ScLazyChild):
     """ Display an item in a pretty view """
 
     __gtype_name__ = "ScItemButton"
 
     item = None
+    appsystem = None
     action_button = None
-    name = None
 
     def __init__(self, appsystem, item):
         Gtk.FlowBoxChild.__init__(self)
         self.item = item
+        self.appsystem = appsystem
+        self.init_lazy()
+        self.get_style_context().add_class("category-item-row")
+
+    def build(self):
+        """ Build the real contents once we're visible """
+        appsystem = self.appsystem
+        item = self.item
         item_id = item.get_id()
 
         main_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, 0)
-        self.add(main_box)
 
         store = item.get_store()
 
@@ -48,7 +78,6 @@ class ScItemButton(Gtk.FlowBoxChild):
 
         # Get the title
         name = appsystem.get_name(item_id, item.get_name(), store)
-        self.name = name
         label = Gtk.Label(name)
         label.get_style_context().add_class("sc-bold")
         label.set_use_markup(True)
@@ -70,10 +99,8 @@ class ScItemButton(Gtk.FlowBoxChild):
         summary.set_max_width_chars(50)
         stride_box.pack_start(summary, False, False, 0)
 
-        self.get_style_context().add_class("category-item-row")
-
         if item.has_status(ItemStatus.META_VIRTUAL):
-            return
+            return main_box
 
         action_name = _("Install")
         action_style = "suggested-action"
@@ -94,6 +121,8 @@ class ScItemButton(Gtk.FlowBoxChild):
         else:
             self.action_button.get_style_context().add_class(action_style)
 
+        return main_box
+
 
 class ScComponentButton(Gtk.ToggleButton):
     """ Represent components in a category """
@@ -121,6 +150,14 @@ class ScComponentButton(Gtk.ToggleButton):
         lab.set_valign(Gtk.Align.CENTER)
         box.pack_start(lab, True, True, 0)
 
+        count = self.component.get_count()
+        if count is not None:
+            lab = Gtk.Label.new(str(count))
+            lab.set_margin_start(6)
+            lab.set_valign(Gtk.Align.CENTER)
+            lab.get_style_context().add_class("dim-label")
+            box.pack_end(lab, False, False, 0)
+
         self.get_style_context().add_class("group-button")
         self.get_style_context().add_class("flat")
 
@@ -140,10 +177,15 @@ class ScCategoriesView(Gtk.Box):
 
     item_scroller = None
     item_list = None
+    items = None
 
     item_first = None
     load_page = None
 
+    # The most recent page request, and whether it is still in flight
+    request = None
+    page_pending = False
+
     software_label = None
 
     def get_page_name(self):
@@ -213,7 +255,6 @@ class ScCategoriesView(Gtk.Box):
             Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
         self.item_scroller.set_overlay_scrolling(False)
         self.item_list = Gtk.FlowBox.new()
-        self.item_list.set_sort_func(self.sort_categories)
         self.item_list.set_activate_on_single_click(True)
         self.item_list.connect('child-activated', self.item_activated)
         self.item_list.set_row_spacing(12)
@@ -225,10 +266,29 @@ class ScCategoriesView(Gtk.Box):
         self.item_list.set_valign(Gtk.Align.START)
         self.item_view.pack_start(self.item_scroller, True, True, 0)
 
+        self.items = ScLazyList(self.item_list, self.create_child,
+                                self.sort_key)
+        self.items.set_scroller(self.item_scroller)
+
+        # Fetch more as we near the end, or while the view isn't full yet
+        adj = self.item_scroller.get_vadjustment()
+        adj.connect('value-changed', lambda x: self.check_next_page())
+        adj.connect('changed', lambda x: self.check_next_page())
+
         self.show_all()
 
-    def sort_categories(self, catA, catB):
-        return cmp(catA.name.lower(), catB.name.lower())
+    def create_child(self, item):
+        """ Model binding: create the (placeholder) child for an item """
+        wid = ScItemButton(self.context.appsystem, item)
+        wid.show()
+        return wid
+
+    def sort_key(self, item):
+        """ Items are sorted by their display name """
+        name = self.context.appsystem.get_name(item.get_id(),
+                                               item.get_name(),
+                                               item.get_store())
+        return name.lower()
 
     def item_activated(self, box, child, udata=None):
         """ An item in the component listing is being interacted with """
@@ -295,7 +355,11 @@ class ScCategoriesView(Gtk.Box):
 
     def select_component(self, component):
         """ Activate the current component """
-        print("Component: {}".format(component.get_id()))
+        sc_debug("Component: {}".format(component.get_id()))
+
+        # Clear out the old items
+        self.items.clear()
+        self.reset_scroller()
 
         # Move into busy state
         self.begin_busy()
@@ -304,8 +368,15 @@ class ScCategoriesView(Gtk.Box):
         while (Gtk.events_pending()):
             Gtk.main_iteration()
 
-        # Populate storage in a thread now
-        thre = threading.Thread(target=self.build_component, args=(component,))
+        self.request_page(CategoryRequest(component, 0, CATEGORY_PAGE_SIZE,
+                                          self.context.appsystem))
+
+    def request_page(self, request):
+        """ Build the page in a thread, superseding any other request """
+        self.request = request
+        self.page_pending = True
+        thre = threading.Thread(target=self.build_page, args=(request,))
+        thre.daemon = True
         thre.start()
 
     def begin_busy(self):
@@ -320,38 +391,43 @@ class ScCategoriesView(Gtk.Box):
         self.context.set_window_busy(False)
         self.components.set_sensitive(True)
         self.stack.set_visible_child_name("items")
+        return False
 
-    def build_component(self, component):
-        """ Begin building the component in a thread """
-
-        # Clear out the old items
-        Gdk.threads_enter()
-        for sproglet in self.item_list.get_children():
-            self.item_list.remove(sproglet)
-        Gdk.threads_leave()
-
-        for plugin in self.context.plugins:
-            plugin.populate_storage(self,
-                                    PopulationFilter.CATEGORY,
-                                    component)
+    def build_page(self, request):
+        """ Build a page of the component in a thread """
+        page = ScCategoryPage()
+        self.context.populate_storage(page,
+                                      PopulationFilter.CATEGORY,
+                                      request)
+        GObject.idle_add(self.page_built, request, page.items)
+
+    def page_built(self, request, items):
+        """ A page is ready, so show it unless it has been superseded """
+        if request is not self.request:
+            return False
+        self.page_pending = False
+        self.items.append(items)
+        if request.get_offset() == 0:
+            self.end_busy()
+        self.check_next_page()
+        return False
 
-        GObject.idle_add(self.reset_scroller)
+    def check_next_page(self):
+        """ Ask for the next page if we're close enough to the end """
+        request = self.request
+        if request is None or self.page_pending:
+            return
+        if not request.get_has_more():
+            return
+        adj = self.item_scroller.get_vadjustment()
+        ahead = adj.get_page_size() * (1 + CATEGORY_PAGE_AHEAD)
+        if adj.get_value() + ahead < adj.get_upper():
+            return
+        self.request_page(request.next_page())
 
     def reset_scroller(self):
-        """ Called back on idle loop to reset scroll position """
-        # Reset scroll policy now
+        """ Reset scroll position for a new component """
         policy = self.item_scroller.get_vadjustment()
         policy.set_value(0)
         policy = self.item_scroller.get_hadjustment()
         policy.set_value(0)
-
-        self.end_busy()
-        return False
-
-    def add_item(self, id, item, popfilter):
-        """ Adding new item.. """
-        Gdk.threads_enter()
-        wid = ScItemButton(self.context.appsystem, item)
-        self.item_list.add(wid)
-        wid.show_all()
-        Gdk.threads_leave()
@@ -15,8 +15,10 @@ from .appsystem import AppSystem
 from .executor import Executor
 from .op_queue import OperationType
 from .plan_view import ScPlanView
+from .populator import ScPopulator
 from .util.fetcher import ScMediaFetcher
 from .util.desktop import ScDesktopIntegration
+from .warmup import ScWarmup
 from gi.repository import GObject, GLib
 import threading
 
@@ -32,6 +34,8 @@ class ScContext(GObject.Object):
     window = None
     desktop = None
     plan_view = None
+    populator = None
+    warmup = None
 
     sources_count = 0
 
@@ -49,6 +53,7 @@ class ScContext(GObject.Object):
         self.executor.connect('refreshed', self.on_refreshed)
         self.desktop = ScDesktopIntegration()
         self.plan_view = ScPlanView(self)
+        self.populator = ScPopulator()
 
     def begin_load(self):
         """ Request a load for the system, i.e. after all components are
@@ -58,6 +63,7 @@ class ScContext(GObject.Object):
         self.has_loaded = True
         self.init_plugins()
         self.fetcher = ScMediaFetcher()
+        self.warmup = ScWarmup(self)
 
         # Lazy load now
         thr = threading.Thread(target=self.build_data)
@@ -134,6 +140,14 @@ class ScContext(GObject.Object):
         # LDM is actually hella important
         self.init_ldm_plugin()
 
+    def populate_storage(self, storage, popfilter, extra, exclude=None,
+                         cancellable=None):
+        """ Populate the storage from all plugins (bar exclude) in parallel,
+            blocking until they're done or have timed out """
+        plugins = [x for x in self.plugins if x != exclude]
+        self.populator.populate(storage, popfilter, extra, plugins,
+                                cancellable=cancellable)
+
     def emit_loaded(self):
         """ Emitted on the main thread to let the application know we're now
             ready and have available AppSystem data, etc. """
@@ -146,11 +160,11 @@ class ScContext(GObject.Object):
         self.appsystem = AppSystem()
         GLib.idle_add(self.emit_loaded)
 
-    def prepare_plan_view(self, item, operation_type):
+    def prepare_plan_view(self, item, operation_type, plugin=None):
         """ Prepare the dialog for the operation """
         print("BEGIN PLAN VIEW!")
         self.window.open_plan_view()
-        self.plan_view.prepare(item, operation_type)
+        self.plan_view.prepare(item, operation_type, plugin)
         print("END PLAN VIEW")
 
     def begin_install(self, item):
@@ -177,6 +191,11 @@ class ScContext(GObject.Object):
         """ Begin the work necessary to remove a package """
         self.prepare_plan_view(item, OperationType.REMOVE)
 
+    def begin_upgrade(self, plugin):
+        """ Begin the work necessary to apply every update the plugin
+            has, as a single transaction """
+        self.prepare_plan_view(None, OperationType.UPGRADE, plugin)
+
     def set_window_busy(self, busy):
         if not self.window:
             return
@@ -208,5 +227,5 @@ class ScContext(GObject.Object):
 
     def enqueue_update_refresh(self):
         """ Tell the window to check for updates through the updates view """
-        # GLib.idle_add(self.window.begin_check_updates)
+        GLib.idle_add(self.window.begin_check_updates)
         return False
@@ -13,7 +13,9 @@
 
 
 from .op_queue import OperationQueue, Operation, OperationType
-from gi.repository import GObject, Gdk, GLib, Notify
+from .progress import ScProgressChannel
+from .util import sc_debug
+from gi.repository import GObject, Gdk, Gio, GLib, Notify
 from threading import Lock, Thread
 
 
@@ -26,11 +28,11 @@ class Executor(GObject.Object):
     thread_lock = None
     thread_running = False
 
-    progress_string = None
-    progress_value = None
+    progress = None
     job_description = None
     notification = None
     context = None
+    settings = None
 
     __gtype_name__ = "ScExecutor"
 
@@ -48,7 +50,8 @@ class Executor(GObject.Object):
         GObject.Object.__init__(self)
         self.context = context
 
-        self.progress_value = 0.0
+        self.progress = ScProgressChannel()
+        self.settings = Gio.Settings.new("com.solus-project.software-center")
         # Management of the work queue
         self.queue = OperationQueue()
         self.thread_lock = Lock()
@@ -60,26 +63,29 @@ class Executor(GObject.Object):
 
             This should be called by the backend being executed
         """
-        Gdk.threads_enter()
-        self.progress_string = msg
-        print(msg)
-        Gdk.threads_leave()
+        self.progress.set_message(msg)
 
     def get_progress_string(self):
-        return self.progress_string
+        return self.progress.get_message()
 
     def get_progress_value(self):
-        return self.progress_value
+        return self.progress.get_fraction()
 
     def set_progress_value(self, value):
         """ Set the current progress value that will be displayed
 
             This should be called by the backend being executed
         """
-        Gdk.threads_enter()
-        self.progress_value = value
-        print(value)
-        Gdk.threads_leave()
+        self.progress.set_fraction(value)
+
+    def set_download_progress(self, current, total):
+        """ Let us know the running download totals, so that the rate and
+            remaining time can be estimated """
+        self.progress.set_downloaded(current, total)
+
+    def get_download_eta(self):
+        """ Estimated seconds left on the download, or None """
+        return self.progress.get_eta()
 
     def get_job_description(self):
         return self.job_description
@@ -120,11 +126,11 @@ class Executor(GObject.Object):
         try:
             if not self.thread_running:
                 self.thread_running = True
-                print("debug: spawning new work thread")
+                sc_debug("spawning new work thread")
                 t = Thread(target=self.process_queue)
                 t.start()
             else:
-                print("debug: thread is already running")
+                sc_debug("thread is already running")
         finally:
             self.thread_lock.release()
 
@@ -132,40 +138,84 @@ class Executor(GObject.Object):
         """ Process the queue until it empties """
         while not self.queue.opstack.empty():
             item = self.queue.opstack.get()
+            succeeded = False
             try:
-                self.emit_dequeued(item)
+                item = self.merge_operations(item)
                 self.set_job_description(item)
                 self.begin_executor_busy(item)
-                self.process_queue_item(item)
+                self.prefetch_queue_item(item)
+                succeeded = self.process_queue_item(item)
+            except Exception as e:
+                # Keep going, the rest of the queue may still apply
+                print("Job failed: {}".format(e))
             finally:
-                self.end_executor_busy(item)
+                self.end_executor_busy(item, succeeded)
 
         # Queue ran out
-        print("queue emptied")
+        sc_debug("queue emptied")
         self.thread_lock.acquire()
         try:
             self.thread_running = False
         finally:
             self.thread_lock.release()
 
+    def merge_operations(self, item):
+        """ Fold any compatible pending operations into this one so the
+            plugin can apply them as a single transaction """
+        ops = [item] + self.queue.pop_compatible(item)
+        if len(ops) > 1:
+            plugin = item.data.get_plugin()
+            trans = None
+            try:
+                trans = plugin.merge_transactions(
+                    item.opType, [x.data for x in ops])
+            except Exception as e:
+                print("Unable to merge operations: {}".format(e))
+            if trans is None:
+                for op in ops[1:]:
+                    self.queue.push_operation(op)
+                ops = [item]
+            else:
+                sc_debug("merged {} operations".format(len(ops)))
+                item = Operation(trans, item.opType)
+
+        for op in ops:
+            self.emit_dequeued(op)
+        return item
+
     def set_job_description(self, item):
         """ Set appropriate job description for sidebar display """
         self.job_description = GLib.markup_escape_text(str(item.describe()))
         # Update our initial display label
-        self.progress_string = "{}…".format(_("Waiting"))
+        self.progress.reset("{}…".format(_("Waiting")))
+
+    def prefetch_queue_item(self, item):
+        """ Let the plugin download ahead of time, if the user wants it """
+        if item.opType not in [OperationType.INSTALL, OperationType.UPGRADE]:
+            return
+        if not self.settings.get_boolean("prefetch-packages"):
+            return
+        try:
+            item.data.get_plugin().prefetch_item(self, item.data)
+        except Exception as e:
+            # Not fatal, the plugin will just fetch as it goes
+            print("Prefetch failed: {}".format(e))
 
     def process_queue_item(self, item):
-        """ Handle execution of a single item """
+        """ Handle execution of a single item, returning False if the
+            plugin reports it failed or was cancelled """
         plugin = item.data.get_plugin()
+        ret = None
         # Process
         if item.opType == OperationType.INSTALL:
-            plugin.install_item(self, item.data)
+            ret = plugin.install_item(self, item.data)
         elif item.opType == OperationType.REMOVE:
-            plugin.remove_item(self, item.data)
+            ret = plugin.remove_item(self, item.data)
         elif item.opType == OperationType.UPGRADE:
-            plugin.remove_item(self, item.data)
+            ret = plugin.upgrade_item(self, item.data)
         elif item.opType == OperationType.REFRESH:
-            plugin.refresh_source(self, item.data)
+            ret = plugin.refresh_source(self, item.data)
+        return ret is not False
 
     def begin_executor_busy(self, item):
         """ Let listeners know the executor is stepping into a job now """
@@ -173,13 +223,13 @@ class Executor(GObject.Object):
         self.emit('execution-started')
         Gdk.threads_leave()
 
-    def end_executor_busy(self, item):
+    def end_executor_busy(self, item, succeeded=True):
         """ Let listeners know we're done for now """
         Gdk.threads_enter()
         self.emit('execution-ended')
         if item.opType == OperationType.REFRESH:
             self.emit('refreshed')
-        else:
+        elif succeeded:
             self.notify_ended(item)
         Gdk.threads_leave()
 
@@ -189,17 +239,22 @@ class Executor(GObject.Object):
         app_name = self.context.appsystem.get_name(id, item.get_name())
         return GLib.markup_escape_text(str(app_name))
 
+    def get_item_names(self, transaction):
+        """ Nice names for every item requested in the transaction """
+        return ", ".join([self.get_item_name(x)
+                          for x in transaction.get_primary_items()])
+
     def notify_ended(self, item):
         """ Send a notification to indicate job ending """
         icon_name = "system-software-install"
         body = None
         title = None
         if item.opType == OperationType.INSTALL:
-            name = self.get_item_name(item.data.primary_item)
+            name = self.get_item_names(item.data)
             title = _("New software installed")
             body = _("Installed {}").format(name)
         elif item.opType == OperationType.REMOVE:
-            name = self.get_item_name(item.data.primary_item)
+            name = self.get_item_names(item.data)
             title = _("Software removed")
             body = _("Removed {}").format(name)
         elif item.opType == OperationType.UPGRADE:
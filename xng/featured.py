@@ -192,6 +192,7 @@ class ScFeatured(Gtk.EventBox):
         self.pages.append(page)
         self.dots.append(thumb)
         self.navigate(0)
+        self.context.warmup.add_item(item)
 
     def on_button_press_event(self, widget, udata=None):
         """ Handle pressing of the dot """
@@ -239,11 +240,10 @@ class ScFeaturedEmbed(Gtk.Revealer):
 
     def on_context_loaded(self, context):
         """ Fill the featured view in  """
-        for plugin in self.context.plugins:
-            # Build the featured view
-            plugin.populate_storage(
-                self.widget, PopulationFilter.FEATURED,
-                self.context.appsystem)
+        # Build the featured view
+        self.context.populate_storage(
+            self.widget, PopulationFilter.FEATURED,
+            self.context.appsystem)
         self.loaded = True
         self.slide_down_show()
 
@@ -174,15 +174,15 @@ class ScHomeView(Gtk.Box):
         thr.start()
 
     def build_view(self):
+        # Build the categories
         for plugin in self.context.plugins:
-            # Build the categories
             for cat in plugin.categories():
                 self.add_category(plugin, cat)
 
-            # Build the recently updated view
-            plugin.populate_storage(
-                self, PopulationFilter.RECENT,
-                self.context.appsystem)
+        # Build the recently updated view
+        self.context.populate_storage(
+            self, PopulationFilter.RECENT,
+            self.context.appsystem)
 
         # Allow the window to become "fully loaded" now
         GObject.idle_add(self.context.window_done)
@@ -230,3 +230,4 @@ class ScHomeView(Gtk.Box):
         button.connect("clicked", self.on_recent_clicked)
         button.show_all()
         box.add(button)
+        self.context.warmup.add_item(item)
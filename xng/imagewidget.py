@@ -111,6 +111,14 @@ class ScImageWidget(Gtk.Frame):
             self.page_loading.set_size_request(64, 64)
         self.stack.add_named(self.page_loading, "page-loading")
 
+    def get_fetch_size(self):
+        """ The (width, height, scale) our images should be decoded at """
+        if self.thumbnail:
+            return (As.IMAGE_THUMBNAIL_WIDTH, As.IMAGE_THUMBNAIL_HEIGHT,
+                    self.get_scale_factor())
+        return (As.IMAGE_LARGE_WIDTH, As.IMAGE_LARGE_HEIGHT,
+                self.get_scale_factor())
+
     def show_image(self, uri, pbuf):
         """ Show the loaded image and switch to it on the view """
         self.uri = uri
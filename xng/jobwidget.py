@@ -29,7 +29,7 @@ class ScJobWidget(Gtk.Box):
     size_group = None
 
     context = None
-    monitor_id = None
+    monitoring = False
 
     def __init__(self, context=None):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL)
@@ -74,38 +74,30 @@ class ScJobWidget(Gtk.Box):
         # Make sure we know what the context is doing
         self.context.executor.connect('execution-started', self.start_exec)
         self.context.executor.connect('execution-ended', self.end_exec)
+        self.context.executor.progress.connect('changed',
+                                               self.on_progress_changed)
 
     def start_exec(self, executor):
         """ Executor started a job, start monitoring now """
-        # Stop existing monitor
-        if self.monitor_id is not None:
-            print("Removing old monitor")
-            GLib.source_remove(self.monitor_id)
-            self.monitor_id = None
-
         # Give us an appropriate display label
         self.title_label.set_markup("<small>{}</small>".format(
             self.context.executor.get_job_description()))
 
-        # Set up new monitor
-        print("Adding new monitor")
-        self.monitor_id = GLib.timeout_add(50, self.monitor_callback)
+        self.monitoring = True
+        self.on_progress_changed(executor.progress)
 
     def end_exec(self, executor):
         """ Executor ended a job, stop monitoring now """
-        if self.monitor_id is not None:
-            print("Stopped old monitor")
-            GLib.source_remove(self.monitor_id)
-            self.monitor_id = None
-        pass
-
-    def monitor_callback(self):
-        """ Idle timer to routinely update our state """
+        self.monitoring = False
+
+    def on_progress_changed(self, progress):
+        """ The executor's progress channel only tells us about the latest
+            state, and at most once a frame """
+        if not self.monitoring:
+            return
         self.action_label.set_markup("<small>{}</small>".format(
-            self.context.executor.get_progress_string()))
-        self.progressbar.set_fraction(
-            self.context.executor.get_progress_value())
-        return self.monitor_id is not None
+            progress.get_message()))
+        self.progressbar.set_fraction(progress.get_fraction())
 
     def update_job(self, job):
         """ Update our appearance based on a pending job """
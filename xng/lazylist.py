@@ -0,0 +1,219 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from gi.repository import Gio, GObject, Gtk
+from xng.plugins.base import ProviderItem
+import bisect
+import threading
+
+# Maximum number of items to push into the model per idle iteration
+APPEND_BATCH = 200
+
+# Hydrate rows this far (in pages) outside of the viewport
+HYDRATE_OVERSCAN = 1.0
+
+# Start dehydrating rows that are offscreen once we have this many
+HYDRATE_LIMIT = 300
+
+
+class ScLazyChild(object):
+    """ Mixin for rows that start out as a cheap placeholder, and only
+        build their real widget tree once they become visible.
+
+        Implementations provide build(), returning the content widget.
+    """
+
+    content = None
+    placeholder_height = 64
+
+    def init_lazy(self):
+        self.set_size_request(-1, self.placeholder_height)
+
+    def is_hydrated(self):
+        return self.content is not None
+
+    def hydrate(self):
+        """ Build the real widget tree now """
+        if self.content is not None:
+            return
+        self.content = self.build()
+        self.add(self.content)
+        self.content.show_all()
+
+    def dehydrate(self):
+        """ Drop the widget tree, keeping our size so nothing moves """
+        if self.content is None:
+            return
+        self.set_size_request(-1, self.get_allocated_height())
+        self.content.destroy()
+        self.content = None
+
+
+class ScLazyList:
+    """ ScLazyList drives a Gtk.ListBox or Gtk.FlowBox through a model.
+
+        Items may be appended from any thread, and are pushed into the
+        Gio.ListStore in batches from a single idle callback. The container
+        only creates placeholder children for the model, and these are
+        hydrated on demand as they scroll into view.
+
+        If key_func is set, the items are kept sorted by that key.
+    """
+
+    model = None
+    container = None
+    scroller = None
+    key_func = None
+    keys = None
+
+    pending = None
+    lock = None
+    append_source = 0
+    hydrate_source = 0
+    hydrated = None
+
+    def __init__(self, container, create_func, key_func=None):
+        self.container = container
+        self.key_func = key_func
+        self.keys = []
+        self.pending = []
+        self.hydrated = set()
+        self.lock = threading.Lock()
+
+        self.model = Gio.ListStore.new(ProviderItem)
+        container.bind_model(self.model, create_func)
+        container.connect('size-allocate', self.on_size_allocate)
+
+    def set_scroller(self, scroller):
+        """ Track the viewport used to decide what is visible """
+        if scroller == self.scroller:
+            return
+        self.scroller = scroller
+        adj = scroller.get_vadjustment()
+        adj.connect('value-changed', lambda x: self.queue_hydrate())
+
+    def get_n_items(self):
+        return self.model.get_n_items()
+
+    def append(self, items):
+        """ Queue the items to be added to the model (thread-safe) """
+        with self.lock:
+            self.pending.extend(items)
+            if self.append_source:
+                return
+            self.append_source = GObject.idle_add(self.flush)
+
+    def clear(self):
+        """ Remove everything, including anything still pending """
+        with self.lock:
+            self.pending = []
+        self.keys = []
+        self.hydrated = set()
+        self.model.remove_all()
+
+    def flush(self):
+        """ Move the next batch of pending items into the model """
+        with self.lock:
+            batch = self.pending[:APPEND_BATCH]
+            self.pending = self.pending[APPEND_BATCH:]
+            more = len(self.pending) > 0
+            if not more:
+                self.append_source = 0
+
+        if self.key_func is None:
+            self.model.splice(self.model.get_n_items(), 0, batch)
+        else:
+            self.merge(batch)
+
+        self.queue_hydrate()
+        return more
+
+    def merge(self, batch):
+        """ Merge the batch into the sorted model, splicing each run of
+            items that lands in the same gap in one go """
+        rows = sorted([(self.key_func(x), x) for x in batch],
+                      key=lambda x: x[0])
+        runs = []
+        for key, item in rows:
+            i = bisect.bisect_right(self.keys, key)
+            if runs and runs[-1][0] == i:
+                runs[-1][1].append(key)
+                runs[-1][2].append(item)
+            else:
+                runs.append((i, [key], [item]))
+
+        # Back to front, so the earlier positions stay valid
+        for i, keys, items in reversed(runs):
+            self.keys[i:i] = keys
+            self.model.splice(i, 0, items)
+
+    def on_size_allocate(self, widget, alloc, udata=None):
+        self.queue_hydrate()
+
+    def queue_hydrate(self):
+        """ Hydrate visible children on the next idle """
+        if self.hydrate_source:
+            return
+        self.hydrate_source = GObject.idle_add(self.hydrate_visible)
+
+    def child_y(self, child):
+        """ Position of the child relative to the viewport """
+        coords = child.translate_coordinates(self.scroller, 0, 0)
+        if coords is None:
+            return None
+        return coords[1]
+
+    def hydrate_visible(self):
+        """ Build every placeholder in (or near) the viewport """
+        self.hydrate_source = 0
+        if self.scroller is None:
+            scroller = self.container.get_ancestor(Gtk.ScrolledWindow)
+            if scroller is None:
+                return False
+            self.set_scroller(scroller)
+        if not self.container.get_mapped():
+            return False
+
+        page = self.scroller.get_allocated_height()
+        top = -page * HYDRATE_OVERSCAN
+        bottom = page + page * HYDRATE_OVERSCAN
+        children = self.container.get_children()
+
+        # Children are laid out in model order, so find the first one
+        # that reaches into the visible area
+        lo = 0
+        hi = len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            y = self.child_y(children[mid])
+            if y is None:
+                return False
+            if y + children[mid].get_allocated_height() < top:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        visible = set()
+        for child in children[lo:]:
+            y = self.child_y(child)
+            if y is None or y > bottom:
+                break
+            child.hydrate()
+            visible.add(child)
+
+        self.hydrated.update(visible)
+        if len(self.hydrated) > HYDRATE_LIMIT:
+            for child in self.hydrated - visible:
+                child.dehydrate()
+            self.hydrated = visible
+        return False
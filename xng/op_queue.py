@@ -11,6 +11,7 @@
 #  (at your option) any later version.
 #
 
+import heapq
 import Queue
 
 from gi.repository import GObject
@@ -92,3 +93,22 @@ class OperationQueue:
     def push_operation(self, op):
         """ Set up an operation to be applied """
         self.opstack.put(op)
+
+    def pop_compatible(self, op):
+        """ Take any pending operations that could be applied in the same
+            transaction as op, i.e. installs or removals from one plugin
+        """
+        if op.opType not in [OperationType.INSTALL, OperationType.REMOVE]:
+            return []
+        plugin = op.data.get_plugin()
+
+        # PriorityQueue has no removal API, so edit the heap directly
+        with self.opstack.mutex:
+            pending = self.opstack.queue
+            ret = [x for x in pending if x.opType == op.opType and
+                   x.data.get_plugin() == plugin]
+            if ret:
+                taken = set(id(x) for x in ret)
+                pending[:] = [x for x in pending if id(x) not in taken]
+                heapq.heapify(pending)
+        return ret
@@ -120,6 +120,7 @@ class ScPlanView(Gtk.Box):
     box_upgrades = None
 
     label_space_used = None
+    label_download = None
     label_space_freed = None
 
     button_accept = None  # Allow remove/install/etc
@@ -127,6 +128,7 @@ class ScPlanView(Gtk.Box):
     body_pane = None
     scroller = None
     transaction = None
+    plugin = None
 
     def __init__(self, context):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL)
@@ -159,6 +161,14 @@ class ScPlanView(Gtk.Box):
         self.label_space_used.set_margin_bottom(6)
         self.label_space_used.set_halign(Gtk.Align.START)
 
+        # How much we need to fetch, and what deltas saved us
+        self.label_download = Gtk.Label.new("")
+        self.label_download.show_all()
+        self.label_download.set_no_show_all(True)
+        self.pack_start(self.label_download, False, False, 0)
+        self.label_download.set_margin_bottom(6)
+        self.label_download.set_halign(Gtk.Align.START)
+
         # Likewise for space freed
         self.label_space_freed = Gtk.Label.new("")
         self.label_space_freed.show_all()
@@ -212,10 +222,12 @@ class ScPlanView(Gtk.Box):
 
         self.body_pane.pack_start(self.box_upgrades, False, False, 0)
 
-    def prepare(self, item, operation_type):
-        """ Prepare to be shown on screen """
+    def prepare(self, item, operation_type, plugin=None):
+        """ Prepare to be shown on screen. A system upgrade has no item,
+            and is planned by the given plugin instead """
         self.item = item
         self.operation_type = operation_type
+        self.plugin = plugin or item.get_plugin()
         thr = threading.Thread(target=self.begin_operation)
 
         # TODO: Enforce modality so we can't dismiss!
@@ -229,7 +241,7 @@ class ScPlanView(Gtk.Box):
         # Get this dude in a second
         transaction = None
         self.transaction = None
-        plugin = self.item.get_plugin()
+        plugin = self.plugin
 
         if self.operation_type == OperationType.INSTALL:
             transaction = plugin.plan_install_item(self.item)
@@ -250,6 +262,10 @@ class ScPlanView(Gtk.Box):
         self.context.set_window_busy(False)
         self.transaction = transaction
 
+        # i.e. a system upgrade that found nothing left to do
+        self.button_accept.set_sensitive(
+            transaction.get_plugin() is not None)
+
         # Update boxes based on operation set
         self.box_installs.populate_from_set(transaction.installations)
         self.box_removals.populate_from_set(transaction.removals)
@@ -265,6 +281,18 @@ class ScPlanView(Gtk.Box):
         else:
             self.label_space_used.hide()
 
+        # Show download size?
+        if transaction.get_download_needed() > 0:
+            markup = _("<small>Download size: <b>{}</b></small>").format(
+                transaction.get_download_size())
+            if transaction.download_saved > 0:
+                saved = _("<small>(<b>{}</b> saved by delta updates)</small>")
+                markup += " " + saved.format(transaction.get_download_saved())
+            self.label_download.set_markup(markup)
+            self.label_download.show()
+        else:
+            self.label_download.hide()
+
         # Show remove size?
         if transaction.remove_size > 0:
             remove_size = transaction.get_removal_size()
@@ -11,7 +11,7 @@
 #  (at your option) any later version.
 #
 
-from gi.repository import GObject
+from gi.repository import GObject, Gio
 from xng.op_queue import OperationType
 from ..util import sc_format_size_local
 from collections import OrderedDict
@@ -72,6 +72,8 @@ class Transaction(GObject.Object):
 
     primary_item = None  # Associated primary item
 
+    primary_items = None  # All requested items, when merged
+
     removals = None  # Any removals we need to perform (conflicts)
 
     installations = None  # Any installations to be performed
@@ -84,6 +86,10 @@ class Transaction(GObject.Object):
 
     download_total = 0    # Total amount to download
     download_current = 0  # Total amount downloaded
+    download_cached = 0   # Amount already in the package cache
+    download_saved = 0    # Amount saved by downloading deltas
+
+    download_sizes = None  # Precomputed item ID -> download size
 
     install_size = 0  # Total installation size
     remove_size = 0   # Total removal size
@@ -96,15 +102,26 @@ class Transaction(GObject.Object):
         GObject.Object.__init__(self)
 
         self.primary_item = primary_item
+        self.primary_items = []
         self.op_counter = 0
         if primary_item:
             self.plugin = primary_item.get_plugin()
+            self.primary_items.append(primary_item)
 
         self.removals = set()
         self.installations = set()
         self.upgrades = set()
         self.items = dict()
 
+    def set_primary_items(self, items):
+        """ Used when several requests are planned as one transaction """
+        self.primary_item = items[0]
+        self.primary_items = list(items)
+        self.plugin = self.primary_item.get_plugin()
+
+    def get_primary_items(self):
+        return self.primary_items
+
     def set_autoremove(self, a):
         self.autoremove = a
 
@@ -157,9 +174,21 @@ class Transaction(GObject.Object):
         """ Pop an upgrade from the set of counted upgrades """
         self.upgrades.remove(item)
 
+    def set_download_sizes(self, sizes, cached=0, saved=0):
+        """ Plugins can size the whole transaction in one pass up front,
+            rather than have each item sized as it is pushed """
+        self.download_sizes = sizes
+        self.download_cached = cached
+        self.download_saved = saved
+
     def increment_download_size(self, item):
         """ Add the total download size we're going to need """
-        self.download_total += item.get_download_size()
+        size = None
+        if self.download_sizes is not None:
+            size = self.download_sizes.get(item.get_id())
+        if size is None:
+            size = item.get_download_size()
+        self.download_total += size
 
     def increment_install_size(self, item):
         """ Add to the total install size """
@@ -203,12 +232,13 @@ class Transaction(GObject.Object):
 
     def describe(self):
         sb = None
+        ids = ", ".join([x.get_id() for x in self.primary_items])
         if self.op_type == OperationType.INSTALL:
-            sb = "Install: {}".format(self.primary_item.get_id())
+            sb = "Install: {}".format(ids)
         elif self.op_type == OperationType.REMOVE:
-            sb = "Remove: {}".format(self.primary_item.get_id())
+            sb = "Remove: {}".format(ids)
         elif self.op_type == OperationType.UPGRADE:
-            sb = "Upgrade: {}".format(self.primary_item.get_id())
+            sb = "Upgrade: {}".format(ids)
 
         # Format for debug
         sb2 = sb
@@ -228,6 +258,18 @@ class Transaction(GObject.Object):
         """ Return string form of the total removal size """
         return sc_format_size_local(self.remove_size)
 
+    def get_download_needed(self):
+        """ Amount still to be downloaded, excluding cached packages """
+        return max(0, self.download_total - self.download_cached)
+
+    def get_download_size(self):
+        """ Return string form of the amount still to be downloaded """
+        return sc_format_size_local(self.get_download_needed())
+
+    def get_download_saved(self):
+        """ Return string form of the amount saved by deltas """
+        return sc_format_size_local(self.download_saved)
+
 
 class ProviderCategory(GObject.Object):
     """ ProviderCategory provides categorisation for the software center and
@@ -254,6 +296,10 @@ class ProviderCategory(GObject.Object):
         """ Get any nested child categories """
         return []
 
+    def get_count(self):
+        """ Number of items in this category, if cheaply known """
+        return None
+
     def get_software_label(self):
         """ Allow overriding the Software label in root-level categories """
         return None
@@ -324,10 +370,28 @@ class SearchRequest(GObject.Object):
 
     installed_only = False
     term = None
+    appsystem = None
+    cancellable = None
 
     def __init__(self, term):
         GObject.Object.__init__(self)
         self.term = term
+        self.cancellable = Gio.Cancellable.new()
+
+    def cancel(self):
+        """ This request has been superseded, plugins should stop """
+        self.cancellable.cancel()
+
+    def is_cancelled(self):
+        """ Plugins must poll this during population """
+        return self.cancellable.is_cancelled()
+
+    def set_appsystem(self, appsystem):
+        """ Allow plugins to enrich the search with AppStream data """
+        self.appsystem = appsystem
+
+    def get_appsystem(self):
+        return self.appsystem
 
     def set_installed_only(self, installed_only):
         """ Whether this request is for installed only """
@@ -340,6 +404,58 @@ class SearchRequest(GObject.Object):
         return self.term
 
 
+class CategoryRequest(GObject.Object):
+    """ CategoryRequest is passed as the extra argument to populate_storage
+        for PopulationFilter.CATEGORY, asking for a single page of the
+        category so that large ones are only built as they are browsed.
+
+        Plugins able to page add at most limit items from offset, and call
+        set_has_more() if any remain. Anything else should add the whole
+        category for the first page (offset 0), and nothing for later ones.
+    """
+
+    __gtype_name__ = "ScCategoryRequest"
+
+    category = None
+    offset = 0
+    limit = None
+    appsystem = None
+    has_more = False
+
+    def __init__(self, category, offset=0, limit=None, appsystem=None):
+        GObject.Object.__init__(self)
+        self.category = category
+        self.offset = offset
+        self.limit = limit
+        self.appsystem = appsystem
+
+    def get_category(self):
+        return self.category
+
+    def get_offset(self):
+        return self.offset
+
+    def get_limit(self):
+        """ Maximum number of items for the page, None for everything """
+        return self.limit
+
+    def get_appsystem(self):
+        """ Used to order the items just as the view will show them """
+        return self.appsystem
+
+    def set_has_more(self):
+        """ Plugins call this when there is more beyond this page """
+        self.has_more = True
+
+    def get_has_more(self):
+        return self.has_more
+
+    def next_page(self):
+        """ Return the request for the page following this one """
+        return CategoryRequest(self.category, self.offset + self.limit,
+                               self.limit, self.appsystem)
+
+
 class ProviderPlugin(GObject.Object):
     """ A ProviderPlugin provides its own managemenet and access to the
         underlying package management system to provide the options to the
@@ -355,7 +471,11 @@ class ProviderPlugin(GObject.Object):
         raise RuntimeError("implement get_name")
 
     def populate_storage(self, storage, popfilter, extra):
-        """ Populate storage using the given filter """
+        """ Populate storage using the given filter
+
+            For searches, the extra SearchRequest may be cancelled at any
+            time, and implementations should stop populating once it is.
+        """
         raise RuntimeError("implement populate_storage")
 
     def cancel(self):
@@ -379,9 +499,10 @@ class ProviderPlugin(GObject.Object):
     def upgrade_item(self, executor, transaction):
         raise RuntimeError("implement upgrade_item")
 
-    def plan_upgrade_item(self, items):
+    def plan_upgrade_item(self, items=None):
         """ Implementation must return a Transaction object for the given
-            list of items to fully plan the given upgrade operation
+            list of items to fully plan the given upgrade operation. If no
+            items are given, everything upgradable should be planned.
         """
         raise RuntimeError("implement plan_upgrade_item")
 
@@ -401,8 +522,25 @@ class ProviderPlugin(GObject.Object):
         """
         raise RuntimeError("implement plan_remove_item")
 
+    def merge_transactions(self, op_type, transactions):
+        """ Replan several pending transactions of the same type as one,
+            returning the combined Transaction, or None if the plugin
+            cannot apply them together
+        """
+        return None
+
+    def prefetch_item(self, executor, transaction):
+        """ Optionally download everything the transaction needs before the
+            executor applies it. The default is to leave it to the backend
+        """
+        pass
+
     def refresh_source(self, executor, source):
-        """ Implementation needs to refresh the given source """
+        """ Implementation needs to refresh the given source
+
+            Like install_item and friends, this may return False to let the
+            executor know the job failed or was cancelled
+        """
         raise RuntimeError("implement refresh_source")
 
 
@@ -22,11 +22,13 @@ class EopkgComponent(ProviderCategory):
 
     id = None
     comp = None
+    count = None
 
-    def __init__(self, compID, comp):
+    def __init__(self, compID, comp, count=None):
         ProviderCategory.__init__(self)
         self.id = compID
         self.comp = comp
+        self.count = count
 
     def get_name(self):
         return str(self.comp.localName)
@@ -34,6 +36,9 @@ class EopkgComponent(ProviderCategory):
     def get_id(self):
         return str(self.id)
 
+    def get_count(self):
+        return self.count
+
     def get_icon_name(self):
         if str(self.id) in ICON_MAPS:
             return ICON_MAPS[str(self.id)]
@@ -0,0 +1,339 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from pisi.operations.upgrade import upgrade_base
+from pisi.version import Version
+
+from array import array
+import threading
+import time
+
+
+class EopkgGraphFallback(Exception):
+    """ The graph cannot answer this query, so ask pisi instead """
+    pass
+
+
+class EopkgDepGraph:
+    """ In-memory dependency graph over the indexed packages.
+
+        Package names are interned to integers, and the edges held as
+        compact arrays: forward edges from the available packages (for
+        install planning), and both directions from the installed packages
+        (for removal planning, and finding the automatically installed
+        packages a removal leaves orphaned). Closures are memoised, and the
+        whole graph is simply replaced whenever the index key changes, i.e.
+        after a repository update or a transaction.
+
+        Anything the graph can't express faithfully raises
+        EopkgGraphFallback, and the caller should use pisi's planner.
+    """
+
+    key = None
+    names = None
+    ids = None
+
+    # id -> array of dependency ids (available packages only)
+    forward = None
+    forward_constraints = None
+
+    # id -> array of installed dependents
+    reverse = None
+    reverse_constraints = None
+
+    # id -> array of dependency ids (installed packages only)
+    depends = None
+
+    # ids installed only as dependencies, or None if unknown
+    automatic = None
+
+    # id -> (version, release), or None
+    available = None
+    installed = None
+
+    # ids with dependencies we can't express
+    complex_available = None
+    complex_installed = None
+
+    # ids of available packages declaring conflicts
+    conflicts = None
+
+    memo = None
+    lock = None
+
+    def __init__(self, index):
+        start = time.time()
+        self.key = index.key
+        self.lock = threading.Lock()
+        self.memo = dict()
+
+        self.names = sorted(index.packages)
+        self.ids = dict((name, i) for i, name in enumerate(self.names))
+        count = len(self.names)
+
+        self.available = [None] * count
+        self.installed = [None] * count
+        for i, name in enumerate(self.names):
+            avail, inst = index.packages[name]
+            if avail is not None:
+                self.available[i] = (avail[2], avail[3])
+            if inst is not None:
+                self.installed[i] = (inst[2], inst[3])
+
+        self.forward = [None] * count
+        self.forward_constraints = dict()
+        self.complex_available = set()
+        self.complex_installed = set()
+        self.depends = [None] * count
+        reverse = [[] for i in range(count)]
+        self.reverse_constraints = dict()
+
+        for i, name in enumerate(self.names):
+            avail_deps, inst_deps = index.deps.get(name, (None, None))
+            if avail_deps is not None:
+                self.forward[i] = self.intern_deps(
+                    i, avail_deps, self.complex_available,
+                    self.forward_constraints, None)
+            if inst_deps is not None:
+                self.depends[i] = self.intern_deps(
+                    i, inst_deps, self.complex_installed,
+                    self.reverse_constraints, reverse)
+
+        self.reverse = [array('i', x) for x in reverse]
+        if index.auto is not None:
+            self.automatic = set(self.ids[x] for x in index.auto
+                                 if x in self.ids)
+        self.conflicts = set(self.ids[x] for x in index.conflicts
+                             if x in self.ids)
+
+        print("eopkg dependency graph built in {:.2f}ms".format(
+            (time.time() - start) * 1000))
+
+    def intern_deps(self, src, deps, complex_ids, constraints, reverse):
+        """ Turn packed dependencies into an array of ids, recording
+            constraints and (optionally) reverse edges on the way """
+        ret = array('i')
+        for dep in deps:
+            if dep is None:
+                complex_ids.add(src)
+                continue
+            constraint = None
+            if not isinstance(dep, str):
+                constraint = dep[1:]
+                dep = dep[0]
+            dst = self.ids.get(dep)
+            if dst is None:
+                # Depends on something we've never heard of
+                complex_ids.add(src)
+                continue
+            ret.append(dst)
+            if constraint is not None:
+                constraints[(src, dst)] = constraint
+            if reverse is not None:
+                reverse[dst].append(src)
+        return ret
+
+    def get_ids(self, names):
+        try:
+            return [self.ids[x] for x in names]
+        except KeyError:
+            raise EopkgGraphFallback()
+
+    def memoised(self, key, func):
+        """ Return the memoised result for key, computing it if needed """
+        with self.lock:
+            if key in self.memo:
+                return list(self.memo[key])
+        ret = func()
+        with self.lock:
+            self.memo[key] = ret
+        return list(ret)
+
+    def upgrade_base(self, names):
+        """ Memoised pisi upgrade_base """
+        key = ("base", frozenset(names))
+        return set(self.memoised(key, lambda: list(upgrade_base(names))))
+
+    def install_closure(self, names):
+        """ Return everything needing installation for the names, with
+            dependencies ordered before their dependents """
+        key = ("install", frozenset(names))
+        return self.memoised(key, lambda: self.plan_install(names))
+
+    def remove_closure(self, names):
+        """ Return everything needing removal for the names, with
+            dependents ordered before their dependencies """
+        key = ("remove", frozenset(names))
+        return self.memoised(key, lambda: self.plan_remove(names))
+
+    def autoremove_closure(self, names):
+        """ As remove_closure, also removing any automatically installed
+            packages that nothing else will need afterwards """
+        key = ("autoremove", frozenset(names))
+        return self.memoised(key, lambda: self.plan_autoremove(names))
+
+    def memoise_pisi(self, kind, names, func):
+        """ Memoise an arbitrary pisi planner returning (graph, order) """
+        key = (kind, frozenset(names))
+        return self.memoised(key, lambda: list(func(names)[1]))
+
+    def plan_install(self, names):
+        roots = self.get_ids(names)
+        seen = set(roots)
+        frontier = list(roots)
+        edges = dict()
+
+        while frontier:
+            found = []
+            for x in frontier:
+                if self.forward[x] is None or x in self.complex_available:
+                    raise EopkgGraphFallback()
+                out = []
+                for dst in self.forward[x]:
+                    constraint = self.forward_constraints.get((x, dst))
+                    # Already satisfied deps are not our concern
+                    inst = self.installed[dst]
+                    if inst is not None and \
+                            (constraint is None or
+                             satisfies(constraint, inst[0], inst[1])):
+                        continue
+                    # pisi will explain unsatisfiable deps better than us
+                    avail = self.available[dst]
+                    if avail is None:
+                        raise EopkgGraphFallback()
+                    if constraint is not None and \
+                            not satisfies(constraint, avail[0], avail[1]):
+                        raise EopkgGraphFallback()
+                    out.append(dst)
+                    if dst not in seen:
+                        seen.add(dst)
+                        found.append(dst)
+                edges[x] = out
+            frontier = found
+
+        return [self.names[x] for x in self.sort_closure(seen, edges)]
+
+    def plan_remove(self, names):
+        seen, edges = self.reverse_closure(names)
+        return self.removal_order(seen, edges)
+
+    def plan_autoremove(self, names):
+        if self.automatic is None:
+            raise EopkgGraphFallback()
+        seen, edges = self.reverse_closure(names)
+        # Dependencies we couldn't intern might be keeping an orphan alive
+        if self.complex_installed.difference(seen):
+            raise EopkgGraphFallback()
+        frontier = list(seen)
+
+        while frontier:
+            found = []
+            for x in frontier:
+                for dep in self.depends[x]:
+                    if dep in seen or dep not in self.automatic or \
+                            self.installed[dep] is None:
+                        continue
+                    # Still needed by something staying behind. If that is
+                    # itself an orphan, dep is checked again when it's found
+                    if any(src not in seen for src in self.reverse[dep]):
+                        continue
+                    edges.setdefault(x, []).append(dep)
+                    seen.add(dep)
+                    found.append(dep)
+            frontier = found
+
+        return self.removal_order(seen, edges)
+
+    def reverse_closure(self, names):
+        """ Return the ids of the names and everything installed depending
+            on them, along with the dependency edges between them """
+        roots = self.get_ids(names)
+        for x in roots:
+            if self.installed[x] is None:
+                raise EopkgGraphFallback()
+        seen = set(roots)
+        frontier = list(roots)
+        edges = dict()
+
+        while frontier:
+            found = []
+            for x in frontier:
+                inst = self.installed[x]
+                for src in self.reverse[x]:
+                    if src in self.complex_installed:
+                        raise EopkgGraphFallback()
+                    # Not actually satisfied, so removing x changes nothing
+                    constraint = self.reverse_constraints.get((src, x))
+                    if constraint is not None and \
+                            not satisfies(constraint, inst[0], inst[1]):
+                        continue
+                    edges.setdefault(src, []).append(x)
+                    if src not in seen:
+                        seen.add(src)
+                        found.append(src)
+            frontier = found
+
+        return seen, edges
+
+    def removal_order(self, seen, edges):
+        """ Order a removal so dependents go before their dependencies """
+        order = self.sort_closure(seen, edges)
+        order.reverse()
+        return [self.names[x] for x in order]
+
+    def sort_closure(self, vertices, edges):
+        """ Depth-first postorder of the closure, so that dependencies
+            always come before their dependents """
+        order = []
+        visited = set()
+        for root in sorted(vertices, key=lambda x: self.names[x]):
+            if root in visited:
+                continue
+            visited.add(root)
+            stack = [(root, iter(edges.get(root, ())))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child not in visited:
+                        visited.add(child)
+                        stack.append((child, iter(edges.get(child, ()))))
+                        break
+                else:
+                    stack.pop()
+                    order.append(node)
+        return order
+
+    def has_conflicts(self, names):
+        """ Whether any of the packages declare conflicts at all """
+        for name in names:
+            if self.ids.get(name) in self.conflicts:
+                return True
+        return False
+
+
+def satisfies(constraint, version, release):
+    """ Check a packed dependency constraint against a version/release """
+    (ver, verFrom, verTo, rel, relFrom, relTo) = constraint
+    if ver and Version(version) != Version(ver):
+        return False
+    if verFrom and Version(version) < Version(verFrom):
+        return False
+    if verTo and Version(version) > Version(verTo):
+        return False
+    if rel and int(release) != int(rel):
+        return False
+    if relFrom and int(release) < int(relFrom):
+        return False
+    if relTo and int(release) > int(relTo):
+        return False
+    return True
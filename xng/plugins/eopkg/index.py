@@ -0,0 +1,436 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from ...util import sc_cache_dir
+
+import pisi
+import pisi.context as ctx
+import hashlib
+import marshal
+import os
+import threading
+import time
+
+# Bump whenever the layout of the on-disk index changes
+INDEX_VERSION = 4
+
+
+class EopkgIndexHistory:
+    """ Stand-in for the head of a pisi package history """
+
+    version = None
+    release = None
+    date = None
+
+    def __init__(self, version, release, date):
+        self.version = version
+        self.release = release
+        self.date = date
+
+
+class EopkgIndexPackage(object):
+    """ EopkgIndexPackage mimics enough of a pisi Package for EopkgItem to
+        be constructed straight from the index, without touching the pisi
+        databases.
+
+        The long description is not indexed, and will be looked up in the
+        relevant database on demand.
+    """
+
+    name = None
+    summary = None
+    partOf = None
+    packageSize = None
+    installedSize = None
+    history = None
+    is_installed = False
+
+    def __init__(self, name, record, is_installed):
+        self.name = name
+        self.is_installed = is_installed
+        (self.summary, self.partOf, version, release, date,
+         self.packageSize, self.installedSize) = record
+        self.history = [EopkgIndexHistory(version, release, date)]
+
+    @property
+    def description(self):
+        """ Only the details view needs this, so grab it from pisi """
+        if self.is_installed:
+            db = pisi.db.installdb.InstallDB()
+        else:
+            db = pisi.db.packagedb.PackageDB()
+        return db.get_package(self.name).description
+
+
+class EopkgIndexGroup:
+    """ Stand-in for a pisi Group """
+
+    localName = None
+    icon = None
+
+    def __init__(self, localName, icon):
+        self.localName = localName
+        self.icon = icon
+
+
+class EopkgIndexComponent:
+    """ Stand-in for a pisi Component """
+
+    localName = None
+
+    def __init__(self, localName):
+        self.localName = localName
+
+
+class EopkgIndex:
+    """ EopkgIndex persists a flattened view of the pisi package, group and
+        component databases in the user cache directory.
+
+        The index is keyed on the state of the repository index files and
+        the installed database, so a warm start only has to read a single
+        marshalled file rather than parse the repository XML. Transactions
+        only touch the installed side of the index, so those are updated
+        per-package.
+    """
+
+    path = None
+    key = None
+    repo_key = None  # Only changes when the repositories do
+
+    # name -> (available record, installed record)
+    packages = None
+
+    # [(groupID, localName, icon, [componentIDs])]
+    groups = None
+
+    # componentID -> localName
+    components = None
+
+    # componentID -> sorted [package names]
+    component_packages = None
+
+    # name -> (available deps, installed deps), see pack_deps
+    deps = None
+
+    # Available packages that declare conflicts
+    conflicts = None
+
+    # Installed packages pulled in only as dependencies, or None if pisi
+    # can't tell us
+    auto = None
+
+    lock = None
+
+    def __init__(self):
+        self.path = os.path.join(sc_cache_dir("eopkg"), "index")
+        self.lock = threading.Lock()
+        self.packages = dict()
+        self.groups = []
+        self.components = dict()
+        self.component_packages = dict()
+        self.deps = dict()
+        self.conflicts = []
+        self.auto = None
+
+    def compute_repo_key(self):
+        """ Fingerprint the repository index files alone """
+        h = hashlib.sha1()
+        h.update(str(INDEX_VERSION))
+
+        # Localised names end up in the index
+        for var in ["LC_ALL", "LC_MESSAGES", "LANG"]:
+            h.update(os.environ.get(var, ""))
+
+        for root, dirs, files in os.walk(ctx.config.index_dir()):
+            dirs.sort()
+            for f in sorted(files):
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except Exception:
+                    continue
+                h.update("{}:{}:{}".format(path, st.st_mtime, st.st_size))
+
+        return h.hexdigest()
+
+    def compute_key(self):
+        """ Fingerprint the repository indexes and the installed DB """
+        self.repo_key = self.compute_repo_key()
+        h = hashlib.sha1()
+        h.update(self.repo_key)
+
+        # Each installed package has a name-version-release directory
+        try:
+            h.update(":".join(sorted(os.listdir(ctx.config.packages_dir()))))
+        except Exception as e:
+            print("Cannot read installed packages: {}".format(e))
+
+        return h.hexdigest()
+
+    def load(self):
+        """ Read the on-disk index. Returns False if it was unusable """
+        self.key = self.compute_key()
+        try:
+            with open(self.path, "rb") as f:
+                blob = marshal.load(f)
+        except Exception as e:
+            print("eopkg index unavailable: {}".format(e))
+            return False
+
+        if blob.get("version") != INDEX_VERSION or blob.get("key") != self.key:
+            print("eopkg index is stale")
+            return False
+
+        self.packages = blob["packages"]
+        self.groups = blob["groups"]
+        self.components = blob["components"]
+        self.component_packages = blob["component_packages"]
+        self.deps = blob["deps"]
+        self.conflicts = blob["conflicts"]
+        self.auto = blob["auto"]
+        print("eopkg index loaded: {} packages".format(len(self.packages)))
+        return True
+
+    def save(self):
+        """ Atomically write the index back to disk """
+        blob = {
+            "version": INDEX_VERSION,
+            "key": self.key,
+            "packages": self.packages,
+            "groups": self.groups,
+            "components": self.components,
+            "component_packages": self.component_packages,
+            "deps": self.deps,
+            "conflicts": self.conflicts,
+            "auto": self.auto,
+        }
+        tmp = "{}.{}".format(self.path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(marshal.dumps(blob))
+            os.rename(tmp, self.path)
+        except Exception as e:
+            print("Unable to write eopkg index: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+
+    def rebuild(self, availDB, installDB, groupDB, compDB, visit=None):
+        """ Walk the full set of pisi databases to regenerate the index
+
+            If set, visit(name, pkg) is called for every package seen so
+            that callers can piggyback on the walk.
+        """
+        with self.lock:
+            start = time.time()
+            key = self.compute_key()
+
+            packages = dict()
+            component_packages = dict()
+            deps = dict()
+            conflicts = []
+            for name in availDB.list_packages(None):
+                pkg = availDB.get_package(name)
+                packages[name] = (pack_record(pkg), None)
+                component_packages.setdefault(pkg.partOf, []).append(name)
+                deps[name] = (pack_deps(pkg), None)
+                if pkg.conflicts:
+                    conflicts.append(name)
+                if visit:
+                    visit(name, pkg)
+            for names in component_packages.itervalues():
+                names.sort()
+            for name in installDB.list_installed():
+                pkg = installDB.get_package(name)
+                avail = None
+                avail_deps = None
+                if name in packages:
+                    avail = packages[name][0]
+                    avail_deps = deps[name][0]
+                elif visit:
+                    visit(name, pkg)
+                packages[name] = (avail, pack_record(pkg))
+                deps[name] = (avail_deps, pack_deps(pkg))
+
+            groups = []
+            components = dict()
+            for groupID in sorted(groupDB.list_groups()):
+                group = groupDB.get_group(groupID)
+                compIDs = sorted(groupDB.get_group_components(groupID))
+                groups.append((groupID, str(group.localName),
+                               str(group.icon), compIDs))
+                for compID in compIDs:
+                    comp = compDB.get_component(compID)
+                    components[compID] = str(comp.localName)
+
+            self.key = key
+            self.packages = packages
+            self.groups = groups
+            self.components = components
+            self.component_packages = component_packages
+            self.deps = deps
+            self.conflicts = conflicts
+            self.auto = auto_installed(installDB, installDB.list_installed())
+            self.save()
+
+            print("eopkg index rebuilt in {:.2f}s".format(time.time() - start))
+
+    def update_installed(self, packages, auto=None):
+        """ Refresh only the installed records for the given packages, i.e.
+            after a transaction has completed.
+
+            packages maps each touched name to its newly installed pisi
+            package, or None if it has been removed. auto lists those now
+            installed only as dependencies, see auto_installed.
+        """
+        with self.lock:
+            if auto is None or self.auto is None:
+                self.auto = None
+            else:
+                auto = set(self.auto).difference(packages).union(auto)
+                self.auto = sorted(auto)
+
+            for name, pkg in packages.iteritems():
+                avail = None
+                avail_deps = None
+                if name in self.packages:
+                    avail = self.packages[name][0]
+                    avail_deps = self.deps[name][0]
+                inst = None
+                inst_deps = None
+                if pkg is not None:
+                    inst = pack_record(pkg)
+                    inst_deps = pack_deps(pkg)
+                if avail is None and inst is None:
+                    self.packages.pop(name, None)
+                    self.deps.pop(name, None)
+                    continue
+                self.packages[name] = (avail, inst)
+                self.deps[name] = (avail_deps, inst_deps)
+
+            self.key = self.compute_key()
+            self.save()
+
+    def diff_installed(self, dirs):
+        """ Return the names whose installed record no longer matches dirs,
+            the name -> name-version-release map of the installed DB """
+        with self.lock:
+            changed = []
+            for name, rec in self.packages.iteritems():
+                inst = rec[1]
+                if inst is None:
+                    continue
+                dirname = "{}-{}-{}".format(name, inst[2], inst[3])
+                if dirs.get(name) != dirname:
+                    changed.append(name)
+            for name in dirs:
+                rec = self.packages.get(name)
+                if rec is None or rec[1] is None:
+                    changed.append(name)
+            return changed
+
+    def has_package(self, name):
+        """ Whether the package is available in any repository """
+        rec = self.packages.get(name)
+        return rec is not None and rec[0] is not None
+
+    def is_installed(self, name):
+        rec = self.packages.get(name)
+        return rec is not None and rec[1] is not None
+
+    def list_installed(self):
+        return [x for x, rec in self.packages.iteritems() if rec[1]]
+
+    def get_available(self, name):
+        """ Return the indexed view of the repository package """
+        rec = self.packages.get(name)
+        if not rec or not rec[0]:
+            return None
+        return EopkgIndexPackage(name, rec[0], False)
+
+    def get_installed(self, name):
+        """ Return the indexed view of the installed package """
+        rec = self.packages.get(name)
+        if not rec or not rec[1]:
+            return None
+        return EopkgIndexPackage(name, rec[1], True)
+
+    def list_groups(self):
+        """ Yield (groupID, group, componentIDs) in sorted order """
+        for (groupID, localName, icon, compIDs) in self.groups:
+            yield (groupID, EopkgIndexGroup(localName, icon), compIDs)
+
+    def get_component(self, compID):
+        return EopkgIndexComponent(self.components[compID])
+
+    def has_component(self, compID):
+        return compID in self.components
+
+    def count_component(self, compID):
+        """ Number of available packages in the component """
+        return len(self.component_packages.get(compID, ()))
+
+    def list_component(self, compID, offset=0, limit=None):
+        """ Return a page of the sorted package names in the component """
+        names = self.component_packages.get(compID, [])
+        if limit is None:
+            return names[offset:]
+        return names[offset:offset + limit]
+
+
+def auto_installed(installDB, names):
+    """ Return those of the installed names that were only pulled in as
+        dependencies, or None if this pisi doesn't record it """
+    is_auto = getattr(installDB, "is_auto_installed", None)
+    if is_auto is None:
+        return None
+    return sorted(x for x in names if is_auto(x))
+
+
+def pack_record(pkg):
+    """ Flatten a pisi package into a marshal-friendly tuple """
+    head = pkg.history[0]
+    return (
+        str(pkg.summary),
+        pkg.partOf,
+        head.version,
+        head.release,
+        head.date,
+        pkg.packageSize,
+        pkg.installedSize,
+    )
+
+
+def pack_deps(pkg):
+    """ Flatten the runtime dependencies of a pisi package.
+
+        Unversioned dependencies are stored as the plain name, versioned
+        ones as (name, version, versionFrom, versionTo, release,
+        releaseFrom, releaseTo). Anything we can't express (i.e. an
+        AnyDependency) is stored as None.
+    """
+    ret = []
+    for dep in pkg.runtimeDependencies():
+        name = getattr(dep, "package", None)
+        if name is None:
+            ret.append(None)
+            continue
+        constraint = (dep.version, dep.versionFrom, dep.versionTo,
+                      dep.release, dep.releaseFrom, dep.releaseTo)
+        if not any(constraint):
+            ret.append(str(name))
+            continue
+        ret.append((str(name),) + tuple(
+            None if x is None else str(x) for x in constraint))
+    return ret
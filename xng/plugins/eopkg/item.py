@@ -12,7 +12,6 @@
 #
 
 from ..base import ProviderItem, ItemStatus
-from pisi.operations.helper import calculate_download_sizes
 
 
 class EopkgItem(ProviderItem):
@@ -33,11 +32,17 @@ class EopkgItem(ProviderItem):
 
     def __init__(self, installed, available):
         ProviderItem.__init__(self)
+        self.update_packages(installed, available)
+
+    def update_packages(self, installed, available):
+        """ (Re)compute our state from the installed and available packages,
+            allowing the plugin to refresh us in place after a transaction
+        """
         self.installed = installed
         self.available = available
 
         # NOT YET SUPPORTED
-        self.add_status(ItemStatus.META_CHANGELOG)
+        self.set_status(ItemStatus.META_CHANGELOG)
 
         if self.installed is not None:
             self.displayCandidate = self.installed
@@ -78,7 +83,7 @@ class EopkgItem(ProviderItem):
         return self.displayCandidate.history[0].version
 
     def get_download_size(self):
-        return calculate_download_sizes((self.displayCandidate.name, ))[0]
+        return self.get_plugin().get_download_size(self.get_id())
 
     def get_install_size(self):
         return long(self.displayCandidate.installedSize)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import threading
+import time
+
+# Give up on COMAR if it has been silent for this many seconds
+OPERATION_IDLE_TIMEOUT = 600.0
+
+
+class EopkgOperationState:
+
+    PENDING = 0
+    FINISHED = 1
+    CANCELLED = 2  # Authentication was refused or dismissed
+    FAILED = 3
+    TIMED_OUT = 4
+
+
+class EopkgOperation:
+    """ A single privileged call made over the COMAR link.
+
+        The executor thread makes the call and then waits on the operation,
+        which is completed from the dbus callback as soon as COMAR tells us
+        how it ended. Any other signal for the operation counts as activity,
+        so long running transactions only time out once COMAR goes quiet.
+    """
+
+    method = None
+    state = EopkgOperationState.PENDING
+    message = None
+    event = None
+    lock = None
+    last_activity = 0
+
+    def __init__(self, method):
+        self.method = method
+        self.event = threading.Event()
+        self.lock = threading.Lock()
+        self.last_activity = time.time()
+
+    def touch(self):
+        """ COMAR is still working on it """
+        self.last_activity = time.time()
+
+    def complete(self, state, message=None):
+        """ Set the final state, returning False if already completed """
+        with self.lock:
+            if self.state != EopkgOperationState.PENDING:
+                return False
+            self.state = state
+            self.message = message
+        self.event.set()
+        return True
+
+    def finish(self):
+        return self.complete(EopkgOperationState.FINISHED)
+
+    def cancel(self, message=None):
+        return self.complete(EopkgOperationState.CANCELLED, message)
+
+    def fail(self, message=None):
+        return self.complete(EopkgOperationState.FAILED, message)
+
+    def wait(self, idle_timeout=OPERATION_IDLE_TIMEOUT):
+        """ Block until the operation completes, returning its state """
+        while True:
+            remaining = self.last_activity + idle_timeout - time.time()
+            if remaining <= 0:
+                self.complete(EopkgOperationState.TIMED_OUT,
+                              "No response from COMAR")
+                break
+            if self.event.wait(remaining):
+                break
+        return self.state
+
+    def succeeded(self):
+        return self.state == EopkgOperationState.FINISHED
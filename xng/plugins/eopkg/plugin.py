@@ -11,26 +11,44 @@
 #  (at your option) any later version.
 #
 
-from ..base import ProviderPlugin
+from ..base import ProviderPlugin, ProviderItem
 from ..base import PopulationFilter, Transaction, ItemLink
+from ...op_queue import OperationType
 
 # Plugin local
 from .component import EopkgComponent
+from .depgraph import EopkgDepGraph, EopkgGraphFallback
 from .group import EopkgGroup
+from .index import EopkgIndex, auto_installed
 from .item import EopkgItem
+from .operation import EopkgOperation
+from .prefetch import EopkgPrefetcher
+from .recent import EopkgRecentIndex
+from .sizes import EopkgDownloadSizer
+from .search_index import EopkgSearchIndex, package_fields, app_fields
 from .source import EopkgSource
+from ...progress import sc_format_eta
+from ...util import sc_debug
+from ...util.lru import ScLruCache
 
-from gi.repository import AppStreamGlib as As
 import pisi
+import pisi.context as ctx
+import pisi.metadata
 from pisi.operations.install import plan_install_pkg_names
 from pisi.operations.remove import plan_remove, plan_autoremove
-from pisi.operations.upgrade import upgrade_base
-# from pisi.operations.upgrade import plan_upgrade
+from pisi.operations.upgrade import plan_upgrade
 from pisi.operations import helper as pisi_helper
 import time
 import comar
-import difflib
 import os.path
+import threading
+import weakref
+
+# Upper bound on recently used items kept alive by the plugin
+ITEM_CACHE_SIZE = 4096
+
+# Display ordered component listings to keep around
+LISTING_CACHE_SIZE = 16
 
 
 class EopkgPlugin(ProviderPlugin):
@@ -51,6 +69,37 @@ class EopkgPlugin(ProviderPlugin):
 
     repos = None
 
+    # Persistent index of the DBs
+    index = None
+
+    # Persistent full-text index, one per repository generation
+    search_index = None
+    search_lock = None
+
+    # Persistent top-K of recently updated apps
+    recent_index = None
+
+    # Dependency graph for the current index
+    dep_graph = None
+    graph_lock = None
+
+    # Download sizes for the current index
+    sizer = None
+
+    # Fetches packages ahead of pisi
+    prefetcher = None
+
+    # Shared items by package name. Every live item is tracked weakly so
+    # it can be refreshed in place, and the LRU keeps the recently used
+    # ones alive between views.
+    items = None
+    item_cache = None
+    items_lock = None
+    generation = 0
+
+    # Component listings in display order, for paging categories
+    listings = None
+
     # pisi crap
     link = None
     pmanager = None
@@ -59,13 +108,32 @@ class EopkgPlugin(ProviderPlugin):
     trans = None
     current_package = None
 
-    operation_blocked = False  # Allow spin locking
+    # The COMAR call currently in flight
+    operation = None
 
     __gtype_name__ = "NxEopkgPlugin"
 
     def __init__(self):
         ProviderPlugin.__init__(self)
-        self.rebuild_db()
+        self.items = weakref.WeakValueDictionary()
+        self.item_cache = ScLruCache(ITEM_CACHE_SIZE)
+        self.items_lock = threading.Lock()
+        self.listings = ScLruCache(LISTING_CACHE_SIZE)
+        self.open_db()
+
+        # Only walk the DBs if the on-disk index is missing or stale
+        self.search_index = EopkgSearchIndex()
+        self.search_lock = threading.Lock()
+        self.index = EopkgIndex()
+        self.recent_index = EopkgRecentIndex()
+        self.graph_lock = threading.Lock()
+        self.sizer = EopkgDownloadSizer()
+        self.prefetcher = EopkgPrefetcher()
+        if not self.index.load():
+            self.rebuild_index()
+        else:
+            self.search_index.load(self.index.repo_key)
+            self.build_categories()
 
         # Talk to eopkg/pisi over dbus
         self.link = comar.Link()
@@ -77,40 +145,95 @@ class EopkgPlugin(ProviderPlugin):
         self.pmanager = self.link.System.Manager['pisi']
         self.link.listenSignals("System.Manager", self.dbus_callback)
 
-        self.build_categories()
-
     def get_name(self):
         return "eopkg"
 
     def rebuild_db(self):
         """ Ensure our database set is completely up to date now """
-        print("Rebuilding DBs")
+        sc_debug("Rebuilding DBs")
         pisi.db.invalidate_caches()
+        self.open_db()
+        sc_debug("Rebuilt DBs")
+
+    def open_db(self):
+        """ Open the pisi DBs, which only parse anything once used """
         self.availDB = pisi.db.packagedb.PackageDB()
         self.installDB = pisi.db.installdb.InstallDB()
         self.repoDB = pisi.db.repodb.RepoDB()
         self.groupDB = pisi.db.groupdb.GroupDB()
         self.compDB = pisi.db.componentdb.ComponentDB()
-        print("Rebuilt DBs")
+
+        # Any item built before now is stale
+        with self.items_lock:
+            self.generation += 1
+            self.items = weakref.WeakValueDictionary()
+            self.item_cache.clear()
+
+    def rebuild_index(self):
+        """ Regenerate the persistent index from the full DBs, along with
+            the search index if the repositories changed """
+        docs = dict()
+
+        def visit(name, pkg):
+            docs[name] = package_fields(name, pkg)
+
+        self.index.rebuild(self.availDB, self.installDB,
+                           self.groupDB, self.compDB, visit)
+        self.build_categories()
+
+        with self.search_lock:
+            key = self.index.repo_key
+            if self.search_index.key != key and \
+                    not self.search_index.load(key):
+                self.search_index.build(key, docs)
+
+    def ensure_search_index(self, appsystem):
+        """ Make sure the search index is current, and has AppStream data
+            merged in when we have it """
+        with self.search_lock:
+            if self.search_index.key != self.index.repo_key:
+                self.build_search_index()
+            if appsystem and not self.search_index.has_appstream:
+                self.merge_appstream(appsystem)
+
+    def build_search_index(self):
+        """ Walk the available packages to build the search index """
+        docs = dict()
+        for name in self.availDB.list_packages(None):
+            docs[name] = package_fields(name, self.availDB.get_package(name))
+        for name in self.index.list_installed():
+            if name not in docs:
+                docs[name] = package_fields(name,
+                                            self.index.get_installed(name))
+        self.search_index.build(self.index.repo_key, docs)
+
+    def merge_appstream(self, appsystem):
+        """ Enrich the search index with AppStream names and keywords """
+        for app in appsystem.store.get_apps():
+            name = app.get_pkgname_default()
+            if not name:
+                continue
+            if not self.index.has_package(name) and \
+                    not self.index.is_installed(name):
+                continue
+            self.search_index.add_document(name, app_fields(app))
+        self.search_index.has_appstream = True
+        self.search_index.save()
 
     def build_categories(self):
         """ Find all of our possible categories and nest them. """
-        self.cats = []
-        groups = self.groupDB.list_groups()
-        groups.sort()
-        for groupID in groups:
-            group = self.groupDB.get_group(groupID)
+        cats = []
+        for groupID, group, components in self.index.list_groups():
             item = EopkgGroup(groupID, group)
 
-            components = self.groupDB.get_group_components(groupID)
-            components.sort()
-
             for compID in components:
-                comp = self.compDB.get_component(compID)
-                childItem = EopkgComponent(compID, comp)
+                comp = self.index.get_component(compID)
+                childItem = EopkgComponent(compID, comp,
+                                           self.index.count_component(compID))
                 item.children.append(childItem)
 
-            self.cats.append(item)
+            cats.append(item)
+        self.cats = cats
 
     def categories(self):
         return self.cats
@@ -147,13 +270,9 @@ class EopkgPlugin(ProviderPlugin):
 
         limit = 20  # Arbitrary right now
 
-        inp = filter_packages_by_data(self.availDB, appsystem.store)
-        inp.sort(history_sort, reverse=True)
-        if len(inp) > limit:
-            inp = inp[0:limit]
-
-        for pkg in inp:
-            item = self.build_item(pkg.name)
+        self.recent_index.ensure(self.index, appsystem)
+        for name in self.recent_index.get_recent(limit):
+            item = self.build_item(name)
             storage.add_item(item.get_id(), item, PopulationFilter.RECENT)
 
     def populate_new(self, storage, appsystem):
@@ -192,59 +311,79 @@ class EopkgPlugin(ProviderPlugin):
             storage.add_item(item.get_id(), item, PopulationFilter.NEW)
 
     def populate_search(self, storage, request):
-        """ Attempt to search for a given term in the DB """
-        # Trick eopkg into searching through spaces and hyphens
-        term = request.get_term().replace(" ", "[-_ ]").replace(".", "\.")
-        term = term.replace("+", "\+").replace("?", "\?")
-
-        srslt = set()
-        try:
-            if not request.get_installed_only():
-                srslt.update(self.availDB.search_package([term]))
-            srslt.update(self.installDB.search_package([term]))
-        except Exception as e:
-            # Invalid regex, basically, from someone smashing FIREFOX????
-            print(e)
+        """ Query the search index for the given term """
+        term = request.get_term()
+        self.ensure_search_index(request.get_appsystem())
+        if request.is_cancelled():
             return
 
-        leaders = difflib.get_close_matches(term.lower(),
-                                            srslt, cutoff=0.5)
-        packages = leaders
-        packages.extend(sorted([x for x in srslt if x not in leaders]))
+        start = time.time()
+        packages = self.search_index.query(term)
+        sc_debug("eopkg search for '{}' took {:.2f}ms".format(
+            term, (time.time() - start) * 1000))
 
-        count = 0
+        want_devel = "dbginfo" in term or "devel" in term
 
         for item in packages:
-            if count >= 100:
+            if request.is_cancelled():
                 break
 
             # Skip devel stuff in search results
             if item.endswith("-dbginfo") or item.endswith("-devel"):
-                if "dbginfo" not in term and "devel" not in term:
+                if not want_devel:
                     continue
 
-            pkg = self.build_item(item)
-
-            count += 1
+            if request.get_installed_only():
+                if not self.index.is_installed(item):
+                    continue
+            elif not self.index.has_package(item) and \
+                    not self.index.is_installed(item):
+                continue
 
+            pkg = self.build_item(item)
             storage.add_item(pkg.get_id(), pkg, PopulationFilter.SEARCH)
-        print("eopkg done!")
+        sc_debug("eopkg done!")
 
     def populate_installed(self, storage):
         """ Populate from the installed filter """
-        for pkgID in self.installDB.list_installed():
+        for pkgID in self.index.list_installed():
             pkg = self.build_item(pkgID)
             storage.add_item(pkg.get_id(), pkg, PopulationFilter.INSTALLED)
 
-    def populate_category(self, storage, category):
-        """ Ask componentDB for all packages in the given component """
-        if not self.compDB.has_component(category.get_id()):
+    def populate_category(self, storage, request):
+        """ Build the requested page of the given component's packages """
+        compID = request.get_category().get_id()
+        if not self.index.has_component(compID):
             return
-        pkgs = self.compDB.get_packages(category.get_id(), None, False)
+        names = self.list_component(compID, request.get_appsystem())
+        offset = request.get_offset()
+        limit = request.get_limit()
+        if limit is None:
+            pkgs = names[offset:]
+        else:
+            pkgs = names[offset:offset + limit]
+            if offset + limit < len(names):
+                request.set_has_more()
         for pkgID in pkgs:
             pkg = self.build_item(pkgID)
             storage.add_item(pkg.get_id(), pkg, PopulationFilter.CATEGORY)
 
+    def list_component(self, compID, appsystem=None):
+        """ Return the indexed package names of the component, ordered by
+            display name just as the view sorts them, so that each page
+            lands after the last instead of among the rows already shown.
+            Only names are needed for this, no items are built. """
+        key = (self.index.key, compID, appsystem is not None)
+        names = self.listings.get(key)
+        if names is not None:
+            return names
+        names = self.index.list_component(compID)
+        if appsystem is not None:
+            names = sorted(names, key=lambda x: appsystem.get_name(
+                x, x).lower())
+        self.listings.put(key, names)
+        return names
+
     def populate_updates(self, storage, extra):
         """ Find all available updates for the currently installed software
             Note: This is incredibly primitive and has no plan facility """
@@ -257,25 +396,41 @@ class EopkgPlugin(ProviderPlugin):
     def populate_drivers(self, storage, provider):
         """ Handle foreign driver requests """
         pkg = provider.get_package()
-        print("eopkg plugin requested to populate drivers on {}".format(pkg))
+        sc_debug("eopkg plugin requested to populate drivers on {}".format(
+            pkg))
 
         # This is shitty we need to set up with kernels.
-        if not self.availDB.has_package(pkg):
+        if not self.index.has_package(pkg):
             return
         item = self.build_item(pkg)
         storage.add_item(item.get_id(), item, PopulationFilter.DRIVERS)
 
     def build_item(self, name):
-        """ Build a complete item definition """
-        avail = None
-        installed = None
-        if self.availDB.has_package(name):
-            avail = self.availDB.get_package(name)
-        if self.installDB.has_package(name):
-            installed = self.installDB.get_package(name)
+        """ Return the shared item for the given name, building a complete
+            item definition from the index if we don't have one yet """
+        with self.items_lock:
+            generation = self.generation
+            item = self.items.get(name)
+        if item is not None:
+            self.item_cache.put(name, item)
+            return item
+
+        avail = self.index.get_available(name)
+        installed = self.index.get_installed(name)
         item = EopkgItem(installed, avail)
         item.parent_plugin = self
 
+        # Publish it, unless another thread beat us to it or the DBs were
+        # rebuilt in the meantime
+        with self.items_lock:
+            existing = self.items.get(name)
+            if existing is None and generation == self.generation:
+                self.items[name] = item
+                self.item_cache.put(name, item)
+        if existing is not None:
+            self.item_cache.put(name, existing)
+            return existing
+
         if not avail:
             return item
 
@@ -290,26 +445,154 @@ class EopkgPlugin(ProviderPlugin):
             if name.endswith("-current"):
                 name = name[0:-8]
             name32 = name + "-32bit"
-            if self.availDB.has_package(name32):
+            if self.index.has_package(name32):
                 item.push_link(ItemLink.ENHANCES, self.build_item(name32))
 
+    def refresh_installed(self, names):
+        """ Delta-update the InstallDB, index and live items for only the
+            packages touched by a transaction, rather than throwing away
+            every DB and paying for a full reparse.
+
+            pisi replans the operation itself, pulling in dependencies and
+            replacements, so names is only a hint. Everything added, removed
+            or changed on disk is refreshed along with it.
+        """
+        start = time.time()
+        dirs = installed_package_dirs()
+        names = set(names)
+        names.update(self.index.diff_installed(dirs))
+        packages = dict()
+        for name in names:
+            if name not in dirs:
+                packages[name] = None
+                continue
+            meta = pisi.metadata.MetaData()
+            meta.read(os.path.join(ctx.config.packages_dir(),
+                                   dirs[name],
+                                   ctx.const.metadata_xml))
+            packages[name] = meta.package
+
+        # An uninitialised InstallDB will read the new state by itself
+        if self.installDB.is_initialized():
+            for name, pkg in packages.iteritems():
+                if pkg is None:
+                    self.installDB.remove_package(name)
+                else:
+                    self.installDB.add_package(pkg)
+
+        installed = [x for x, pkg in packages.iteritems() if pkg is not None]
+        self.index.update_installed(packages,
+                                    auto_installed(self.installDB, installed))
+
+        # Newly installed foreign packages need to become searchable
+        with self.search_lock:
+            added = False
+            for name, pkg in packages.iteritems():
+                if pkg is None or self.search_index.has_document(name):
+                    continue
+                self.search_index.add_document(name,
+                                               package_fields(name, pkg))
+                added = True
+            if added:
+                self.search_index.save()
+
+        # Now bring any live items up to date
+        with self.items_lock:
+            live = [(x, self.items.get(x)) for x in packages]
+        for name, item in live:
+            if item is None:
+                continue
+            item.update_packages(self.index.get_installed(name),
+                                 self.index.get_available(name))
+
+        sc_debug("Refreshed {} packages in {:.2f}ms".format(
+            len(packages), (time.time() - start) * 1000))
+
+    def get_dep_graph(self):
+        """ Return the dependency graph, rebuilding it if the index (and
+            therefore the repo or installed state) has changed """
+        with self.graph_lock:
+            if self.dep_graph is None or self.dep_graph.key != self.index.key:
+                self.dep_graph = EopkgDepGraph(self.index)
+            return self.dep_graph
+
+    def get_download_size(self, name):
+        """ Download size of a single package """
+        return self.sizer.get_size(self.index.key, name)
+
+    def get_download_sizes(self, names):
+        """ Return (total, cached, saved, {name: size}) for a set of
+            packages """
+        return self.sizer.get_sizes(self.index.key, names)
+
     def plan_install_item(self, item):
         """ Plan the installation of a given item """
-        trans = Transaction(item)
+        return self.plan_install_items([item])
 
-        # We only install one requested item at a time
-        order = set([item.get_id()])
+    def plan_install_items(self, items):
+        """ Plan the installation of the given items as one transaction """
+        trans = Transaction()
+        trans.set_primary_items(items)
+        graph = self.get_dep_graph()
+        start = time.time()
+
+        ids = [x.get_id() for x in items]
+        order = set(ids)
         # Now ensure system.base upgrade is present because we satisfy safety
-        order |= upgrade_base(order)
+        order |= graph.upgrade_base(order)
         # Push the installation set here
-        (pg, pkgs) = plan_install_pkg_names(order)
+        try:
+            pkgs = graph.install_closure(order)
+        except EopkgGraphFallback:
+            (pg, pkgs) = plan_install_pkg_names(order)
+        sc_debug("Planned install of {} in {:.2f}ms".format(
+            ", ".join(ids), (time.time() - start) * 1000))
+
+        self.push_planned(trans, graph, pkgs)
+        return trans
+
+    def plan_upgrade_item(self, items=None):
+        """ Plan the upgrade of the given item(s) as one transaction. With
+            no items, everything upgradable is planned in a single pass """
+        graph = self.get_dep_graph()
+        start = time.time()
+
+        if items is None:
+            names = graph.memoised(("upgradable",),
+                                   lambda: list(pisi.api.list_upgradable()))
+            items = [self.build_item(x) for x in sorted(names)]
+        elif isinstance(items, ProviderItem):
+            items = [items]
+
+        trans = Transaction()
+        if not items:
+            return trans
+        trans.set_primary_items(items)
+
+        # Upgrades pull in replaces and obsoletes, and can break reverse
+        # dependencies, none of which the graph knows about
+        order = set([x.get_id() for x in items])
+        order |= graph.upgrade_base(order)
+        pkgs = graph.memoise_pisi("upgrade", order, plan_upgrade)
+        sc_debug("Planned upgrade of {} packages in {:.2f}ms".format(
+            len(pkgs), (time.time() - start) * 1000))
+
+        self.push_planned(trans, graph, pkgs)
+        return trans
+
+    def push_planned(self, trans, graph, pkgs):
+        """ Push a planned install/upgrade set into the transaction """
 
         # If system.base is defined (should be!) put base packages first
         if self.compDB.has_component("system.base"):
             pkgs = pisi_helper.reorder_base_packages(pkgs)
 
+        # Size everything in one go
+        (total, cached, saved, sizes) = self.get_download_sizes(pkgs)
+        trans.set_download_sizes(sizes, cached, saved)
+
         for name in pkgs:
-            if self.installDB.has_package(name):
+            if self.index.is_installed(name):
                 # Have the package so its an update now
                 trans.push_upgrade(self.build_item(name))
             else:
@@ -317,41 +600,83 @@ class EopkgPlugin(ProviderPlugin):
                 trans.push_installation(self.build_item(name))
 
         # Potential conflict?
-        conflicts = pisi_helper.check_conflicts(pkgs, self.availDB)
+        conflicts = None
+        if graph.has_conflicts(pkgs):
+            conflicts = pisi_helper.check_conflicts(pkgs, self.availDB)
         if conflicts:
             for name in conflicts:
                 trans.push_removal(self.build_item(name))
 
-        return trans
-
     def plan_remove_item(self, item, automatic=False):
         """ Plan removal of a given item """
         trans = Transaction(item)
+        graph = self.get_dep_graph()
+        names = [item.get_id()]
 
-        if not automatic:
-            (pg, pkgs) = plan_remove([item.get_id()])
-        else:
-            (pg, pkgs) = plan_autoremove([item.get_id()])
+        try:
+            if automatic:
+                pkgs = graph.autoremove_closure(names)
+            else:
+                pkgs = graph.remove_closure(names)
+        except EopkgGraphFallback:
+            if automatic:
+                pkgs = graph.memoise_pisi("pisi-autoremove", names,
+                                          plan_autoremove)
+            else:
+                (pg, pkgs) = plan_remove(names)
 
         for name in pkgs:
             trans.push_removal(self.build_item(name))
 
         return trans
 
-    def spinlock_busy_wait(self):
-        """ Prep us for a new spinlock cycle """
-        print(" -> Prep spinlock")
-        self.operation_blocked = True
+    def merge_transactions(self, op_type, transactions):
+        """ Combine queued installs or removals into a single transaction,
+            so pisi only runs its triggers and DB updates once """
+        items = [x.primary_item for x in transactions]
+        if op_type == OperationType.INSTALL:
+            trans = self.plan_install_items(items)
+        elif op_type == OperationType.REMOVE:
+            # Each removal was already planned in full, so just take the
+            # union of them rather than replanning autoremovals
+            trans = Transaction()
+            trans.set_primary_items(items)
+            names = set()
+            for transaction in transactions:
+                names.update([x.get_id() for x in transaction.removals])
+            for name in sorted(names):
+                trans.push_removal(self.build_item(name))
+        else:
+            return None
+        trans.set_operation_type(op_type)
+        return trans
 
-    def spinlock_busy_end(self):
-        """ Wait until we're unblocked basically, with minimal wakes """
-        print(" -> spinlock start")
-        while self.operation_blocked:
-            time.sleep(.500)
-        print(" -> spinlock end")
+    def run_operation(self, method, *args):
+        """ Make the COMAR call and wait for it to finish, returning True
+            only if it completed successfully """
+        operation = EopkgOperation(method)
+        self.operation = operation
+        start = time.time()
+        try:
+            getattr(self.pmanager, method)(*args, timeout=100000)
+        except Exception as e:
+            operation.fail(str(e))
+        state = operation.wait()
+        self.operation = None
+
+        if not operation.succeeded():
+            print("{} did not complete ({}): {}".format(
+                method, state, operation.message))
+            return False
+        sc_debug("{} completed in {:.2f}s".format(method,
+                                                  time.time() - start))
+        return True
 
     def dbus_callback(self, package, signal, args):
         """ eopkg/pisi talked to us via COMAR """
+        operation = self.operation
+        if operation is not None:
+            operation.touch()
 
         # Proxy the request to the appropriate callback
         if signal == "status":
@@ -390,7 +715,7 @@ class EopkgPlugin(ProviderPlugin):
         elif cmd == "updatingrepo":
             self.handle_dbus_repo_update()
         else:
-            print("Status: {} {}".format(cmd, what))
+            sc_debug("Status: {} {}".format(cmd, what))
 
     def handle_dbus_upgrading(self, what):
         """ Package is now upgrading """
@@ -401,6 +726,18 @@ class EopkgPlugin(ProviderPlugin):
             self.trans.op_counter,
         ))
 
+    def pop_current(self, pop):
+        """ Pop the current package from the transaction. pisi replans the
+            operation itself, so it can touch packages we never planned """
+        item = self.trans.items.get(self.current_package)
+        try:
+            if item is not None:
+                pop(item)
+                return
+        except KeyError:
+            pass
+        sc_debug("Unplanned operation on {}".format(self.current_package))
+
     def handle_dbus_upgraded(self, what):
         """ Package was upgraded """
         self.executor.set_progress_string(_("Upgraded {} ({} / {})").format(
@@ -408,7 +745,7 @@ class EopkgPlugin(ProviderPlugin):
             self.trans.op_counter - self.trans.count_operations() + 1,
             self.trans.op_counter,
         ))
-        self.trans.pop_upgrade(self.trans.items[self.current_package])
+        self.pop_current(self.trans.pop_upgrade)
         self.executor.set_progress_value(self.trans.get_fraction())
 
     def handle_dbus_removing(self, what):
@@ -427,7 +764,7 @@ class EopkgPlugin(ProviderPlugin):
             self.trans.op_counter - self.trans.count_operations() + 1,
             self.trans.op_counter,
         ))
-        self.trans.pop_removal(self.trans.items[self.current_package])
+        self.pop_current(self.trans.pop_removal)
         self.executor.set_progress_value(self.trans.get_fraction())
 
     def handle_dbus_installing(self, what):
@@ -446,7 +783,7 @@ class EopkgPlugin(ProviderPlugin):
             self.trans.op_counter - self.trans.count_operations() + 1,
             self.trans.op_counter,
         ))
-        self.trans.pop_installation(self.trans.items[self.current_package])
+        self.pop_current(self.trans.pop_installation)
         self.executor.set_progress_value(self.trans.get_fraction())
 
     def handle_dbus_extracting(self, what):
@@ -471,7 +808,7 @@ class EopkgPlugin(ProviderPlugin):
         if cmd == 'fetching':
             self.handle_dbus_fetching(args)
         else:
-            print("unknown progress: {}".format(args))
+            sc_debug("unknown progress: {}".format(args))
 
     def handle_dbus_fetching(self, args):
         """ Propagate dbus fetching to right handler """
@@ -521,10 +858,15 @@ class EopkgPlugin(ProviderPlugin):
 
         # Update UI
         self.executor.set_progress_value(fraction)
+        self.executor.set_download_progress(total, self.trans.download_total)
         progress_string = _("Downloading {} {}".format(
             filename,
             speed_string,
         ))
+        eta = self.executor.get_download_eta()
+        if eta is not None:
+            progress_string = "{} ({})".format(
+                progress_string, sc_format_eta(eta))
         self.executor.set_progress_string(progress_string)
 
     def handle_dbus_finished(self, args):
@@ -537,33 +879,56 @@ class EopkgPlugin(ProviderPlugin):
             "System.Manager.updateRepository",
             "System.Manager.updateAllRepositories",
         ]
+        repoTypes = [
+            "System.Manager.updateRepository",
+            "System.Manager.updateAllRepositories",
+        ]
         if args and args[0] and args[0] in finishedTypes:
-            # This is where we need to force a rebuild of the context
-            print("Finished: {}".format(args[0]))
-            self.rebuild_db()
-            # Unblock spin lock here
-            self.operation_blocked = False
-
-        print("Finished message: {}".format(args))
+            sc_debug("Finished: {}".format(args[0]))
+
+            # Repo changes invalidate everything, otherwise we only need
+            # to touch the packages in the transaction. Without one (i.e.
+            # another COMAR client did the work) the installed dir diff
+            # finds everything that changed.
+            operation = self.operation
+            try:
+                if args[0] in repoTypes:
+                    self.rebuild_db()
+                    self.rebuild_index()
+                elif self.trans:
+                    self.refresh_installed(self.trans.items.keys())
+                else:
+                    self.refresh_installed([])
+            except Exception as e:
+                print("Failed to refresh after {}: {}".format(args[0], e))
+                if operation is not None:
+                    operation.fail("Refresh failed: {}".format(e))
+            finally:
+                # Always wake the executor, unless already failed above
+                if operation is not None:
+                    operation.finish()
+
+        sc_debug("Finished message: {}".format(args))
 
     def handle_dbus_cancelled(self, args):
         """ Cancellation or failure to authenticate """
         print("Cancellation: {}".format(args))
+        operation = self.operation
+        if operation is not None:
+            operation.cancel(str(args))
 
     def install_item(self, executor, transaction):
         # Stash executor + transaction for dbus callback
         self.executor = executor
         self.trans = transaction
 
-        pitem = transaction.primary_item
-        # Guard operation to ensure we complete all ops
-        self.spinlock_busy_wait()
-        self.pmanager.installPackage(pitem.get_id(), timeout=100000)
-        self.spinlock_busy_end()
-
-        # Drop it again
-        self.executor = None
-        self.trans = None
+        items = ",".join([x.get_id() for x in transaction.primary_items])
+        try:
+            return self.run_operation("installPackage", items)
+        finally:
+            # Drop it again
+            self.executor = None
+            self.trans = None
 
     def remove_item(self, executor, transaction):
         # Stash executor + transaction for dbus callback
@@ -572,69 +937,75 @@ class EopkgPlugin(ProviderPlugin):
 
         items = ",".join([x.get_id() for x in transaction.removals])
 
-        # Guard operation to ensure we complete all ops
-        self.spinlock_busy_wait()
-        self.pmanager.removePackage(items, timeout=100000)
-        self.spinlock_busy_end()
-
-        # Drop it again
-        self.executor = None
-        self.trans = None
-
-    def refresh_source(self, executor, source):
-        print("Refreshing source: {}".format(source.get_name()))
-        self.executor = executor
-
-        self.spinlock_busy_wait()
-        self.pmanager.updateRepository(source.get_name(), timeout=100000)
-        self.spinlock_busy_end()
-
-        self.executor = None
+        try:
+            return self.run_operation("removePackage", items)
+        finally:
+            # Drop it again
+            self.executor = None
+            self.trans = None
+
+    def prefetch_item(self, executor, transaction):
+        """ Download the packages for the transaction concurrently, into
+            the package cache where pisi will look for them """
+        cache_dir = ctx.config.cached_packages_dir()
+        if not os.access(cache_dir, os.W_OK):
+            sc_debug("Package cache not writable, not prefetching")
+            return
 
+        items = transaction.installations | transaction.upgrades
+        downloads = self.sizer.get_downloads(
+            self.index.key, [x.get_id() for x in items])
+        if not downloads:
+            return
+        total = sum([x[2] for x in downloads]) or 1
 
-def find_have_data(adb, store):
-    """ Find all packages with AppStream data """
-    ret = []
+        message = _("Downloading {} packages").format(len(downloads))
+        executor.set_progress_string(message)
 
-    for key in adb.list_packages(None):
-        app = store.get_app_by_pkgname(key)
-        if not app:
-            continue
-        # Only want desktop apps here
-        if app.get_kind() != As.AppKind.DESKTOP:
-            continue
-        ret.append(key)
-    return ret
+        def progress(current):
+            executor.set_download_progress(current, total)
+            executor.set_progress_value(float(current) / float(total))
+            eta = executor.get_download_eta()
+            if eta is not None:
+                executor.set_progress_string("{} ({})".format(
+                    message, sc_format_eta(eta)))
 
+        start = time.time()
+        fetched = self.prefetcher.fetch(cache_dir, downloads, progress)
+        sc_debug("Prefetched {} of {} packages in {:.2f}s".format(
+            fetched, len(downloads), time.time() - start))
 
-def filter_packages_by_data(adb, store):
-    """ Return available packages by appdata only """
-    pkgs = find_have_data(adb, store)
-    ret = []
-    for item in pkgs:
-        pkg = adb.get_package(item)
-        ret.append(pkg)
-    return ret
+    def upgrade_item(self, executor, transaction):
+        # Stash executor + transaction for dbus callback
+        self.executor = executor
+        self.trans = transaction
 
+        # pisi replans the dependencies itself, in the same way
+        items = ",".join([x.get_id() for x in transaction.primary_items])
+        try:
+            return self.run_operation("updatePackage", items)
+        finally:
+            # Drop it again
+            self.executor = None
+            self.trans = None
 
-def unmangle_date(tstamp):
-    try:
-        ret = time.strptime(tstamp, "%Y-%m-%d")
-        return ret
-    except Exception:
-        # Probably because old eopkg pspec
-        pass
-    try:
-        ret = time.strptime(tstamp, "%m-%d-%Y")
-        return ret
-    except Exception:
-        return 0
+    def refresh_source(self, executor, source):
+        print("Refreshing source: {}".format(source.get_name()))
+        self.executor = executor
 
+        try:
+            return self.run_operation("updateRepository", source.get_name())
+        finally:
+            self.executor = None
 
-def history_sort(pkgA, pkgB):
-    dateA = pkgA.history[0].date
-    dateB = pkgB.history[0].date
-    aa = unmangle_date(dateA)
-    ab = unmangle_date(dateB)
 
-    return cmp(aa, ab)
+def installed_package_dirs():
+    """ Map installed package names to their name-version-release dirs """
+    ret = dict()
+    for dirname in os.listdir(ctx.config.packages_dir()):
+        try:
+            name, version, release = dirname.rsplit("-", 2)
+        except ValueError:
+            continue
+        ret[name] = dirname
+    return ret
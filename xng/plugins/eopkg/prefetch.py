@@ -0,0 +1,164 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from ...util.http import ScHttpPool
+
+import hashlib
+import httplib
+import os
+import Queue
+import threading
+
+# How many packages are downloaded at once
+PREFETCH_WORKERS = 4
+
+# Read/write buffer size
+PREFETCH_CHUNK = 64 * 1024
+
+
+class EopkgPrefetchState:
+    """ Progress shared between the prefetch workers """
+
+    lock = None
+    current = 0
+    fetched = 0
+    progress = None
+
+    def __init__(self, progress):
+        self.lock = threading.Lock()
+        self.progress = progress
+
+    def add(self, nbytes):
+        with self.lock:
+            self.current += nbytes
+            current = self.current
+        if self.progress is not None:
+            self.progress(current)
+
+    def add_fetched(self):
+        with self.lock:
+            self.fetched += 1
+
+
+class EopkgPrefetcher:
+    """ Download packages into the eopkg package cache ahead of the
+        privileged call, so that pisi finds them already there.
+
+        A small pool of workers share persistent connections to each host,
+        so a large upgrade is bound by bandwidth rather than per-file
+        latency. Partial files are resumed with a Range request, and a file
+        is only renamed into place once its hash matches the index.
+
+        Failures are never fatal, pisi will simply fetch those itself.
+    """
+
+    workers = PREFETCH_WORKERS
+    pool = None
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self.workers = workers
+        self.pool = ScHttpPool(max_idle=workers)
+
+    def fetch(self, cache_dir, downloads, progress=None):
+        """ Fetch (url, filename, size, sha1sum) downloads into cache_dir,
+            calling progress with the running byte count. Returns the
+            number of packages now in the cache """
+        jobs = Queue.Queue(0)
+        for download in downloads:
+            jobs.put(download)
+
+        state = EopkgPrefetchState(progress)
+        threads = []
+        for i in range(min(self.workers, len(downloads))):
+            thr = threading.Thread(target=self.worker,
+                                   args=(cache_dir, jobs, state))
+            thr.daemon = True
+            thr.start()
+            threads.append(thr)
+        for thr in threads:
+            thr.join()
+        return state.fetched
+
+    def worker(self, cache_dir, jobs, state):
+        """ Pool thread body, runs until the jobs run out """
+        while True:
+            try:
+                job = jobs.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                self.fetch_one(cache_dir, job, state)
+                state.add_fetched()
+            except Exception as e:
+                print("Unable to prefetch {}: {}".format(job[0], e))
+
+    def fetch_one(self, cache_dir, job, state):
+        (url, filename, size, sha1sum) = job
+        path = os.path.join(cache_dir, filename)
+        part = path + ".part"
+
+        offset = 0
+        if os.path.exists(part):
+            offset = os.path.getsize(part)
+            if offset >= size:
+                # Can't be right, start over
+                os.unlink(part)
+                offset = 0
+
+        headers = dict()
+        if offset > 0:
+            headers["Range"] = "bytes={}-".format(offset)
+        resp = self.pool.request(url, headers)
+
+        if resp.status == httplib.PARTIAL_CONTENT and offset > 0:
+            mode = "ab"
+            state.add(offset)
+        elif resp.status == httplib.OK:
+            mode = "wb"
+        else:
+            resp.read()
+            resp.close()
+            raise IOError("HTTP {} {}".format(resp.status, resp.reason))
+
+        try:
+            with open(part, mode) as f:
+                while True:
+                    chunk = resp.read(PREFETCH_CHUNK)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    state.add(len(chunk))
+        except Exception:
+            # The rest of the body is still on the wire
+            resp.discard()
+            raise
+        resp.close()
+
+        if not check_sha1sum(part, sha1sum):
+            os.unlink(part)
+            raise IOError("Hash mismatch")
+        os.rename(part, path)
+
+
+def check_sha1sum(path, sha1sum):
+    """ Whether the file matches the hash from the package index """
+    if not sha1sum:
+        return True
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(PREFETCH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest() == sha1sum
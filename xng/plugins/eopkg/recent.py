@@ -0,0 +1,135 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from ...util import sc_cache_dir
+from gi.repository import AppStreamGlib as As
+
+import hashlib
+import heapq
+import marshal
+import os
+import threading
+
+# Bump whenever the layout of the on-disk index changes
+RECENT_INDEX_VERSION = 1
+
+# How many of the most recent apps to keep around
+RECENT_INDEX_SIZE = 50
+
+
+class EopkgRecentIndex:
+    """ Persisted top-K list of the most recently updated desktop apps in
+        the repositories.
+
+        It only depends on the repository and AppStream data, so it is
+        built once per generation of those and otherwise just loaded.
+    """
+
+    path = None
+    key = None
+    names = None
+    lock = None
+
+    def __init__(self):
+        self.path = os.path.join(sc_cache_dir("eopkg"), "recent")
+        self.lock = threading.Lock()
+        self.names = []
+
+    def ensure(self, index, appsystem):
+        """ Make sure the recent list matches the current data """
+        key = compute_recent_key(index.repo_key, appsystem.store_key)
+        with self.lock:
+            if self.key == key:
+                return
+            if self.load(key):
+                return
+            self.build(key, index, appsystem.store)
+
+    def load(self, key):
+        try:
+            with open(self.path, "rb") as f:
+                blob = marshal.load(f)
+        except Exception as e:
+            print("eopkg recent index unavailable: {}".format(e))
+            return False
+
+        if blob.get("version") != RECENT_INDEX_VERSION or \
+                blob.get("key") != key:
+            print("eopkg recent index is stale")
+            return False
+
+        self.key = key
+        self.names = blob["names"]
+        return True
+
+    def build(self, key, index, store):
+        """ Keep the newest desktop apps from the package index """
+
+        def candidates():
+            for name, (avail, inst) in index.packages.iteritems():
+                if avail is None:
+                    continue
+                app = store.get_app_by_pkgname(name)
+                if not app or app.get_kind() != As.AppKind.DESKTOP:
+                    continue
+                yield (parse_date(avail[4]), name)
+
+        top = heapq.nlargest(RECENT_INDEX_SIZE, candidates())
+        self.key = key
+        self.names = [name for (date, name) in top]
+
+        blob = marshal.dumps({
+            "version": RECENT_INDEX_VERSION,
+            "key": key,
+            "names": self.names,
+        })
+        tmp = "{}.{}".format(self.path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.rename(tmp, self.path)
+        except Exception as e:
+            print("Unable to write eopkg recent index: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+
+    def get_recent(self, limit):
+        """ Return up to limit package names, newest first """
+        with self.lock:
+            return self.names[0:limit]
+
+
+def compute_recent_key(repo_key, store_key):
+    h = hashlib.sha1()
+    h.update(str(RECENT_INDEX_VERSION))
+    h.update(repo_key)
+    h.update(store_key or "")
+    return h.hexdigest()
+
+
+def parse_date(tstamp):
+    """ Turn a pisi history date into a sortable YYYYMMDD integer """
+    try:
+        parts = [int(x) for x in tstamp.split("-")]
+    except Exception:
+        return 0
+    if len(parts) != 3:
+        return 0
+    if parts[0] > 31:
+        year, month, day = parts
+    else:
+        # Probably because old eopkg pspec (%m-%d-%Y)
+        month, day, year = parts
+    return year * 10000 + month * 100 + day
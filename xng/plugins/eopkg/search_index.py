@@ -0,0 +1,285 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from ...util import sc_cache_dir
+
+import bisect
+import marshal
+import os
+import re
+import threading
+
+# Bump whenever the layout of the on-disk index changes
+SEARCH_INDEX_VERSION = 1
+
+# Per-field token weights
+WEIGHT_NAME = 8
+WEIGHT_APP_NAME = 6
+WEIGHT_KEYWORD = 4
+WEIGHT_SUMMARY = 2
+WEIGHT_DESCRIPTION = 1
+
+# Multipliers for the kind of token match
+MATCH_EXACT = 1.0
+MATCH_PREFIX = 0.75
+MATCH_FUZZY = 0.5
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_CUTOFF = 0.4
+
+# Only tokens this important are considered for fuzzy matching
+FUZZY_MIN_WEIGHT = WEIGHT_KEYWORD
+
+TOKEN_RE = re.compile(r"[a-z0-9+]+")
+
+
+def tokenize(text):
+    """ Split text into lowercase search tokens """
+    if not text:
+        return []
+    if isinstance(text, unicode):
+        text = text.encode("utf-8")
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token):
+    """ Return the set of padded trigrams for a token """
+    padded = "  {} ".format(token)
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class EopkgSearchIndex:
+    """ Tokenised inverted index over the package names, summaries and
+        descriptions, optionally enriched with AppStream names and keywords.
+
+        It is built once per repository generation (piggybacking on the
+        EopkgIndex rebuild) and persisted alongside it, so queries never
+        have to regex-scan the pisi databases.
+    """
+
+    path = None
+    key = None
+    lock = None
+
+    # token -> {name: weight}
+    postings = None
+
+    # Sorted tokens for prefix matching
+    vocab = None
+
+    # trigram -> [token], only for tokens eligible for fuzzy matches
+    grams = None
+
+    # Whether AppStream data has been merged in yet
+    has_appstream = False
+
+    def __init__(self):
+        self.path = os.path.join(sc_cache_dir("eopkg"), "search")
+        self.lock = threading.Lock()
+        self.reset(None)
+
+    def reset(self, key):
+        self.key = key
+        self.postings = dict()
+        self.vocab = []
+        self.grams = dict()
+        self.has_appstream = False
+
+    def load(self, key):
+        """ Load the on-disk index if it matches the repository key """
+        try:
+            with open(self.path, "rb") as f:
+                blob = marshal.load(f)
+        except Exception as e:
+            print("eopkg search index unavailable: {}".format(e))
+            return False
+
+        if blob.get("version") != SEARCH_INDEX_VERSION or \
+                blob.get("key") != key:
+            print("eopkg search index is stale")
+            return False
+
+        with self.lock:
+            self.key = key
+            self.postings = blob["postings"]
+            self.vocab = blob["vocab"]
+            self.grams = blob["grams"]
+            self.has_appstream = blob["appstream"]
+        return True
+
+    def save(self):
+        """ Atomically write the index back to disk """
+        with self.lock:
+            blob = marshal.dumps({
+                "version": SEARCH_INDEX_VERSION,
+                "key": self.key,
+                "postings": self.postings,
+                "vocab": self.vocab,
+                "grams": self.grams,
+                "appstream": self.has_appstream,
+            })
+        tmp = "{}.{}".format(self.path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.rename(tmp, self.path)
+        except Exception as e:
+            print("Unable to write eopkg search index: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+
+    def build(self, key, documents):
+        """ Rebuild from a dict of name -> [(weight, text)] """
+        with self.lock:
+            self.reset(key)
+            for name, fields in documents.iteritems():
+                self._add_fields(name, fields)
+            self.vocab = sorted(self.postings)
+            for token in self.vocab:
+                self._add_grams(token)
+        self.save()
+
+    def add_document(self, name, fields):
+        """ Incrementally add (or enrich) a single document, leaving the
+            index just as a full build would """
+        with self.lock:
+            promoted = []
+            for token in self._add_fields(name, fields, promoted):
+                bisect.insort(self.vocab, token)
+                self._add_grams(token)
+            # Existing tokens that only now matter enough to go fuzzy
+            for token in promoted:
+                self._add_grams(token)
+
+    def has_document(self, name):
+        with self.lock:
+            for token in tokenize(name):
+                if name in self.postings.get(token, ()):
+                    return True
+        return False
+
+    def _add_fields(self, name, fields, promoted=None):
+        """ Add the weighted fields to the postings, returning new tokens.
+            If promoted is given, existing tokens raised to FUZZY_MIN_WEIGHT
+            for the first time are appended to it """
+        new_tokens = []
+        for weight, text in fields:
+            for token in tokenize(text):
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = dict()
+                    self.postings[token] = posting
+                    new_tokens.append(token)
+                elif promoted is not None and weight >= FUZZY_MIN_WEIGHT \
+                        and posting.get(name, 0) < weight and \
+                        max(posting.itervalues()) < FUZZY_MIN_WEIGHT:
+                    promoted.append(token)
+                if posting.get(name, 0) < weight:
+                    posting[name] = weight
+        return new_tokens
+
+    def _add_grams(self, token):
+        """ Make the token available for fuzzy matching if important """
+        if len(token) < 3:
+            return
+        if max(self.postings[token].itervalues()) < FUZZY_MIN_WEIGHT:
+            return
+        for gram in trigrams(token):
+            self.grams.setdefault(gram, []).append(token)
+
+    def _expand(self, qtoken):
+        """ Find all index tokens matching the query token, along with the
+            multiplier for how well they match """
+        matches = dict()
+        if qtoken in self.postings:
+            matches[qtoken] = MATCH_EXACT
+
+        # Prefix matches are a contiguous run of the sorted vocabulary
+        i = bisect.bisect_left(self.vocab, qtoken)
+        while i < len(self.vocab) and self.vocab[i].startswith(qtoken):
+            token = self.vocab[i]
+            if token not in matches:
+                matches[token] = MATCH_PREFIX
+            i += 1
+
+        # Only go fuzzy when we have nothing better to offer
+        if matches or len(qtoken) < 3:
+            return matches
+
+        qgrams = trigrams(qtoken)
+        shared = dict()
+        for gram in qgrams:
+            for token in self.grams.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        for token, count in shared.iteritems():
+            tgrams = len(token) + 1
+            similarity = float(count) / (len(qgrams) + tgrams - count)
+            if similarity >= FUZZY_CUTOFF:
+                matches[token] = MATCH_FUZZY * similarity
+        return matches
+
+    def query(self, term):
+        """ Return package names matching every token of the term, ranked
+            from best to worst """
+        qtokens = tokenize(term)
+        if not qtokens:
+            return []
+
+        scores = None
+        with self.lock:
+            for qtoken in qtokens:
+                token_scores = dict()
+                for token, mult in self._expand(qtoken).iteritems():
+                    for name, weight in self.postings[token].iteritems():
+                        score = mult * weight
+                        if score > token_scores.get(name, 0):
+                            token_scores[name] = score
+
+                # All tokens must match something
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = dict((x, scores[x] + token_scores[x])
+                                  for x in scores if x in token_scores)
+                if not scores:
+                    return []
+
+        # Give the package name itself the final say
+        joined = "-".join(qtokens)
+        for name in scores:
+            lname = name.lower()
+            if lname == joined:
+                scores[name] += 100
+            elif lname.startswith(joined):
+                scores[name] += 20
+
+        return sorted(scores, key=lambda x: (-scores[x], x))
+
+
+def package_fields(name, pkg):
+    """ Return the weighted searchable fields of a pisi package """
+    return [
+        (WEIGHT_NAME, name),
+        (WEIGHT_SUMMARY, str(pkg.summary)),
+        (WEIGHT_DESCRIPTION, str(pkg.description)),
+    ]
+
+
+def app_fields(app):
+    """ Return the weighted searchable fields of an AppStream app """
+    fields = [(WEIGHT_APP_NAME, app.get_name("C"))]
+    for keyword in app.get_keywords("C") or []:
+        fields.append((WEIGHT_KEYWORD, keyword))
+    return fields
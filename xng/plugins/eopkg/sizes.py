@@ -0,0 +1,169 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+import pisi
+import pisi.context as ctx
+import os
+import threading
+
+
+class EopkgDownloadSizer:
+    """ Batch replacement for pisi's calculate_download_sizes.
+
+        The per-package download (full or delta) is looked up once per
+        index generation and remembered, and the package cache directory
+        is listed once per query rather than probed for every package.
+
+        Cached packages are recognised by name and size, rather than by
+        checksumming every cached file.
+    """
+
+    key = None
+    lock = None
+
+    # name -> (filename, size, url, sha1sum, full size)
+    sizes = None
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sizes = dict()
+
+    def get_size(self, key, name):
+        """ Return the download size of a single package """
+        with self.lock:
+            self.ensure(key, [name])
+            return self.sizes[name][1]
+
+    def get_downloads(self, key, names):
+        """ Return (url, filename, size, sha1sum) for each of the packages
+            that isn't already complete in the package cache """
+        with self.lock:
+            self.ensure(key, names)
+            records = [self.sizes[x] for x in names]
+
+        cache = list_package_cache()
+        ret = []
+        for (filename, size, url, sha1sum, full_size) in records:
+            if filename is None or url is None:
+                continue
+            if cache.get(filename) == size:
+                continue
+            ret.append((url, filename, size, sha1sum))
+        return ret
+
+    def get_sizes(self, key, names):
+        """ Return (total, cached, saved, {name: size}) for the packages,
+            where saved is how much smaller the deltas are than the full
+            packages they stand in for """
+        with self.lock:
+            self.ensure(key, names)
+            sizes = dict((x, self.sizes[x]) for x in names)
+
+        cache = list_package_cache()
+        total = 0
+        cached = 0
+        saved = 0
+        ret = dict()
+        for name, (filename, size, url, sha1sum, full_size) in \
+                sizes.iteritems():
+            ret[name] = size
+            total += size
+            saved += full_size - size
+            if filename is None:
+                continue
+            have = cache.get(filename)
+            if have is not None and have == size:
+                cached += size
+                continue
+            partial = cache.get(filename + ".part")
+            if partial is not None:
+                cached += partial
+        return (total, cached, saved, ret)
+
+    def ensure(self, key, names):
+        """ Make sure we know about all of the names for this generation """
+        if key != self.key:
+            self.key = key
+            self.sizes = dict()
+        missing = [x for x in names if x not in self.sizes]
+        if missing:
+            self.lookup(missing)
+
+    def lookup(self, names):
+        """ Work out the download for each package, preferring deltas just
+            as pisi will, i.e. when a delta's base is the installed release
+            and the distribution release is unchanged
+        """
+        packagedb = pisi.db.packagedb.PackageDB()
+        installdb = pisi.db.installdb.InstallDB()
+        repodb = pisi.db.repodb.RepoDB()
+        ignore_delta = ctx.config.values.general.ignore_delta
+
+        for name in names:
+            if not packagedb.has_package(name):
+                self.sizes[name] = (None, 0, None, None, 0)
+                continue
+            pkg, repo = packagedb.get_package_repo(name)
+            delta = None
+            if installdb.has_package(name) and not ignore_delta:
+                (version, release, build, distro, distro_release) = \
+                    installdb.get_version_and_distro_release(name)
+                # Distribution upgrades never use deltas
+                if distro == pkg.distribution and \
+                        distro_release == pkg.distributionRelease:
+                    delta = pkg.get_delta(release)
+            if delta:
+                uri = delta.packageURI
+                size = delta.packageSize
+                sha1sum = delta.packageHash
+            else:
+                uri = pkg.packageURI
+                size = pkg.packageSize
+                sha1sum = pkg.packageHash
+            url = package_url(repodb, repo, uri)
+            self.sizes[name] = (os.path.basename(uri), long(size), url,
+                                sha1sum, long(pkg.packageSize))
+
+
+def package_url(repodb, repo, uri):
+    """ Resolve a package URI against its repository, as pisi does """
+    uri = str(uri)
+    if "://" in uri:
+        return uri
+    try:
+        base = os.path.dirname(repodb.get_repo_url(repo))
+    except Exception:
+        return None
+    if "://" not in base:
+        # Local repositories have nothing to fetch
+        return None
+    return "{}/{}".format(base, uri)
+
+
+def list_package_cache():
+    """ Return filename -> size for the eopkg package cache, only stat'ing
+        the files that look like packages """
+    ret = dict()
+    try:
+        root = ctx.config.cached_packages_dir()
+        entries = os.listdir(root)
+    except Exception:
+        return ret
+    for entry in entries:
+        if not entry.endswith(".eopkg") and not entry.endswith(".part"):
+            continue
+        try:
+            ret[entry] = os.stat(os.path.join(root, entry)).st_size
+        except Exception:
+            continue
+    return ret
@@ -183,10 +183,14 @@ class FlatpakPlugin(ProviderPlugin):
         if popfilter == PopulationFilter.CATEGORY:
             self.populate_category(storage, extra)
 
-    def populate_category(self, storage, category):
-        """ Populate the storage with refs from the given category """
+    def populate_category(self, storage, request):
+        """ Populate the storage with refs from the given category, all on
+            the first page """
+        category = request.get_category()
         if not category.get_id().startswith("flatpak:"):
             return
+        if request.get_offset() > 0:
+            return
         remote_apps = self.client.list_remote_refs_sync(
             category.source.name,
             None)
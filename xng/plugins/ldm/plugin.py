@@ -53,12 +53,13 @@ class LdmPlugin(ProviderPlugin):
         elif popfilter == PopulationFilter.DRIVERS:
             raise RuntimeError("fatal recursion!")
 
-    def populate_category(self, storage, category):
+    def populate_category(self, storage, request):
         """ Populate categories """
+        category = request.get_category()
         id = category.get_id()
 
-        # Make sure its an LDM category first.
-        if not id.startswith("ldm:"):
+        # Make sure its an LDM category first, and we only have one page
+        if not id.startswith("ldm:") or request.get_offset() > 0:
             return
 
         items = []
@@ -98,12 +99,9 @@ class LdmPlugin(ProviderPlugin):
         """ Query all plugins to find the true providers of an LdmProvider """
         package_name = provider.get_package()
         self.temporary_drivers = []
-        for plugin in self.context.plugins:
-            if plugin == self:
-                continue
-            print("Asking {} for providers of {}".format(
-                plugin,  package_name))
-            plugin.populate_storage(self, PopulationFilter.DRIVERS, provider)
+        print("Asking for providers of {}".format(package_name))
+        self.context.populate_storage(self, PopulationFilter.DRIVERS,
+                                      provider, exclude=self)
         return self.temporary_drivers
 
     def add_item(self, id, item, popfilter):
@@ -66,7 +66,10 @@ class SnapdPlugin(ProviderPlugin):
         elif popfilter == PopulationFilter.CATEGORY:
             return self.populate_category(storage, extra)
 
-    def populate_category(self, storage, extra):
+    def populate_category(self, storage, request):
+        # Everything fits on the first page
+        if request.get_offset() > 0:
+            return
         snaps = [
             "ohmygiraffe",
             "emoj",
@@ -0,0 +1,178 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from .util import sc_debug
+import Queue
+import threading
+import time
+
+# Number of plugins that may populate concurrently
+POPULATE_WORKERS = 4
+
+# Give up on a plugin after this many seconds
+POPULATE_TIMEOUT = 30.0
+
+# How often the caller checks for cancellation while waiting
+POPULATE_POLL = 0.1
+
+
+class ScPopulationJob:
+    """ A single plugin's share of a population request.
+
+        The job is handed to the plugin as its storage, and forwards all
+        items to the caller through the results queue.
+    """
+
+    populator = None
+    plugin = None
+    popfilter = None
+    extra = None
+    results = None
+    finished = False
+    abandoned = False
+
+    def __init__(self, populator, plugin, popfilter, extra, results):
+        self.populator = populator
+        self.plugin = plugin
+        self.popfilter = popfilter
+        self.extra = extra
+        self.results = results
+
+    def run(self):
+        """ Run the plugin population on the current (pool) thread """
+        start = time.time()
+        try:
+            self.plugin.populate_storage(self, self.popfilter, self.extra)
+        except Exception as e:
+            print("{} failed to populate: {}".format(
+                self.plugin.get_name(), e))
+        self.populator.record_timing(self.plugin, self.popfilter,
+                                     time.time() - start)
+        with self.populator.lock:
+            self.finished = True
+        self.results.put(self)
+
+    def add_item(self, id, item, popfilter):
+        """ Storage API """
+        if self.abandoned:
+            return
+        self.results.put((id, item, popfilter))
+
+    def abandon(self):
+        """ Stop caring about this job, returning True if it was still
+            running (or waiting to run) """
+        with self.populator.lock:
+            if self.finished:
+                return False
+            self.abandoned = True
+            return True
+
+
+class ScPopulator:
+    """ ScPopulator fans a population request out to every plugin at once
+        using a small pool of worker threads.
+
+        Items are merged back into the real storage on the calling thread
+        in the order they arrive, so storage implementations never see
+        concurrent add_item calls. A plugin that takes too long is given
+        up on, and its worker replaced, without holding up the others.
+    """
+
+    jobs = None
+    lock = None
+    local = None
+
+    # (plugin name, popfilter) -> seconds
+    timings = None
+
+    def __init__(self, max_workers=POPULATE_WORKERS):
+        self.jobs = Queue.Queue(0)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.timings = dict()
+        for i in range(max_workers):
+            self.add_worker()
+
+    def add_worker(self):
+        thr = threading.Thread(target=self.worker)
+        thr.daemon = True
+        thr.start()
+
+    def worker(self):
+        """ Pool thread body """
+        self.local.in_pool = True
+        while True:
+            job = self.jobs.get()
+            if not job.abandoned:
+                job.run()
+            # Someone else has replaced us in the pool
+            if job.abandoned:
+                return
+
+    def record_timing(self, plugin, popfilter, elapsed):
+        name = plugin.get_name()
+        with self.lock:
+            self.timings[(name, popfilter)] = elapsed
+        sc_debug("{} populated filter {} in {:.2f}ms".format(
+            name, popfilter, elapsed * 1000))
+
+    def get_timing(self, plugin, popfilter):
+        """ Most recent latency (seconds) of the plugin for the filter """
+        with self.lock:
+            return self.timings.get((plugin.get_name(), popfilter))
+
+    def populate(self, storage, popfilter, extra, plugins,
+                 timeout=POPULATE_TIMEOUT, cancellable=None):
+        """ Populate storage from all plugins, returning when they have all
+            finished, timed out, or the cancellable has been triggered """
+
+        # A plugin asking the others for help must not wait on the pool
+        # it is already occupying
+        if getattr(self.local, "in_pool", False):
+            for plugin in plugins:
+                start = time.time()
+                plugin.populate_storage(storage, popfilter, extra)
+                self.record_timing(plugin, popfilter, time.time() - start)
+            return
+
+        results = Queue.Queue(0)
+        jobs = []
+        for plugin in plugins:
+            job = ScPopulationJob(self, plugin, popfilter, extra, results)
+            jobs.append(job)
+            self.jobs.put(job)
+
+        pending = len(jobs)
+        deadline = time.time() + timeout
+        while pending > 0:
+            if cancellable is not None and cancellable.is_cancelled():
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                msg = results.get(timeout=min(remaining, POPULATE_POLL))
+            except Queue.Empty:
+                continue
+            if isinstance(msg, ScPopulationJob):
+                pending -= 1
+                continue
+            storage.add_item(*msg)
+
+        for job in jobs:
+            if not job.abandon():
+                continue
+            if cancellable is None or not cancellable.is_cancelled():
+                print("{} timed out populating filter {}".format(
+                    job.plugin.get_name(), popfilter))
+            self.add_worker()
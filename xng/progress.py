@@ -0,0 +1,178 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from gi.repository import GLib, GObject
+from .util import sc_debug_enabled
+
+import collections
+import threading
+import time
+
+# Never update the UI more often than this (seconds), i.e. once a frame
+PROGRESS_INTERVAL = 1.0 / 60.0
+
+# How far back (seconds) the transfer rate is averaged over
+RATE_WINDOW = 5.0
+
+
+class ScTransferRate:
+    """ Sliding window estimate of download throughput """
+
+    samples = None
+    window = RATE_WINDOW
+
+    def __init__(self, window=RATE_WINDOW):
+        self.window = window
+        self.samples = collections.deque()
+
+    def reset(self):
+        self.samples.clear()
+
+    def add_sample(self, current, now=None):
+        """ Record the running byte count """
+        if now is None:
+            now = time.time()
+        self.samples.append((now, current))
+        while len(self.samples) > 2 and \
+                now - self.samples[0][0] > self.window:
+            self.samples.popleft()
+
+    def get_rate(self):
+        """ Bytes per second over the window, or 0 if unknown """
+        if len(self.samples) < 2:
+            return 0.0
+        (t0, b0) = self.samples[0]
+        (t1, b1) = self.samples[-1]
+        if t1 <= t0 or b1 <= b0:
+            return 0.0
+        return float(b1 - b0) / (t1 - t0)
+
+    def get_eta(self, total):
+        """ Seconds remaining until total, or None if unknown """
+        rate = self.get_rate()
+        if rate <= 0 or not self.samples:
+            return None
+        remaining = total - self.samples[-1][1]
+        return max(0.0, remaining / rate)
+
+
+class ScProgressChannel(GObject.Object):
+    """ ScProgressChannel carries progress from the executor thread to the
+        UI without either side waiting on the other.
+
+        Producers only ever overwrite the latest state, so superseded
+        updates are simply dropped. A single main context source is
+        scheduled for any number of updates, and it is held back so that
+        'changed' is emitted at most once per PROGRESS_INTERVAL.
+    """
+
+    __gtype_name__ = "ScProgressChannel"
+
+    __gsignals__ = {
+        'changed': (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, ()),
+    }
+
+    lock = None
+    source_id = None
+    last_dispatch = 0
+    verbose = False
+
+    message = None
+    fraction = 0.0
+    rate = None
+    download_total = 0
+
+    def __init__(self):
+        GObject.Object.__init__(self)
+        self.lock = threading.Lock()
+        self.rate = ScTransferRate()
+        self.verbose = sc_debug_enabled()
+
+    def reset(self, message=None):
+        """ A new job is starting """
+        with self.lock:
+            self.message = message
+            self.fraction = 0.0
+            self.download_total = 0
+            self.rate.reset()
+            self.schedule()
+
+    def set_message(self, message):
+        with self.lock:
+            if message == self.message:
+                return
+            self.message = message
+            self.schedule()
+        if self.verbose:
+            print(message)
+
+    def set_fraction(self, fraction):
+        with self.lock:
+            if fraction == self.fraction:
+                return
+            self.fraction = fraction
+            self.schedule()
+
+    def set_downloaded(self, current, total):
+        """ Feed the transfer rate with the running download totals """
+        with self.lock:
+            self.download_total = total
+            self.rate.add_sample(current)
+
+    def get_message(self):
+        with self.lock:
+            return self.message
+
+    def get_fraction(self):
+        with self.lock:
+            return self.fraction
+
+    def get_rate(self):
+        """ Current download rate in bytes per second """
+        with self.lock:
+            return self.rate.get_rate()
+
+    def get_eta(self):
+        """ Estimated seconds until the download completes, or None """
+        with self.lock:
+            return self.rate.get_eta(self.download_total)
+
+    def schedule(self):
+        """ Lock must be held. Arrange for a single dispatch """
+        if self.source_id is not None:
+            return
+        delay = self.last_dispatch + PROGRESS_INTERVAL - time.time()
+        if delay > 0:
+            self.source_id = GLib.timeout_add(int(delay * 1000) + 1,
+                                              self.dispatch)
+        else:
+            self.source_id = GLib.idle_add(self.dispatch)
+
+    def dispatch(self):
+        """ Main loop side, let the UI pick up the latest state """
+        with self.lock:
+            self.source_id = None
+            self.last_dispatch = time.time()
+        self.emit('changed')
+        return False
+
+
+def sc_format_eta(seconds):
+    """ Short human readable form of the time remaining """
+    seconds = int(seconds)
+    if seconds < 60:
+        return _("{} seconds remaining").format(seconds)
+    minutes = (seconds + 30) // 60
+    if minutes < 60:
+        return _("{} minutes remaining").format(minutes)
+    return _("{}:{:02d} hours remaining").format(minutes // 60, minutes % 60)
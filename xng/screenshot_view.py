@@ -13,6 +13,7 @@
 
 from gi.repository import Gtk
 from .imagewidget import ScImageWidget
+from .util.fetcher import FETCH_PRIORITY_VISIBLE, FETCH_PRIORITY_THUMBNAIL
 
 
 class ScScreenshotView(Gtk.Box):
@@ -22,6 +23,9 @@ class ScScreenshotView(Gtk.Box):
     fetcher = None
     screen_map = None
 
+    # Cancellation group for the current item's fetches
+    fetch_group = None
+
     image_widget = None
     box_thumbnails = None
 
@@ -73,16 +77,20 @@ class ScScreenshotView(Gtk.Box):
         self.fetcher.connect('media-fetched', self.on_media_fetched)
         self.fetcher.connect('fetch-failed', self.on_fetch_failed)
 
-    def on_media_fetched(self, fetcher, uri, filename, pixbuf):
-        """ Some media that we asked for has been loaded """
+    def on_media_fetched(self, fetcher, uri, filename, pixbuf, size):
+        """ Some media that we asked for has been loaded, at size. The same
+            URI may be wanted by the main preview and a thumbnail at once,
+            so each only takes the pixbuf decoded for it """
         # Check if its our main preview
-        if uri == self.image_widget.uri:
+        if uri == self.image_widget.uri and \
+                size == self.image_widget.get_fetch_size():
             self.image_widget.show_image(uri, pixbuf)
             self.image_widget.queue_resize()
-        elif uri in self.screen_map:
+        if uri in self.screen_map:
             wid = self.screen_map[uri]
-            wid.show_image(uri, pixbuf)
-            wid.queue_resize()
+            if size == wid.get_fetch_size():
+                wid.show_image(uri, pixbuf)
+                wid.queue_resize()
         pixbuf = None
 
     def on_fetch_failed(self, fetcher, uri, err):
@@ -108,7 +116,9 @@ class ScScreenshotView(Gtk.Box):
         # Request show of new picture
         self.image_widget.show_loading()
         self.image_widget.uri = thumb.alt_uri
-        self.fetcher.fetch_media(thumb.alt_uri)
+        self.fetcher.fetch_media(thumb.alt_uri, FETCH_PRIORITY_VISIBLE,
+                                 self.fetch_group,
+                                 self.image_widget.get_fetch_size())
 
     def set_item(self, item):
         # Clean up old thumbnails
@@ -120,6 +130,11 @@ class ScScreenshotView(Gtk.Box):
             del self.screen_map[key]
         self.screen_map = dict()
 
+        # Nothing from the last item is worth fetching anymore
+        if self.fetch_group is not None:
+            self.fetcher.cancel_group(self.fetch_group)
+        self.fetch_group = self.fetcher.new_group()
+
         # Ask AppSystem for screenshots (AppStream only!)
         id = item.get_id()
         store = item.get_store()
@@ -140,7 +155,9 @@ class ScScreenshotView(Gtk.Box):
             default = screens[0]
         self.image_widget.uri = default.main_uri
         # Always "fetch", fetcher knows if it exists or not.
-        self.fetcher.fetch_media(default.main_uri)
+        self.fetcher.fetch_media(default.main_uri, FETCH_PRIORITY_VISIBLE,
+                                 self.fetch_group,
+                                 self.image_widget.get_fetch_size())
 
         # Set up the screenshot order
         allScreens = [default]
@@ -166,7 +183,11 @@ class ScScreenshotView(Gtk.Box):
 
         # Now ask the preview to fetch
         for screen in allScreens:
-            self.fetcher.fetch_media(screen.thumb_uri)
+            preview = self.screen_map[screen.thumb_uri]
+            self.fetcher.fetch_media(screen.thumb_uri,
+                                     FETCH_PRIORITY_THUMBNAIL,
+                                     self.fetch_group,
+                                     preview.get_fetch_size())
 
         # And now select it
         self.box_thumbnails.select_child(defaultParent)
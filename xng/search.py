@@ -11,11 +11,12 @@
 #  (at your option) any later version.
 #
 
-from gi.repository import Gtk, GObject, Gdk, Pango
-import threading
+from gi.repository import Gtk, GObject, Pango
 
+from .lazylist import ScLazyChild, ScLazyList
 from .loadpage import ScLoadingPage
-from xng.plugins.base import PopulationFilter, ItemStatus, ProviderItem
+from .search_worker import ScSearchWorker
+from xng.plugins.base import ItemStatus, ProviderItem
 
 
 class NotFoundPlaceholder(Gtk.Label):
@@ -34,21 +35,29 @@ class NotFoundPlaceholder(Gtk.Label):
         self.set_property("margin", 20)
 
 
-class ScSearchResult(Gtk.ListBoxRow):
+class ScSearchResult(Gtk.ListBoxRow, ScLazyChild):
     """ Display an item in a pretty view """
 
     __gtype_name__ = "ScSearchResult"
 
     item = None
+    appsystem = None
     action_button = None
 
     def __init__(self, appsystem, item):
         Gtk.ListBoxRow.__init__(self)
         self.item = item
+        self.appsystem = appsystem
+        self.init_lazy()
+        self.get_style_context().add_class("search-item-row")
+
+    def build(self):
+        """ Build the real row contents once we're visible """
+        appsystem = self.appsystem
+        item = self.item
         item_id = item.get_id()
 
         main_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, 0)
-        self.add(main_box)
 
         # Pack the image first
         img = Gtk.Image.new()
@@ -113,13 +122,16 @@ class ScSearchResult(Gtk.ListBoxRow):
         main_box.pack_end(self.action_button, False, False, 0)
         self.action_button.get_style_context().add_class("flat")
 
-        self.get_style_context().add_class("search-item-row")
+        return main_box
 
 
 class ScSearchView(Gtk.Box):
     """ Provide search functionality
 
-        Simple threaded search results page
+        Searches are executed by a single ScSearchWorker, and results are
+        streamed into the view in batches as the plugins yield them. Each
+        new request supersedes (and cancels) the last one, so the view can
+        be driven directly from search-as-you-type.
     """
 
     __gtype_name__ = "ScSearchView"
@@ -133,6 +145,9 @@ class ScSearchView(Gtk.Box):
     load = None
     listbox_results = None
     holder = None
+    results = None
+    worker = None
+    current_request = None
 
     def get_page_name(self):
         return _("Search")
@@ -141,6 +156,7 @@ class ScSearchView(Gtk.Box):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL)
 
         self.context = context
+        self.worker = ScSearchWorker(context, self)
 
         # Main swap stack
         self.stack = Gtk.Stack.new()
@@ -159,6 +175,7 @@ class ScSearchView(Gtk.Box):
         self.listbox_results = Gtk.ListBox.new()
         self.listbox_results.set_activate_on_single_click(True)
         self.listbox_results.connect('row-activated', self.on_row_activated)
+        self.results = ScLazyList(self.listbox_results, self.create_row)
 
         self.stack.add_named(self.listbox_results, 'results')
 
@@ -167,6 +184,12 @@ class ScSearchView(Gtk.Box):
         self.holder.show_all()
         self.listbox_results.set_placeholder(self.holder)
 
+    def create_row(self, item):
+        """ Model binding: create the (placeholder) row for an item """
+        wid = ScSearchResult(self.context.appsystem, item)
+        wid.show()
+        return wid
+
     def on_row_activated(self, box, row, udata=None):
         """ Propogate item selection """
         if not row:
@@ -178,59 +201,48 @@ class ScSearchView(Gtk.Box):
         self.emit('item-selected', item)
 
     def set_search_request(self, request):
-        self.begin_busy()
-
-        # Force UI to update itself before loading.
-        while (Gtk.events_pending()):
-            Gtk.main_iteration()
-
-        thr = threading.Thread(target=self.do_search, args=(request,))
-        thr.daemon = True
-        thr.start()
-
-    def do_search(self, request):
-        """ Begin performing the search in a threaded fashion """
-        print("Searching for term: {}".format(request.get_term()))
+        """ Replace any running search with this one """
+        request.set_appsystem(self.context.appsystem)
+        self.current_request = request
 
         # Kill existing results
-        Gdk.threads_enter()
-        for child in self.listbox_results.get_children():
-            child.destroy()
-        Gdk.threads_leave()
-
-        for plugin in self.context.plugins:
-            plugin.populate_storage(
-                self,
-                PopulationFilter.SEARCH,
-                request)
+        self.results.clear()
 
-        GObject.idle_add(self.end_busy)
+        self.begin_busy()
+        self.worker.push_request(request)
 
     def begin_busy(self):
         """" We're about to start searching """
-        self.context.set_window_busy(True)
         self.holder.set_visible(False)
         self.stack.set_visible_child_name("loading")
 
     def end_busy(self):
         """ Move from the busy view now on idle thread-safe loop"""
-        self.context.set_window_busy(False)
         self.stack.set_visible_child_name('results')
         self.holder.set_visible(True)
-        return False
 
-    def add_item(self, id, item, popfilter):
-        """ Storage API """
-        if popfilter != PopulationFilter.SEARCH:
-            return
-        self.add_search_result(item)
+    def search_batch(self, request, items):
+        """ Worker API: a batch of results is ready """
+        GObject.idle_add(self.add_batch, request, items)
 
-    def add_search_result(self, item):
-        """ Add a new search result to the view """
-        Gdk.threads_enter()
+    def search_end(self, request):
+        """ Worker API: the search completed """
+        GObject.idle_add(self.finish_search, request)
 
-        wid = ScSearchResult(self.context.appsystem, item)
-        wid.show_all()
-        self.listbox_results.add(wid)
+    def add_batch(self, request, items):
+        """ Add a batch of search results to the view """
+        if request is not self.current_request or request.is_cancelled():
+            return False
+
+        self.results.append(items)
 
-        Gdk.threads_leave()
+        # Show results as soon as we have some
+        self.stack.set_visible_child_name('results')
+        return False
+
+    def finish_search(self, request):
+        """ Only show the placeholder once we're really done """
+        if request is not self.current_request:
+            return False
+        self.end_busy()
+        return False
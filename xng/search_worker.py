@@ -0,0 +1,183 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2014-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+
+from xng.plugins.base import PopulationFilter
+from .util import sc_debug
+import Queue
+import threading
+import time
+
+# How long to wait for the user to stop typing before searching (seconds)
+SEARCH_DEBOUNCE = 0.15
+
+# Get the first few results out quickly, then stream in larger batches
+SEARCH_FIRST_BATCH = 10
+SEARCH_BATCH = 50
+
+
+class ScSearchStats:
+    """ Simple accounting for the search worker so that throughput and
+        latency can be inspected without any UI attached """
+
+    requested = 0     # Requests pushed to the worker
+    completed = 0     # Requests that ran to completion
+    cancelled = 0     # Requests superseded before or during execution
+
+    first_result_time = 0.0  # Accumulated time to first batch
+    first_result_count = 0
+    busy_time = 0.0          # Time spent executing completed queries
+
+    def record_first_result(self, elapsed):
+        self.first_result_time += elapsed
+        self.first_result_count += 1
+
+    def record_completed(self, elapsed):
+        self.completed += 1
+        self.busy_time += elapsed
+
+    def get_queries_per_second(self):
+        """ Completed queries per second of worker busy time """
+        if self.busy_time <= 0:
+            return 0.0
+        return float(self.completed) / self.busy_time
+
+    def get_time_to_first_result(self):
+        """ Mean time to the first batch of results, in seconds """
+        if self.first_result_count == 0:
+            return 0.0
+        return self.first_result_time / self.first_result_count
+
+
+class ScSearchCollector:
+    """ Per-request storage handed to the plugins, which buffers results
+        and streams them to the sink in ranked batches """
+
+    worker = None
+    request = None
+    items = None
+    start = 0
+    batches = 0
+
+    def __init__(self, worker, request):
+        self.worker = worker
+        self.request = request
+        self.items = []
+        self.start = time.time()
+        self.batches = 0
+
+    def add_item(self, id, item, popfilter):
+        """ Storage API """
+        if popfilter != PopulationFilter.SEARCH:
+            return
+        if self.request.is_cancelled():
+            return
+        self.items.append(item)
+        limit = SEARCH_FIRST_BATCH if self.batches == 0 else SEARCH_BATCH
+        if len(self.items) >= limit:
+            self.flush()
+
+    def flush(self):
+        """ Push the pending batch out to the sink. This happens under the
+            worker lock, so once push_request has superseded the request
+            nothing more from it can reach the sink """
+        if not self.items:
+            return
+        with self.worker.lock:
+            if self.request.is_cancelled():
+                return
+            if self.batches == 0:
+                self.worker.stats.record_first_result(
+                    time.time() - self.start)
+            self.batches += 1
+            items = self.items
+            self.items = []
+            self.worker.sink.search_batch(self.request, items)
+
+
+class ScSearchWorker:
+    """ ScSearchWorker executes every search on a single dedicated thread.
+
+        Requests are debounced, so that only the last of a burst of
+        keystrokes is executed, and pushing a new request cancels the
+        previous one. Plugins see the cancellation through the request
+        itself, and the collector will never forward results for a
+        cancelled request.
+
+        The sink receives search_batch(request, items) and
+        search_end(request) on the worker thread, and is responsible for
+        marshalling them back to the UI. They are called with the worker
+        lock held, so must not push requests themselves.
+    """
+
+    context = None
+    sink = None
+    queue = None
+    lock = None
+    current = None
+    done = None  # Last request to run to completion
+    stats = None
+
+    def __init__(self, context, sink):
+        self.context = context
+        self.sink = sink
+        self.queue = Queue.Queue(0)
+        self.lock = threading.Lock()
+        self.stats = ScSearchStats()
+
+        thr = threading.Thread(target=self.run)
+        thr.daemon = True
+        thr.start()
+
+    def push_request(self, request):
+        """ Supersede any current search with this request """
+        with self.lock:
+            if self.current is not None and self.current is not self.done:
+                self.current.cancel()
+                self.stats.cancelled += 1
+            self.current = request
+            self.stats.requested += 1
+        self.queue.put(request)
+
+    def run(self):
+        """ Worker thread body, runs forever """
+        while True:
+            request = self.queue.get()
+
+            # Wait until the user stops typing
+            while True:
+                try:
+                    request = self.queue.get(timeout=SEARCH_DEBOUNCE)
+                except Queue.Empty:
+                    break
+
+            if request.is_cancelled():
+                continue
+            self.execute(request)
+
+    def execute(self, request):
+        """ Run the request against all plugins """
+        sc_debug("Searching for term: {}".format(request.get_term()))
+        collector = ScSearchCollector(self, request)
+
+        self.context.populate_storage(collector,
+                                      PopulationFilter.SEARCH,
+                                      request,
+                                      cancellable=request.cancellable)
+        collector.flush()
+
+        with self.lock:
+            if request.is_cancelled():
+                return
+            self.done = request
+            self.stats.record_completed(time.time() - collector.start)
+            self.sink.search_end(request)
@@ -11,10 +11,12 @@
 #  (at your option) any later version.
 #
 
-from gi.repository import Gtk
+from gi.repository import Gdk, Gtk
 
 from .card import ScCard
 from .plugins.base import PopulationFilter
+from .util import sc_debug
+import threading
 
 
 class ScUpdatesView(Gtk.Box):
@@ -29,6 +31,12 @@ class ScUpdatesView(Gtk.Box):
     context = None
     header_box = None
     updates_button = None
+    actions_box = None
+
+    # Plugins with updates available, in the order they reported them,
+    # each with its own upgrade button
+    plugins = None
+    upgrade_buttons = None
 
     def get_page_name(self):
         return _("Updates")
@@ -38,9 +46,12 @@ class ScUpdatesView(Gtk.Box):
 
         self.context = context
         self.updates_button = updates_button
+        self.plugins = []
+        self.upgrade_buttons = dict()
 
         self.build_header()
         self.build_stats_view()
+        self.build_actions()
 
         lab = Gtk.Label.new("Not yet implemented")
         lab.get_style_context().add_class("dim-label")
@@ -92,18 +103,57 @@ class ScUpdatesView(Gtk.Box):
         card.get_style_context().add_class("security-card")
         card.set_icon_name("security-high-symbolic")
 
+    def build_actions(self):
+        """ Hold the upgrade buttons, one per plugin with updates, as each
+            plugin plans and applies its updates as its own transaction """
+        self.actions_box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, 12)
+        self.actions_box.set_halign(Gtk.Align.CENTER)
+        self.header_box.pack_start(self.actions_box, False, False, 0)
+
+    def add_upgrade_button(self, plugin):
+        """ Allow applying every update the plugin has in one go """
+        button = Gtk.Button.new_with_label(
+            _("Update all {} packages").format(plugin.get_name()))
+        button.get_style_context().add_class("suggested-action")
+        button.connect('clicked', self.on_upgrade_clicked, plugin)
+        button.show()
+        self.actions_box.pack_start(button, False, False, 0)
+        self.upgrade_buttons[plugin] = button
+
+    def on_upgrade_clicked(self, btn, plugin):
+        """ Plan the upgrade of everything the plugin has """
+        self.context.begin_upgrade(plugin)
+
     def refresh(self):
         """ Begin checking for updates """
         print("Sources refreshed: Check for updates now")
         self.updates_button.set_updates_available(False)
-        for plugin in self.context.plugins:
-            plugin.populate_storage(self,
-                                    PopulationFilter.UPDATES,
-                                    self.context.appsystem)
+        self.plugins = []
+        for button in self.upgrade_buttons.values():
+            button.destroy()
+        self.upgrade_buttons = dict()
+
+        # Populating blocks, so keep it off the main loop
+        thr = threading.Thread(target=self.check_updates)
+        thr.daemon = True
+        thr.start()
+
+    def check_updates(self):
+        """ Populate the available updates in a thread """
+        self.context.populate_storage(self,
+                                      PopulationFilter.UPDATES,
+                                      self.context.appsystem)
 
     def add_item(self, id, item, popfilter):
         """ Got updates set available """
         if popfilter != PopulationFilter.UPDATES:
             return
+        sc_debug("Updatable: {}".format(id))
+
+        Gdk.threads_enter()
         self.updates_button.set_updates_available(True)
-        print("Updatable: {}".format(id))
+        plugin = item.get_plugin()
+        if plugin not in self.plugins:
+            self.plugins.append(plugin)
+            self.add_upgrade_button(plugin)
+        Gdk.threads_leave()
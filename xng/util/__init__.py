@@ -12,6 +12,7 @@
 #
 
 import locale
+import os
 
 
 def sc_format_size(size):
@@ -30,3 +31,28 @@ def sc_format_size_local(size, double_precision=False):
     fmt = "%.1f" if not double_precision else "%.2f"
     dlSize = "%s %s" % (locale.format(fmt, numeric, grouping=True), code)
     return dlSize
+
+
+def sc_cache_dir(*paths):
+    """ Return (and create if needed) a directory within the per-user
+        Software Center cache, i.e. ~/.cache/solus-sc
+    """
+    home = os.path.expanduser("~")
+    path = os.path.join(home, ".cache", "solus-sc", *paths)
+    try:
+        if not os.path.exists(path):
+            os.makedirs(path, 00755)
+    except Exception as ex:
+        print("Check home directory permissions for {}: {}".format(path, ex))
+    return path
+
+
+def sc_debug_enabled():
+    """ Chatty debug output is only wanted with SOLUS_SC_DEBUG set """
+    return bool(os.environ.get("SOLUS_SC_DEBUG"))
+
+
+def sc_debug(msg):
+    """ Print msg, but only when debugging is enabled """
+    if sc_debug_enabled():
+        print(msg)
@@ -13,12 +13,62 @@
 
 
 import Queue
+import httplib
+import itertools
 import multiprocessing
 import threading
+import time
 from gi.repository import GObject, GdkPixbuf, Gio, Gdk
+from .http import ScHttpPool
+from .lru import ScLruCache
+from .mediacache import ScMediaCache, ENTRY_FETCHED, ENTRY_ETAG, \
+    ENTRY_MODIFIED
 import os
 import hashlib
 
+# Check cached media is still current once it is this old (seconds)
+MEDIA_MAX_AGE = 7 * 24 * 60 * 60
+
+# Read/write buffer size for downloads
+MEDIA_CHUNK = 64 * 1024
+
+# How many decoded pixbufs to keep around
+PIXBUF_CACHE_SIZE = 32
+
+# Fetch priorities, most important first
+FETCH_PRIORITY_VISIBLE = 0    # i.e. the main screenshot on display
+FETCH_PRIORITY_THUMBNAIL = 1  # Thumbnails on display
+FETCH_PRIORITY_PREFETCH = 2   # Nobody is looking at it yet
+
+
+class ScFetchCancelled(Exception):
+    """ Nobody wants the media anymore """
+    pass
+
+
+class ScFetchRequest:
+    """ A single pending fetch, shared by everyone asking for the URI """
+
+    uri = None
+    priority = FETCH_PRIORITY_VISIBLE
+
+    # Cancellation groups interested in this request. A request made
+    # outside of any group is pinned, and can't be cancelled.
+    groups = None
+    pinned = False
+
+    started = False
+    cancelled = False
+
+    # (width, height, scale) to decode at, None for full resolution
+    sizes = None
+
+    def __init__(self, uri, priority):
+        self.uri = uri
+        self.priority = priority
+        self.groups = set()
+        self.sizes = set()
+
 
 class ScMediaFetcher(GObject.Object):
     """ The ScMediaFetcher runs a low priority backround queue for handling
@@ -35,12 +85,24 @@ class ScMediaFetcher(GObject.Object):
         as the fetch thread routine ends, allowing interleaving of the
         operations as well as ensuring locally existing files are loaded
         while fetches are ongoing.
+
+        Requests are worked in priority order (newest first within each
+        priority), and requests for the same URI are merged. Views make
+        their requests within a cancellation group, and cancel the group
+        once they no longer care, i.e. when moving to another app.
+
+        Prefetches only ever fill the disk cache, and are all made in a
+        single group. Any request made on behalf of the user cancels that
+        group outright, so speculative downloads never hold up what is
+        actually on screen.
     """
 
     # The main queue is used to attempt fetching of images
     queue = None
     cache_lock = None
     cache = None
+    sequence = None
+    group_ids = None
 
     # The load queue is dedicated on a single thread to attempting to
     # read the images
@@ -48,12 +110,28 @@ class ScMediaFetcher(GObject.Object):
 
     can_fetch_media = None
     settings = None
+    net_mon = None
+
+    # Shared by all prefetches, and when the user last asked for media
+    prefetch_group = None
+    last_request = 0
+
+    # Keep-alive connections to the media hosts
+    pool = None
+
+    # In-memory index of the cache directory
+    media_cache = None
 
-    # Emit media-fetched URL local-URL
+    # Decoded pixbufs by (uri, size)
+    pixbufs = None
+
+    # Emit media-fetched URL local-URL pixbuf size, where size is the
+    # (width, height, scale) passed to fetch_media
     # or fetch-failed URL error
     __gsignals__ = {
         'media-fetched': (GObject.SIGNAL_RUN_FIRST, None,
-                          (str, str, GdkPixbuf.Pixbuf)),
+                          (str, str, GdkPixbuf.Pixbuf,
+                           GObject.TYPE_PYOBJECT)),
         'fetch-failed': (GObject.SIGNAL_RUN_FIRST, None,
                          (str, str)),
     }
@@ -87,9 +165,17 @@ class ScMediaFetcher(GObject.Object):
             pass
 
         # Set up the basics
+        self.media_cache = ScMediaCache(
+            self.settings.get_int64("media-cache-size"))
+        self.pool = ScHttpPool(max_idle=threadCount)
+        self.pixbufs = ScLruCache(PIXBUF_CACHE_SIZE)
         self.cache = dict()
         self.cache_lock = threading.Lock()
-        self.queue = Queue.LifoQueue(0)
+        self.queue = Queue.PriorityQueue(0)
+        self.sequence = itertools.count()
+        self.group_ids = itertools.count(1)
+        self.prefetch_group = next(self.group_ids)
+        self.net_mon = Gio.NetworkMonitor.get_default()
 
         # We'll happily let the threads die if required
         for i in range(threadCount):
@@ -104,6 +190,8 @@ class ScMediaFetcher(GObject.Object):
         t.start()
 
     def on_settings_changed(self, s, key, data=None):
+        if key == "media-cache-size" and self.media_cache:
+            self.media_cache.set_budget(s.get_int64(key))
         if key != "fetch-media":
             return
         self.can_fetch_media = s.get_boolean(key)
@@ -123,6 +211,11 @@ class ScMediaFetcher(GObject.Object):
         """ Return fully qualified local path for the URL """
         return os.path.join(self.get_cache_dir(), self.get_cache_filename(url))
 
+    def is_media_cached(self, uri):
+        """ Whether we already have the media, without touching the disk """
+        name = self.get_cache_filename(uri)
+        return self.media_cache.lookup(name) is not None
+
     def is_media_pending(self, uri):
         """ Determine if the media is pending before asking for
             it to be fetched
@@ -132,55 +225,147 @@ class ScMediaFetcher(GObject.Object):
                 return True
         return False
 
-    def load_pixbuf(self, local_file):
-        """ Load the pixbuf itself in the background thread """
-        pbuf = None
-        try:
-            pbuf = GdkPixbuf.Pixbuf.new_from_file(local_file)
-        except Exception as e:
-            raise e
-            return None
-        return pbuf
+    def can_prefetch(self):
+        """ Whether speculative fetches are allowed right now """
+        if not self.can_fetch_media:
+            return False
+        return not self.net_mon.get_network_metered()
 
-    def fetch_pixbuf(self, uri, local_file):
-        """ Fetch the GdkPixbuf in the background thread so it can be updated
-            immediately in the UI without a secondary load routine
+    def get_idle_time(self):
+        """ Seconds since the user last asked for media, or 0 while any of
+            it is still pending """
+        with self.cache_lock:
+            for request in self.cache.itervalues():
+                if request.priority < FETCH_PRIORITY_PREFETCH:
+                    return 0.0
+            return time.time() - self.last_request
+
+    def load_pixbuf(self, local_file, size=None):
+        """ Load the pixbuf itself in the background thread, decoding it
+            straight to the (width, height, scale) it will be shown at """
+        if size is None:
+            return GdkPixbuf.Pixbuf.new_from_file(local_file)
+
+        (width, height, scale) = size
+        width *= scale
+        height *= scale
+        # Never scale up, the widget will do a better job of that
+        (fmt, natural_width, natural_height) = \
+            GdkPixbuf.Pixbuf.get_file_info(local_file)
+        if fmt is not None and natural_width <= width and \
+                natural_height <= height:
+            return GdkPixbuf.Pixbuf.new_from_file(local_file)
+        return GdkPixbuf.Pixbuf.new_from_file_at_scale(
+            local_file, width, height, True)
+
+    def fetch_pixbuf(self, uri, local_file, request=None):
+        """ Fetch the media into the cache in the background thread, so it
+            can be loaded without a secondary fetch routine.
+
+            Stale copies are revalidated with the server, so an unchanged
+            image only costs a 304 response.
         """
-        if os.path.exists(local_file):
-            return
-        if not self.can_fetch_media:
+        name = os.path.basename(local_file)
+        entry = self.media_cache.lookup(name)
+        have_file = entry is not None
+        if have_file:
+            age = time.time() - entry[ENTRY_FETCHED]
+            if age < MEDIA_MAX_AGE or not self.can_fetch_media:
+                return
+        elif not self.can_fetch_media:
             raise RuntimeError("Media fetching disabled in user settings")
+
+        if not uri.startswith("http://") and not uri.startswith("https://"):
+            self.copy_uri(uri, local_file)
             return
 
-        # Attempt download to a local location, then finally rename to the
-        # final path
-        inf = Gio.File.new_for_uri(uri)
-        out, ios = Gio.File.new_tmp("solus-sc.XXXXXX")
+        headers = dict()
+        if have_file:
+            if entry[ENTRY_ETAG]:
+                headers["If-None-Match"] = entry[ENTRY_ETAG]
+            if entry[ENTRY_MODIFIED]:
+                headers["If-Modified-Since"] = entry[ENTRY_MODIFIED]
+
         try:
-            inf.copy(out, Gio.FileCopyFlags.OVERWRITE, None, None)
-        except Exception as e:
+            self.download(uri, local_file, headers, request)
+        except ScFetchCancelled as e:
             raise e
+        except Exception as e:
+            # A stale image is better than none at all
+            if not have_file:
+                raise e
+            print("Unable to revalidate {}: {}".format(uri, e))
+
+    def download(self, uri, local_file, headers, request=None):
+        """ Stream the URI into the cache, renaming it into place once
+            complete """
+        name = os.path.basename(local_file)
+        resp = self.pool.request(uri, headers)
+        if resp.status == httplib.NOT_MODIFIED:
+            resp.close()
+            self.media_cache.revalidated(name)
             return
+        if resp.status != httplib.OK:
+            resp.read()
+            resp.close()
+            raise IOError("HTTP {} {}".format(resp.status, resp.reason))
+
+        tmp = "{}.{}.part".format(local_file, threading.current_thread().ident)
+        try:
+            with open(tmp, "wb") as f:
+                while True:
+                    if request is not None and request.cancelled:
+                        raise ScFetchCancelled()
+                    chunk = resp.read(MEDIA_CHUNK)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        except Exception as e:
+            resp.discard()
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+            raise e
+        resp.close()
+
+        os.rename(tmp, local_file)
+        self.media_cache.add(name, os.path.getsize(local_file),
+                             resp.getheader("etag"),
+                             resp.getheader("last-modified"))
 
-        # Copy temporary over the original
+    def copy_uri(self, uri, local_file):
+        """ Anything other than HTTP is left to GIO """
+        tmp = "{}.{}.part".format(local_file, threading.current_thread().ident)
+        inf = Gio.File.new_for_uri(uri)
+        out = Gio.File.new_for_path(tmp)
         try:
-            out2 = Gio.File.new_for_path(local_file)
-            out.copy(out2, Gio.FileCopyFlags.OVERWRITE, None, None)
-            out.delete()
+            inf.copy(out, Gio.FileCopyFlags.OVERWRITE, None, None)
+            os.rename(tmp, local_file)
+            self.media_cache.add(os.path.basename(local_file),
+                                 os.path.getsize(local_file))
         except Exception as e:
-            out.delete()
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
             raise e
 
     def begin_load(self):
         """ Handles loading of the images that already exist """
         while True:
-            uri = self.load_queue.get()
+            (uri, size) = self.load_queue.get()
             filename = self.get_cache_filename_full(uri)
             pbuf = None
+            name = os.path.basename(filename)
             try:
-                pbuf = self.load_pixbuf(filename)
+                pbuf = self.load_pixbuf(filename, size)
+                self.pixbufs.put((uri, size), pbuf)
+                self.media_cache.touch(name)
             except Exception as e:
                 pbuf = None
+                # Most likely evicted, so fetch it again next time
+                self.media_cache.forget(name)
                 print("Failed to load pixbuf {}: {}".format(
                     filename, e))
                 Gdk.threads_enter()
@@ -190,7 +375,7 @@ class ScMediaFetcher(GObject.Object):
             # Let clients know the media is now ready
             if pbuf:
                 Gdk.threads_enter()
-                self.emit('media-fetched', uri, filename, pbuf)
+                self.emit('media-fetched', uri, filename, pbuf, size)
                 Gdk.threads_leave()
                 pbuf = None
             self.load_queue.task_done()
@@ -200,13 +385,23 @@ class ScMediaFetcher(GObject.Object):
             based on lock conditions
         """
         while True:
-            # Grab the next job and wipe from the cache
-            uri = self.queue.get()
-
+            # Grab the next job, skipping any nobody wants anymore
+            (priority, seq, request) = self.queue.get()
+            with self.cache_lock:
+                skip = request.started or request.cancelled or \
+                    priority != request.priority
+                request.started = True
+            if skip:
+                self.queue.task_done()
+                continue
+
+            uri = request.uri
             local_file = self.get_cache_filename_full(uri)
             fail = False
             try:
-                self.fetch_pixbuf(uri, local_file)
+                self.fetch_pixbuf(uri, local_file, request)
+            except ScFetchCancelled:
+                fail = True
             except Exception as e:
                 Gdk.threads_enter()
                 self.emit('fetch-failed', uri, str(e))
@@ -214,19 +409,95 @@ class ScMediaFetcher(GObject.Object):
                 print("Failed to fetch {}: {}".format(uri, e))
                 fail = True
 
-            # Request load on the main load thread
-            if not fail:
-                self.load_queue.put(uri)
-
-            # Clean up the fetch state
+            # Clean up the fetch state. Until now, anyone else asking for
+            # the URI has simply added their size to this request
             with self.cache_lock:
-                del self.cache[uri]
+                if self.cache.get(uri) is request:
+                    del self.cache[uri]
+                sizes = list(request.sizes)
+
+            # Request load on the main load thread, for every size wanted
+            if not fail and not request.cancelled:
+                for size in sizes:
+                    self.load_queue.put((uri, size))
             self.queue.task_done()
 
-    def fetch_media(self, uri):
-        """ Request background fetch of the given media """
-        if self.is_media_pending(uri):
+    def new_group(self):
+        """ Return a new cancellation group for fetch_media """
+        with self.cache_lock:
+            return next(self.group_ids)
+
+    def cancel_group(self, group):
+        """ Drop every request in the group that nobody else wants """
+        with self.cache_lock:
+            for uri, request in self.cache.items():
+                if group not in request.groups:
+                    continue
+                request.groups.discard(group)
+                if request.pinned or request.groups:
+                    continue
+                request.cancelled = True
+                del self.cache[uri]
+
+    def fetch_media(self, uri, priority=FETCH_PRIORITY_VISIBLE, group=None,
+                    size=None):
+        """ Request background fetch of the given media, to be shown at
+            size, i.e. (width, height, scale factor) """
+        # Recently shown at this size, so skip the disk entirely
+        pbuf = self.pixbufs.get((uri, size))
+        if pbuf is not None:
+            self.media_cache.touch(self.get_cache_filename(uri))
+            self.emit('media-fetched', uri, self.get_cache_filename_full(uri),
+                      pbuf, size)
             return
+
         with self.cache_lock:
-            self.cache[uri] = True
-        self.queue.put(uri)
+            request = self.cache.get(uri)
+            if request is None:
+                request = ScFetchRequest(uri, priority)
+                self.cache[uri] = request
+            elif request.started:
+                # Already downloading, just note our interest. Every size
+                # is loaded once the one download completes
+                request.priority = min(priority, request.priority)
+                priority = None
+            elif priority >= request.priority:
+                # Already queued at least as urgently
+                priority = None
+            else:
+                # Bump it, the old queue entry is now stale
+                request.priority = priority
+
+            request.sizes.add(size)
+            if group is None:
+                request.pinned = True
+            else:
+                request.groups.add(group)
+
+            if priority is not None:
+                self.queue.put((priority, -next(self.sequence), request))
+
+            user_request = request.priority < FETCH_PRIORITY_PREFETCH
+            if user_request:
+                self.last_request = time.time()
+
+        # Get any prefetches out of the way
+        if user_request:
+            self.cancel_group(self.prefetch_group)
+
+    def prefetch_media(self, uri):
+        """ Fetch media nobody has asked for yet into the disk cache,
+            without decoding it. Returns False if prefetching isn't allowed
+            right now """
+        if not self.can_prefetch():
+            return False
+        if self.is_media_cached(uri):
+            return True
+        with self.cache_lock:
+            if uri in self.cache:
+                return True
+            request = ScFetchRequest(uri, FETCH_PRIORITY_PREFETCH)
+            request.groups.add(self.prefetch_group)
+            self.cache[uri] = request
+            self.queue.put((request.priority, -next(self.sequence), request))
+        return True
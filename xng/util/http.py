@@ -0,0 +1,157 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+import httplib
+import socket
+import threading
+import urlparse
+
+# Socket timeout (seconds) for each connection
+HTTP_TIMEOUT = 30
+
+# Idle connections kept around for each host
+HTTP_MAX_IDLE = 4
+
+# Give up following redirects after this many hops
+HTTP_MAX_REDIRECTS = 5
+
+HTTP_REDIRECTS = [
+    httplib.MOVED_PERMANENTLY,
+    httplib.FOUND,
+    httplib.SEE_OTHER,
+    httplib.TEMPORARY_REDIRECT,
+]
+
+
+class ScHttpResponse:
+    """ Wraps an httplib response so that its connection goes back to the
+        pool once the body has been read in full """
+
+    pool = None
+    key = None
+    conn = None
+    resp = None
+    url = None
+    status = 0
+    reason = None
+
+    def __init__(self, pool, key, conn, resp, url):
+        self.pool = pool
+        self.key = key
+        self.conn = conn
+        self.resp = resp
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+
+    def getheader(self, name, default=None):
+        return self.resp.getheader(name, default)
+
+    def read(self, amt=None):
+        return self.resp.read(amt)
+
+    def close(self):
+        """ Release the connection, keeping it only if it is reusable """
+        if self.conn is None:
+            return
+        if not self.resp.isclosed() and self.resp.length == 0:
+            # i.e. a 304, which has no body to read
+            self.resp.read()
+        if self.resp.isclosed() and not self.resp.will_close:
+            self.pool.release(self.key, self.conn)
+        else:
+            self.conn.close()
+        self.conn = None
+
+    def discard(self):
+        """ Drop the response and its connection, i.e. on error """
+        if self.conn is None:
+            return
+        self.conn.close()
+        self.conn = None
+
+
+class ScHttpPool:
+    """ ScHttpPool keeps HTTP(S) connections alive per host, so repeated
+        requests to the same server skip the TCP and TLS handshakes.
+
+        Connections are checked out for the lifetime of a single response,
+        making the pool safe to share between threads.
+    """
+
+    lock = None
+    idle = None
+    max_idle = HTTP_MAX_IDLE
+    timeout = HTTP_TIMEOUT
+
+    def __init__(self, max_idle=HTTP_MAX_IDLE, timeout=HTTP_TIMEOUT):
+        self.lock = threading.Lock()
+        self.idle = dict()
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+    def request(self, url, headers=None):
+        """ GET the url, following redirects. The caller must close (or
+            discard) the returned ScHttpResponse """
+        for i in range(HTTP_MAX_REDIRECTS):
+            resp = self.send(url, headers or dict())
+            if resp.status not in HTTP_REDIRECTS:
+                return resp
+            location = resp.getheader("location")
+            resp.read()
+            resp.close()
+            if not location:
+                raise IOError("Redirect without a location")
+            url = urlparse.urljoin(url, location)
+        raise IOError("Too many redirects")
+
+    def send(self, url, headers):
+        """ Issue a single request, reconnecting once if a pooled
+            connection turns out to have been dropped by the server """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path = "{}?{}".format(path, parts.query)
+
+        for attempt in range(2):
+            conn = self.acquire(key)
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if attempt > 0:
+                    raise
+                continue
+            return ScHttpResponse(self, key, conn, resp, url)
+
+    def acquire(self, key):
+        with self.lock:
+            conns = self.idle.get(key)
+            if conns:
+                return conns.pop()
+        (scheme, netloc) = key
+        if scheme == "https":
+            return httplib.HTTPSConnection(netloc, timeout=self.timeout)
+        elif scheme == "http":
+            return httplib.HTTPConnection(netloc, timeout=self.timeout)
+        raise IOError("Unsupported scheme: {}".format(scheme))
+
+    def release(self, key, conn):
+        with self.lock:
+            conns = self.idle.setdefault(key, [])
+            if len(conns) < self.max_idle:
+                conns.append(conn)
+                return
+        conn.close()
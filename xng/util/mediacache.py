@@ -0,0 +1,244 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2017-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from . import sc_cache_dir, sc_debug
+
+import marshal
+import os
+import threading
+import time
+
+# Bump whenever the layout of the index changes
+MEDIA_INDEX_VERSION = 1
+
+# Fallback budget (bytes) when the setting is unavailable
+MEDIA_CACHE_BUDGET = 200 * 1024 * 1024
+
+# Evict down to this fraction of the budget, so we don't evict on every add
+MEDIA_CACHE_LOW_WATER = 0.9
+
+# Batch index writes and evictions up for this long (seconds)
+MEDIA_CACHE_DELAY = 5.0
+
+# Entry layout
+ENTRY_SIZE = 0
+ENTRY_ACCESSED = 1
+ENTRY_FETCHED = 2
+ENTRY_ETAG = 3
+ENTRY_MODIFIED = 4
+
+
+class ScMediaCache:
+    """ Index over the media cache directory, so that lookups never touch
+        the disk and the directory stays within a byte budget.
+
+        Each entry records the file size, when it was last shown, when it
+        was last fetched or revalidated, and the server's validators. The
+        least recently shown entries are evicted by a background thread,
+        which also writes the index out.
+    """
+
+    path = None
+    index_path = None
+    lock = None
+    entries = None
+    total = 0
+    budget = MEDIA_CACHE_BUDGET
+
+    dirty = False
+    wakeup = None
+
+    def __init__(self, budget=MEDIA_CACHE_BUDGET):
+        self.path = sc_cache_dir("media")
+        self.index_path = os.path.join(self.path, "index")
+        self.lock = threading.Lock()
+        self.budget = budget
+        self.wakeup = threading.Event()
+
+        if not self.load():
+            self.entries = dict()
+            self.dirty = True
+        self.reconcile()
+
+        thr = threading.Thread(target=self.maintain)
+        thr.daemon = True
+        thr.start()
+        self.schedule()
+
+    def load(self):
+        """ Load the on-disk index. Returns False if it was unusable """
+        try:
+            with open(self.index_path, "rb") as f:
+                blob = marshal.load(f)
+        except Exception as e:
+            print("Media cache index unavailable: {}".format(e))
+            return False
+        if blob.get("version") != MEDIA_INDEX_VERSION:
+            return False
+        self.entries = blob["entries"]
+        return True
+
+    def reconcile(self):
+        """ Bring the index in line with the directory, which may have been
+            changed behind our back or by a run that never saved. Unknown
+            files are adopted, entries for missing files are dropped and
+            partial downloads are removed. """
+        try:
+            names = os.listdir(self.path)
+        except Exception as e:
+            print("Unable to list the media cache: {}".format(e))
+            names = []
+
+        present = set()
+        for name in names:
+            if name.endswith(".meta") or name.endswith(".part"):
+                # Validators used to live beside each file, and partial
+                # downloads are never resumed
+                try:
+                    os.unlink(os.path.join(self.path, name))
+                except Exception:
+                    pass
+                continue
+            if name.startswith("index"):
+                continue
+            present.add(name)
+            if name in self.entries:
+                continue
+            try:
+                st = os.stat(os.path.join(self.path, name))
+            except Exception:
+                continue
+            self.entries[name] = [st.st_size, st.st_mtime, st.st_mtime,
+                                  None, None]
+            self.dirty = True
+
+        for name in self.entries.keys():
+            if name not in present:
+                del self.entries[name]
+                self.dirty = True
+        self.total = sum([x[ENTRY_SIZE] for x in self.entries.itervalues()])
+
+    def save(self):
+        with self.lock:
+            blob = marshal.dumps({
+                "version": MEDIA_INDEX_VERSION,
+                "entries": self.entries,
+            })
+            self.dirty = False
+        tmp = "{}.{}".format(self.index_path, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.rename(tmp, self.index_path)
+        except Exception as e:
+            print("Unable to write media cache index: {}".format(e))
+            try:
+                os.unlink(tmp)
+            except Exception:
+                pass
+
+    def get_filename(self, name):
+        return os.path.join(self.path, name)
+
+    def lookup(self, name):
+        """ Return a copy of the entry for name, or None if not cached """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            return list(entry)
+
+    def add(self, name, size, etag=None, modified=None):
+        """ A file was (re)written into the cache """
+        now = time.time()
+        with self.lock:
+            old = self.entries.get(name)
+            if old is not None:
+                self.total -= old[ENTRY_SIZE]
+            self.entries[name] = [size, now, now, etag, modified]
+            self.total += size
+            self.dirty = True
+        self.schedule()
+
+    def touch(self, name):
+        """ The file was just used """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return
+            entry[ENTRY_ACCESSED] = time.time()
+            self.dirty = True
+        self.schedule()
+
+    def revalidated(self, name):
+        """ The server told us the file is still current """
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return
+            entry[ENTRY_FETCHED] = time.time()
+            self.dirty = True
+        self.schedule()
+
+    def forget(self, name):
+        """ Drop the entry, i.e. the file went missing """
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is None:
+                return
+            self.total -= entry[ENTRY_SIZE]
+            self.dirty = True
+
+    def set_budget(self, budget):
+        with self.lock:
+            self.budget = budget
+        self.schedule()
+
+    def schedule(self):
+        """ Have the maintenance thread look at us soon """
+        self.wakeup.set()
+
+    def maintain(self):
+        """ Background thread body, batching up writes and evictions """
+        while True:
+            self.wakeup.wait()
+            time.sleep(MEDIA_CACHE_DELAY)
+            self.wakeup.clear()
+            self.evict()
+            if self.dirty:
+                self.save()
+
+    def evict(self):
+        """ Remove the least recently used files until within budget """
+        with self.lock:
+            if self.total <= self.budget:
+                return
+            target = int(self.budget * MEDIA_CACHE_LOW_WATER)
+            order = sorted(self.entries.iteritems(),
+                           key=lambda x: x[1][ENTRY_ACCESSED])
+            victims = []
+            for name, entry in order:
+                if self.total <= target:
+                    break
+                victims.append(name)
+                self.total -= entry[ENTRY_SIZE]
+                del self.entries[name]
+            self.dirty = True
+
+        for name in victims:
+            try:
+                os.unlink(self.get_filename(name))
+            except Exception:
+                pass
+        sc_debug("Evicted {} files from the media cache".format(
+            len(victims)))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+# -*- coding: utf-8 -*-
+#
+#  This file is part of solus-sc
+#
+#  Copyright © 2013-2019 Solus
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 2 of the License, or
+#  (at your option) any later version.
+#
+
+from gi.repository import GLib
+from .util import sc_debug
+
+import collections
+import threading
+
+# Wait for the UI to settle before starting (seconds)
+WARMUP_DELAY = 2.0
+
+# Time between steps, so we only ever trickle along (seconds)
+WARMUP_INTERVAL = 0.25
+
+# Stay out of the way for this long after the user asks for media (seconds)
+WARMUP_BACKOFF = 5.0
+
+# Never warm up more items than this
+WARMUP_MAX_ITEMS = 24
+
+# Give up on media after this many cancelled or failed attempts
+WARMUP_ATTEMPTS = 2
+
+
+class ScWarmup:
+    """ ScWarmup prepares the items the user is most likely to click on
+        next, i.e. those featured or recently updated on the home page.
+
+        Work is done one step at a time from a low priority main loop
+        source. Each item first has its AppSystem lookups primed, and then
+        its screenshots are handed to the fetcher one at a time as
+        prefetches. Media is left alone entirely when fetching is disabled
+        or the connection is metered.
+
+        A user initiated fetch cancels any prefetch in flight, and nothing
+        more is fetched until the fetcher has been quiet for WARMUP_BACKOFF.
+    """
+
+    context = None
+    lock = None
+    source_id = None
+
+    # Items still to be looked at, and those already seen
+    items = None
+    seen = None
+
+    # Media for the items already looked at
+    uris = None
+    attempts = None
+
+    def __init__(self, context):
+        self.context = context
+        self.lock = threading.Lock()
+        self.items = collections.deque()
+        self.seen = set()
+        self.uris = collections.deque()
+        self.attempts = dict()
+
+    def add_item(self, item):
+        """ Queue the item for warming up, safe to call from any thread """
+        with self.lock:
+            id = item.get_id()
+            if id in self.seen or len(self.seen) >= WARMUP_MAX_ITEMS:
+                return
+            self.seen.add(id)
+            self.items.append(item)
+            self.schedule(WARMUP_DELAY)
+
+    def schedule(self, delay):
+        """ Lock must be held. Arrange for the next step """
+        if self.source_id is not None:
+            return
+        self.source_id = GLib.timeout_add(int(delay * 1000), self.step,
+                                          priority=GLib.PRIORITY_LOW)
+
+    def step(self):
+        """ Main loop side, do a single piece of work """
+        fetcher = self.context.fetcher
+        with self.lock:
+            self.source_id = None
+
+            idle = fetcher.get_idle_time()
+            if idle < WARMUP_BACKOFF:
+                self.schedule(WARMUP_BACKOFF - idle)
+                return False
+
+            if self.uris:
+                self.step_media(fetcher)
+                self.schedule(WARMUP_INTERVAL)
+                return False
+
+            if not self.items:
+                return False
+            item = self.items.popleft()
+            self.schedule(WARMUP_INTERVAL)
+
+        # Take the lock back out of it, AppSystem may take a while
+        screens = self.context.appsystem.prefetch_item(item)
+        if not screens or not fetcher.can_prefetch():
+            return False
+
+        # The details view starts with the default and the thumbnails
+        default = screens[0]
+        for scr in screens:
+            if scr.default:
+                default = scr
+        uris = [default.main_uri]
+        if len(screens) > 1:
+            uris.extend([x.thumb_uri for x in screens])
+        with self.lock:
+            self.uris.extend(uris)
+        return False
+
+    def step_media(self, fetcher):
+        """ Lock must be held. Prefetch the next media once the last one is
+            out of the way """
+        uri = self.uris[0]
+        if fetcher.is_media_pending(uri):
+            return
+        attempts = self.attempts.get(uri, 0)
+        if attempts >= WARMUP_ATTEMPTS or fetcher.is_media_cached(uri):
+            self.uris.popleft()
+            self.attempts.pop(uri, None)
+            return
+        if not fetcher.prefetch_media(uri):
+            # Not allowed right now, so don't bother with any of it
+            self.uris.clear()
+            self.attempts.clear()
+            return
+        sc_debug("Prefetching {}".format(uri))
+        self.attempts[uri] = attempts + 1
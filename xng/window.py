@@ -468,6 +468,7 @@ class ScMainWindow(Gtk.ApplicationWindow):
         self.search_entry.set_hexpand(True)
         self.connect('key-press-event', self.handle_key_event)
         self.search_entry.connect('activate', self.on_search_activate)
+        self.search_entry.connect('search-changed', self.on_search_changed)
 
         self.search_button.bind_property('active', self.search_bar,
                                          'search-mode-enabled',
@@ -479,6 +480,15 @@ class ScMainWindow(Gtk.ApplicationWindow):
             return
         self.on_search_activate(self.search_entry, None)
 
+    def on_search_changed(self, widget, udata=None):
+        """ Search as the user types """
+        text = self.search_entry.get_text().strip()
+        if len(text) < 1:
+            return
+        if self.request and self.request.get_term() == text:
+            return
+        self.on_search_activate(widget, udata)
+
     def on_search_activate(self, widget, udata=None):
         """ User activated a search """
         text = self.search_entry.get_text().strip()